@@ -1,8 +1,46 @@
 import click
-from pkgutil import walk_packages
+from importlib import import_module
+from pkgutil import iter_modules
+from typing import Optional, Sequence, Set
 
 
-@click.group()
+class LazyGroup(click.Group):
+    """
+    A group that imports the module of a command only when that command
+    is invoked, rather than importing every command (and everything they
+    import) on each invocation. Every module of this package is expected
+    to define a command named after it.
+    """
+
+    def __get_module_names(self) -> Set[str]:
+        return {
+            module_name
+            for _, module_name, _ in iter_modules(__path__)  # type: ignore  # mypy issue #1422
+        }
+
+    def list_commands(self, ctx: click.Context) -> Sequence[str]:
+        return sorted(
+            {
+                *self.commands.keys(),
+                *(name.replace("_", "-") for name in self.__get_module_names()),
+            }
+        )
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.commands:
+            return self.commands[cmd_name]
+
+        module_name = cmd_name.replace("-", "_")
+        if module_name not in self.__get_module_names():
+            return None
+
+        module = import_module(f"{__name__}.{module_name}")
+        cmd = getattr(module, module_name)
+        assert isinstance(cmd, click.Command)
+        return cmd
+
+
+@click.group(cls=LazyGroup)
 @click.version_option()
 def main() -> None:
     """\b
@@ -15,10 +53,3 @@ def main() -> None:
     O  O   o O   o  o   O o   O
 `OoO'  o   O `OoO'o `OoO' `OoO'o
 """
-
-
-for loader, module_name, is_pkg in walk_packages(__path__, __name__ + "."):  # type: ignore  # mypy issue #1422
-    module = __import__(module_name, globals(), locals(), ["__name__"])
-    cmd = getattr(module, module_name.rsplit(".", 1)[-1])
-    if isinstance(cmd, click.Command):
-        main.add_command(cmd)
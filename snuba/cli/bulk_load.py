@@ -6,13 +6,13 @@ import click
 import progressbar
 
 from snuba import environment, settings
-from snuba.clickhouse.http import JSONRowEncoder
+from snuba.clickhouse.http import JSONRow, JSONRowEncoder
 from snuba.datasets.storages import StorageKey
 from snuba.datasets.storages.factory import CDC_STORAGES, get_cdc_storage
 from snuba.environment import setup_logging, setup_sentry
 from snuba.snapshots.loaders import ProgressCallback
 from snuba.snapshots.postgres_snapshot import PostgresSnapshot
-from snuba.writer import BufferedWriterWrapper
+from snuba.writer import BatchWriter, BufferedWriterWrapper, WriterTableRow
 
 
 @click.command()
@@ -45,6 +45,19 @@ from snuba.writer import BufferedWriterWrapper
 @click.option(
     "--show-progress", default=False, is_flag=True, help="Shows a progress bar.",
 )
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of processes that parse and write the table in parallel. "
+    "Does not apply to pre processed tables.",
+)
+@click.option(
+    "--checkpoint-file",
+    type=click.Path(dir_okay=False),
+    help="File where the progress of the load is recorded. If it exists, "
+    "the load resumes from the last completed range of the table.",
+)
 @click.option("--log-level", help="Logging level to use.")
 def bulk_load(
     *,
@@ -54,6 +67,8 @@ def bulk_load(
     ignore_existing_data: bool,
     pre_processed: bool,
     show_progress: bool,
+    workers: int,
+    checkpoint_file: Optional[str],
     log_level: Optional[str] = None,
 ) -> None:
     setup_logging(log_level)
@@ -72,11 +87,13 @@ def bulk_load(
         product=settings.SNAPSHOT_LOAD_PRODUCT, path=source,
     )
 
+    block_processor = storage.get_block_processor()
     loader = table_writer.get_bulk_loader(
         snapshot_source,
         storage.get_postgres_table(),
         storage.get_row_processor(),
         dest_table,
+        block_processor,
     )
     # TODO: see whether we need to pass options to the writer
 
@@ -104,16 +121,48 @@ def bulk_load(
         loader.load_preprocessed(
             writer, ignore_existing_data, progress_callback=progress_func
         )
-    else:
-        buffer_writer = BufferedWriterWrapper(
-            table_writer.get_batch_writer(
-                environment.metrics,
+    elif block_processor is not None:
+
+        def get_block_writer() -> BatchWriter[bytes]:
+            assert block_processor is not None
+            return table_writer.get_bulk_writer(
+                metrics=environment.metrics,
+                encoding=None,
+                column_names=block_processor.get_columns(),
                 table_name=dest_table,
-                chunk_size=settings.BULK_CLICKHOUSE_BUFFER,
-            ),
-            settings.BULK_CLICKHOUSE_BUFFER,
-            JSONRowEncoder(),
-        )
-        loader.load(
-            buffer_writer, ignore_existing_data, progress_callback=progress_func
+            )
+
+        loader.load_blocks(
+            get_block_writer,
+            ignore_existing_data,
+            progress_callback=progress_func,
+            workers=workers,
+            checkpoint_path=checkpoint_file,
         )
+    else:
+
+        def get_buffer_writer() -> BufferedWriterWrapper[JSONRow, WriterTableRow]:
+            return BufferedWriterWrapper(
+                table_writer.get_batch_writer(
+                    environment.metrics,
+                    table_name=dest_table,
+                    chunk_size=settings.BULK_CLICKHOUSE_BUFFER,
+                ),
+                settings.BULK_CLICKHOUSE_BUFFER,
+                JSONRowEncoder(),
+            )
+
+        if workers > 1 or checkpoint_file is not None:
+            loader.load_parallel(
+                get_buffer_writer,
+                ignore_existing_data,
+                progress_callback=progress_func,
+                workers=workers,
+                checkpoint_path=checkpoint_file,
+            )
+        else:
+            loader.load(
+                get_buffer_writer(),
+                ignore_existing_data,
+                progress_callback=progress_func,
+            )
@@ -79,6 +79,13 @@ from snuba.utils.streams.metrics_adapter import StreamMetricsAdapter
 @click.option(
     "--processes", type=int,
 )
+@click.option(
+    "--catch-up-processes",
+    type=int,
+    help="Processes used by the stateful consumer once it received a snapshot. "
+    "This is permanent: the consumer does not go back to --processes when the "
+    "catch up is over, only when it is restarted. Defaults to --processes.",
+)
 @click.option(
     "--input-block-size", type=int,
 )
@@ -109,6 +116,7 @@ def consumer(
     queued_min_messages: int,
     stateful_consumer: bool,
     processes: Optional[int],
+    catch_up_processes: Optional[int],
     input_block_size: Optional[int],
     output_block_size: Optional[int],
     kafka_override_config: Optional[str] = None,
@@ -146,6 +154,7 @@ def consumer(
         output_block_size=output_block_size,
         profile_path=profile_path,
         kafka_override_config=kafka_override_config,
+        catch_up_processes=catch_up_processes,
     )
 
     if stateful_consumer:
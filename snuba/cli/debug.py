@@ -0,0 +1,78 @@
+import subprocess
+import sys
+from typing import NamedTuple, Sequence
+
+import click
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_import_times(output: str) -> Sequence[ImportTime]:
+    """
+    Parses the report that `python -X importtime` writes to stderr.
+    """
+    import_times = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            # The header of the report.
+            continue
+        import_times.append(
+            ImportTime(module.strip(), int(self_us), int(cumulative_us))
+        )
+    return import_times
+
+
+@click.group()
+def debug() -> None:
+    "Tools to investigate the behavior of Snuba itself."
+
+
+@debug.command("import-time")
+@click.argument("target", default="api")
+@click.option(
+    "--limit", type=int, default=30, help="Number of modules to report.",
+)
+@click.option(
+    "--sort",
+    type=click.Choice(["cumulative", "self"]),
+    default="cumulative",
+    help="Whether to sort modules by the time spent importing them including or excluding their own imports.",
+)
+def import_time(*, target: str, limit: int, sort: str) -> None:
+    """
+    Reports the time spent importing each module when a CLI command (or,
+    if the target contains a dot, a module) is loaded. Modules are
+    imported in a new interpreter, so nothing is cached.
+    """
+    module = target if "." in target else f"snuba.cli.{target.replace('-', '_')}"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    import_times = parse_import_times(process.stderr)
+    if process.returncode != 0 or not import_times:
+        raise click.ClickException(f"failed to import {module}:\n{process.stderr}")
+
+    # The last module reported is the one that was imported.
+    total = import_times[-1].cumulative_us
+    click.echo(f"{module}: {total / 1000:.1f}ms, {len(import_times)} modules")
+    click.echo(f"{'self (ms)':>10} {'cumulative (ms)':>16}  module")
+    for entry in sorted(
+        import_times,
+        key=lambda entry: entry.cumulative_us
+        if sort == "cumulative"
+        else entry.self_us,
+        reverse=True,
+    )[:limit]:
+        click.echo(
+            f"{entry.self_us / 1000:>10.1f} {entry.cumulative_us / 1000:>16.1f}  {entry.module}"
+        )
@@ -0,0 +1,61 @@
+import json
+from typing import Any, Optional
+from urllib.request import urlopen
+
+import click
+
+from snuba import settings
+
+SORT_KEYS = ["total_ms", "count", "p95_ms", "avg_rows_read"]
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}" if value < 1 else f"{value:.0f}"
+    return str(value)
+
+
+@click.command()
+@click.option(
+    "--api-url",
+    help="URL of the API process to read the statistics from, the statistics are kept by each process.",
+)
+@click.option("--limit", type=int, default=20, help="Number of fingerprints to show.")
+@click.option(
+    "--sort",
+    type=click.Choice(SORT_KEYS),
+    default="total_ms",
+    help="The statistic to sort the fingerprints by.",
+)
+@click.option("--show-sql", is_flag=True, help="Show the anonymized SQL.")
+def fingerprints(
+    *, api_url: Optional[str], limit: int, sort: str, show_sql: bool
+) -> None:
+    """
+    Shows the query fingerprints that account for the most load on
+    ClickHouse, with their statistics over the last minutes.
+    """
+    url = api_url or f"http://localhost:{settings.PORT}"
+    with urlopen(f"{url}/dashboard/fingerprints.json?limit=1000") as response:
+        summaries = json.loads(response.read())
+
+    summaries.sort(key=lambda summary: summary[sort] or 0, reverse=True)
+
+    columns = [
+        "fingerprint",
+        "count",
+        "errors",
+        "p50_ms",
+        "p95_ms",
+        "total_ms",
+        "avg_rows_read",
+        "cache_hit_rate",
+        "final_rate",
+    ]
+    click.echo("  ".join(f"{column:>16}" for column in columns))
+    for summary in summaries[:limit]:
+        click.echo("  ".join(f"{_fmt(summary[column]):>16}" for column in columns))
+        if show_sql:
+            click.echo(f"{'':>16}  {summary['sql_anonymized']}")
@@ -74,11 +74,18 @@ logger = logging.getLogger(__name__)
 @click.option(
     "--output-block-size", type=int,
 )
+@click.option(
+    "--pre-aggregate",
+    is_flag=True,
+    default=False,
+    help="Combine the rows of each batch that the storage aggregates together anyway, for storages that support it, before writing them.",
+)
 @click.option("--log-level")
 @click.option(
-    "--kafka-override-config", default=None,
+    "--kafka-override-config",
+    default=None,
     help="Path to the JSON-formatted configuration file used to \
-    override the connection to Kafka cluster"
+    override the connection to Kafka cluster",
 )
 def multistorage_consumer(
     storage_names: Sequence[str],
@@ -91,6 +98,7 @@ def multistorage_consumer(
     processes: Optional[int],
     input_block_size: Optional[int],
     output_block_size: Optional[int],
+    pre_aggregate: bool = False,
     kafka_override_config: Optional[str] = None,
     log_level: Optional[str] = None,
 ) -> None:
@@ -229,6 +237,7 @@ def multistorage_consumer(
             input_block_size=input_block_size,
             output_block_size=output_block_size,
             kafka_override_config=kafka_override_config,
+            pre_aggregate=pre_aggregate,
             metrics=metrics,
         ),
     )
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Mapping, MutableMapping, Optional, Set
+
+from snuba import environment, settings, state
+from snuba.clickhouse.formatter.nodes import FormattedQuery
+from snuba.reader import Reader, Result
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+logger = logging.getLogger(__name__)
+
+metrics = MetricsWrapper(environment.metrics, "hedged_reads")
+
+
+def get_hedge_query_id(query_id: str) -> str:
+    # The hedge can land on the same server as the original query, which
+    # does not accept two queries with the same id.
+    return f"{query_id}-hedge"
+
+
+class HedgingPolicy:
+    """
+    Decides when the queries of a referrer are hedged: once they run for
+    longer than a percentile of the recent latencies of the referrer, and
+    only if the referrer is within its budget, which is the fraction of its
+    queries that can be hedged.
+
+    The budget is a token bucket: every query of the referrer adds the
+    budget to it, up to `max_tokens`, and every hedge takes one token.
+    """
+
+    def __init__(
+        self, samples: int = 200, min_samples: int = 20, max_tokens: float = 10.0
+    ) -> None:
+        self.__samples = samples
+        self.__min_samples = min_samples
+        self.__max_tokens = max_tokens
+        self.__lock = threading.Lock()
+        self.__latencies: MutableMapping[str, Deque[float]] = {}
+        self.__tokens: MutableMapping[str, float] = {}
+
+    def get_delay(
+        self, referrer: str, percentile: float, min_delay: float
+    ) -> Optional[float]:
+        """
+        Returns how long to wait for a query before hedging it, or None if
+        the referrer has not run enough queries to tell.
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies.get(referrer, ()))
+        if len(latencies) < self.__min_samples:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * percentile))
+        return max(latencies[index], min_delay)
+
+    def record(self, referrer: str, latency: float, budget: float) -> None:
+        with self.__lock:
+            latencies = self.__latencies.setdefault(
+                referrer, deque(maxlen=self.__samples)
+            )
+            latencies.append(latency)
+            self.__tokens[referrer] = min(
+                self.__tokens.get(referrer, 0.0) + budget, self.__max_tokens
+            )
+
+    def try_hedge(self, referrer: str) -> bool:
+        with self.__lock:
+            tokens = self.__tokens.get(referrer, 0.0)
+            if tokens < 1:
+                return False
+            self.__tokens[referrer] = tokens - 1
+            return True
+
+
+hedging_policy = HedgingPolicy()
+
+
+class HedgedReader(Reader):
+    """
+    Reads from a primary reader and, for the referrers that have hedging
+    enabled, issues the same query to a hedge reader (another replica) when
+    it is slower than usual. The first result wins and the other query is
+    cancelled.
+
+    Queries executed with `execute` only go to the primary reader.
+    """
+
+    def __init__(
+        self,
+        primary: Reader,
+        hedge: Reader,
+        policy: HedgingPolicy = hedging_policy,
+        max_workers: int = settings.HEDGED_READS_MAX_WORKERS,
+    ) -> None:
+        self.__primary = primary
+        self.__hedge = hedge
+        self.__policy = policy
+        self.__executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="hedged-reads"
+        )
+        self.__hedges_lock = threading.Lock()
+        # The ids of the hedge queries that are running.
+        self.__hedges: Set[str] = set()
+
+    def execute(
+        self,
+        query: FormattedQuery,
+        settings: Optional[Mapping[str, str]] = None,
+        with_totals: bool = False,
+        robust: bool = False,
+    ) -> Result:
+        return self.__primary.execute(query, settings, with_totals, robust)
+
+    def cancel(self, query_id: str) -> None:
+        self.__primary.cancel(query_id)
+        hedge_query_id = get_hedge_query_id(query_id)
+        with self.__hedges_lock:
+            hedged = hedge_query_id in self.__hedges
+        if hedged:
+            self.__hedge.cancel(hedge_query_id)
+
+    def __execute_hedge(
+        self,
+        query: FormattedQuery,
+        settings: Mapping[str, str],
+        with_totals: bool,
+        robust: bool,
+    ) -> Result:
+        hedge_query_id = settings["query_id"]
+        with self.__hedges_lock:
+            self.__hedges.add(hedge_query_id)
+        try:
+            return self.__hedge.execute(query, settings, with_totals, robust)
+        finally:
+            with self.__hedges_lock:
+                self.__hedges.discard(hedge_query_id)
+
+    def __cancel_quietly(self, reader: Reader, query_id: str) -> None:
+        try:
+            reader.cancel(query_id)
+        except Exception:
+            logger.warning("Failed to cancel query %s", query_id, exc_info=True)
+
+    def execute_hedged(
+        self,
+        query: FormattedQuery,
+        referrer: str,
+        settings: Optional[Mapping[str, str]] = None,
+        with_totals: bool = False,
+        robust: bool = False,
+    ) -> Result:
+        """
+        Executes the query on the primary reader and, if it has not returned
+        after the hedge delay of the referrer and the referrer is within its
+        budget, on the hedge reader as well.
+        """
+        budget, percentile, min_delay_ms = state.get_configs(
+            [
+                ("hedged_reads_budget", 0.05),
+                ("hedged_reads_percentile", 0.95),
+                ("hedged_reads_min_delay_ms", 50),
+            ]
+        )
+        assert budget is not None
+        assert percentile is not None
+        assert min_delay_ms is not None
+        tags = {"referrer": referrer}
+
+        # Both queries need an id to be cancelled.
+        settings = {"query_id": uuid.uuid4().hex, **(settings or {})}
+        query_id = settings["query_id"]
+        hedge_query_id = get_hedge_query_id(query_id)
+
+        start = time.time()
+        delay = self.__policy.get_delay(
+            referrer, float(percentile), float(min_delay_ms) / 1000
+        )
+        primary: Future[Result] = self.__executor.submit(
+            self.__primary.execute, query, settings, with_totals, robust
+        )
+        metrics.increment("executed", tags=tags)
+
+        if (
+            delay is None
+            or wait([primary], timeout=delay).done
+            or not self.__policy.try_hedge(referrer)
+        ):
+            try:
+                return primary.result()
+            finally:
+                self.__policy.record(referrer, time.time() - start, float(budget))
+
+        metrics.increment("hedged", tags=tags)
+        hedge: Future[Result] = self.__executor.submit(
+            self.__execute_hedge,
+            query,
+            {**settings, "query_id": hedge_query_id},
+            with_totals,
+            robust,
+        )
+
+        # The first successful result wins, if both queries fail the error
+        # of the primary query is raised.
+        pending = {primary, hedge}
+        winner = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next(
+                (future for future in done if future.exception() is None), None
+            )
+        self.__policy.record(referrer, time.time() - start, float(budget))
+        if winner is None:
+            return primary.result()
+
+        if winner is hedge:
+            metrics.increment("hedge_won", tags=tags)
+            if not primary.done():
+                self.__cancel_quietly(self.__primary, query_id)
+        elif not hedge.done():
+            self.__cancel_quietly(self.__hedge, hedge_query_id)
+
+        return winner.result()
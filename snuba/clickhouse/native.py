@@ -1,24 +1,38 @@
 import logging
 import queue
 import re
+import threading
 import time
 from datetime import date, datetime
-from typing import Any, Mapping, Optional, Sequence, Union
+from functools import lru_cache
+from typing import Any, Mapping, MutableSequence, Optional, Sequence, Union
 from uuid import UUID
+from weakref import WeakSet
 
 from clickhouse_driver import Client, errors
 from dateutil.tz import tz
 
-from snuba import settings, state
+from snuba import environment, settings, state
 from snuba.clickhouse.errors import ClickhouseError
 from snuba.clickhouse.formatter.nodes import FormattedQuery
-from snuba.reader import Reader, Result, build_result_transformer
+from snuba.reader import Reader, Result, Row, build_column_transformer
+from snuba.utils.metrics.types import Tags
+from snuba.utils.metrics.wrapper import MetricsWrapper
 
 logger = logging.getLogger("snuba.clickhouse")
 
 Params = Optional[Union[Sequence[Any], Mapping[str, Any]]]
 
 
+class _PooledConnection:
+    __slots__ = ["client", "created_at", "last_used"]
+
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+
 class ClickhousePool(object):
     def __init__(
         self,
@@ -31,6 +45,10 @@ class ClickhousePool(object):
         send_receive_timeout: Optional[int] = 300,
         max_pool_size: int = settings.CLICKHOUSE_MAX_POOL_SIZE,
         client_settings: Mapping[str, Any] = {},
+        max_connection_age: Optional[
+            float
+        ] = settings.CLICKHOUSE_POOL_MAX_CONNECTION_AGE_SEC,
+        metrics_tags: Optional[Tags] = None,
     ) -> None:
         self.host = host
         self.port = port
@@ -40,13 +58,128 @@ class ClickhousePool(object):
         self.connect_timeout = connect_timeout
         self.send_receive_timeout = send_receive_timeout
         self.client_settings = client_settings
+        self.max_connection_age = max_connection_age
+        self.metrics = MetricsWrapper(
+            environment.metrics,
+            "clickhouse.pool",
+            {"host": host, "port": str(port), **(metrics_tags or {})},
+        )
 
-        self.pool: queue.LifoQueue[Optional[Client]] = queue.LifoQueue(max_pool_size)
+        self.pool: queue.LifoQueue[Optional[_PooledConnection]] = queue.LifoQueue(
+            max_pool_size
+        )
+        self.__in_use = 0
+        self.__in_use_lock = threading.Lock()
 
         # Fill the queue up so that doing get() on it will block properly
         for _ in range(max_pool_size):
             self.pool.put(None)
 
+        if settings.CLICKHOUSE_POOL_KEEPALIVE_INTERVAL_SEC is not None:
+            _keepalive.register(self)
+
+    def __checkout(self) -> Optional[_PooledConnection]:
+        start = time.time()
+        try:
+            conn = self.pool.get(block=False)
+        except queue.Empty:
+            self.metrics.increment("exhausted")
+            conn = self.pool.get(block=True)
+        self.metrics.timing("checkout_wait", (time.time() - start) * 1000)
+
+        with self.__in_use_lock:
+            self.__in_use += 1
+            self.metrics.gauge("in_use", self.__in_use)
+
+        if conn is not None and self.__is_expired(conn):
+            self.metrics.increment("recycled")
+            conn.client.disconnect()
+            return None
+        return conn
+
+    def __checkin(self, conn: Optional[_PooledConnection]) -> None:
+        if conn is not None:
+            conn.last_used = time.time()
+        with self.__in_use_lock:
+            self.__in_use -= 1
+            self.metrics.gauge("in_use", self.__in_use)
+        self.pool.put(conn, block=False)
+
+    def __is_expired(self, conn: _PooledConnection) -> bool:
+        return (
+            self.max_connection_age is not None
+            and time.time() - conn.created_at >= self.max_connection_age
+        )
+
+    def warmup(self, connections: int) -> None:
+        """
+        Opens up to the number of connections provided, so that the first
+        queries do not pay for establishing them.
+        """
+        taken = []
+        try:
+            for _ in range(connections):
+                taken.append(self.pool.get(block=False))
+        except queue.Empty:
+            pass
+
+        try:
+            for index, conn in enumerate(taken):
+                if conn is None:
+                    conn = taken[index] = _PooledConnection(self._create_conn())
+                    conn.client.connection.force_connect()
+        finally:
+            # Puts them back in reverse order so the pool keeps its order.
+            for conn in reversed(taken):
+                self.pool.put(conn, block=False)
+
+    def keepalive(self, idle_time: float) -> None:
+        """
+        Pings the connections that have not been used for the idle time
+        provided, so they are not closed by the server or by anything in
+        between while idle, and closes the ones that are too old or fail
+        the ping.
+        """
+        # Connections are checked in on top of the stack, so the idle ones
+        # are at its bottom. Only those are taken, the connections in use
+        # and the other free ones stay available.
+        now = time.time()
+        with self.pool.mutex:
+            idle = [
+                c
+                for c in self.pool.queue
+                if c is not None and now - c.last_used >= idle_time
+            ]
+            for conn in idle:
+                self.pool.queue.remove(conn)
+
+        # The most recently used idle connection goes back first, each one
+        # under the connections that were used since, so the pool keeps its
+        # order.
+        for conn in reversed(idle):
+            checked: Optional[_PooledConnection] = conn
+            try:
+                if self.__is_expired(conn):
+                    self.metrics.increment("recycled")
+                    conn.client.disconnect()
+                    checked = None
+                elif conn.client.connection.connected:
+                    if conn.client.connection.ping():
+                        conn.last_used = time.time()
+                    else:
+                        self.metrics.increment("keepalive_failed")
+                        conn.client.disconnect()
+                        checked = None
+            except Exception:
+                logger.warning("Failed to ping %s", self.host, exc_info=True)
+                self.metrics.increment("keepalive_failed")
+                conn.client.disconnect()
+                checked = None
+            finally:
+                with self.pool.mutex:
+                    self.pool.queue.insert(0, checked)
+                    self.pool.not_empty.notify()
+
     # This will actually return an int if an INSERT query is run, but we never capture the
     # output of INSERT queries so I left this as a Sequence.
     def execute(
@@ -67,18 +200,18 @@ class ClickhousePool(object):
         return relatively quickly with an error in case of more persistent
         failures.
         """
+        conn = self.__checkout()
         try:
-            conn = self.pool.get(block=True)
-
             attempts_remaining = 2
             while attempts_remaining > 0:
                 attempts_remaining -= 1
                 # Lazily create connection instances
                 if conn is None:
-                    conn = self._create_conn()
+                    conn = _PooledConnection(self._create_conn())
+                    self.metrics.increment("connect")
 
                 try:
-                    result: Sequence[Any] = conn.execute(
+                    result: Sequence[Any] = conn.client.execute(
                         query,
                         params=params,
                         with_column_types=with_column_types,
@@ -91,6 +224,7 @@ class ClickhousePool(object):
                 except (errors.NetworkError, errors.SocketTimeoutError, EOFError) as e:
                     # Force a reconnection next time
                     conn = None
+                    self.metrics.increment("reconnect")
                     if attempts_remaining == 0:
                         if isinstance(e, errors.Error):
                             raise ClickhouseError(e.code, e.message) from e
@@ -103,7 +237,7 @@ class ClickhousePool(object):
                 except errors.Error as e:
                     raise ClickhouseError(e.code, e.message) from e
         finally:
-            self.pool.put(conn, block=False)
+            self.__checkin(conn)
 
         return []
 
@@ -170,6 +304,25 @@ class ClickhousePool(object):
             except errors.Error as e:
                 raise ClickhouseError(e.code, e.message) from e
 
+    def cancel(self, query_id: str) -> None:
+        """
+        Kills the query with the given id, if it is still running. This
+        uses a connection of its own since the query to kill holds one of
+        the pool, which is likely to be exhausted when queries need to be
+        killed.
+        """
+        client = self._create_conn()
+        try:
+            client.execute(
+                "KILL QUERY WHERE query_id = %(query_id)s ASYNC",
+                {"query_id": query_id},
+            )
+        except errors.Error as e:
+            raise ClickhouseError(e.code, e.message) from e
+        finally:
+            client.disconnect()
+        self.metrics.increment("cancel")
+
     def _create_conn(self) -> Client:
         return Client(
             host=self.host,
@@ -187,11 +340,47 @@ class ClickhousePool(object):
             while True:
                 conn = self.pool.get(block=False)
                 if conn:
-                    conn.disconnect()
+                    conn.client.disconnect()
         except queue.Empty:
             pass
 
 
+class _KeepaliveThread:
+    """
+    Background thread that periodically runs the keepalive of all the
+    pools of the process.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.__interval = interval
+        self.__pools: WeakSet[ClickhousePool] = WeakSet()
+        self.__lock = threading.Lock()
+        self.__thread: Optional[threading.Thread] = None
+
+    def register(self, pool: ClickhousePool) -> None:
+        with self.__lock:
+            self.__pools.add(pool)
+            if self.__thread is None:
+                self.__thread = threading.Thread(
+                    target=self.__run, name="clickhouse-keepalive", daemon=True
+                )
+                self.__thread.start()
+
+    def __run(self) -> None:
+        while True:
+            time.sleep(self.__interval)
+            with self.__lock:
+                pools = list(self.__pools)
+            for pool in pools:
+                try:
+                    pool.keepalive(self.__interval)
+                except Exception:
+                    logger.warning("Keepalive of %s failed", pool.host, exc_info=True)
+
+
+_keepalive = _KeepaliveThread(settings.CLICKHOUSE_POOL_KEEPALIVE_INTERVAL_SEC or 0)
+
+
 def transform_date(value: date) -> str:
     """
     Convert a timezone-naive date object into an ISO 8601 formatted date and
@@ -210,10 +399,9 @@ def transform_datetime(value: datetime) -> str:
     and time string representation.
     """
     if value.tzinfo is None:
-        value = value.replace(tzinfo=tz.tzutc())
-    else:
-        value = value.astimezone(tz.tzutc())
-    return value.isoformat()
+        # Same as formatting the value with a UTC time zone, but cheaper.
+        return f"{value.isoformat()}+00:00"
+    return value.astimezone(tz.tzutc()).isoformat()
 
 
 def transform_uuid(value: UUID) -> str:
@@ -223,10 +411,20 @@ def transform_uuid(value: UUID) -> str:
     return str(value)
 
 
-transform_column_types = build_result_transformer(
+# Dates and times repeat a lot across the rows of a result (time buckets,
+# for instance) and across queries, so their formatting is cached.
+TRANSFORM_CACHE_SIZE = 10000
+
+transform_columns = build_column_transformer(
     [
-        (re.compile(r"^Date(\(.+\))?$"), transform_date),
-        (re.compile(r"^DateTime(\(.+\))?$"), transform_datetime),
+        (
+            re.compile(r"^Date(\(.+\))?$"),
+            lru_cache(maxsize=TRANSFORM_CACHE_SIZE)(transform_date),
+        ),
+        (
+            re.compile(r"^DateTime(\(.+\))?$"),
+            lru_cache(maxsize=TRANSFORM_CACHE_SIZE)(transform_datetime),
+        ),
         (re.compile(r"^UUID$"), transform_uuid),
     ]
 )
@@ -241,20 +439,27 @@ class NativeDriverReader(Reader):
         Transform a native driver response into a response that is
         structurally similar to a ClickHouse-flavored JSON response.
         """
-        data, meta = result
+        columns, meta = result
 
         # XXX: Rows are represented as mappings that are keyed by column or
         # alias, which is problematic when the result set contains duplicate
         # names. To ensure that the column headers and row data are consistent
         # duplicated names are discarded at this stage.
-        columns = {c[0]: i for i, c in enumerate(meta)}
+        indexes = {c[0]: i for i, c in enumerate(meta)}
 
-        data = [
-            {column: row[index] for column, index in columns.items()} for row in data
+        meta = [
+            {"name": m[0], "type": m[1]} for m in [meta[i] for i in indexes.values()]
         ]
 
-        meta = [
-            {"name": m[0], "type": m[1]} for m in [meta[i] for i in columns.values()]
+        # The driver returns no columns at all when there are no rows.
+        if columns:
+            columns = [columns[i] for i in indexes.values()]
+            transform_columns(meta, columns)
+
+        # Rows are only built once all the columns are transformed.
+        names = list(indexes)
+        data: MutableSequence[Row] = [
+            dict(zip(names, values)) for values in zip(*columns)
         ]
 
         new_result: Result = {}
@@ -265,8 +470,6 @@ class NativeDriverReader(Reader):
         else:
             new_result = {"data": data, "meta": meta}
 
-        transform_column_types(new_result)
-
         return new_result
 
     def execute(
@@ -293,6 +496,10 @@ class NativeDriverReader(Reader):
                 with_column_types=True,
                 query_id=query_id,
                 settings=settings,
+                columnar=True,
             ),
             with_totals=with_totals,
         )
+
+    def cancel(self, query_id: str) -> None:
+        self.__client.cancel(query_id)
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Mapping, MutableMapping, Optional, Set
 
+from snuba.clickhouse.query import Query as ClickhouseQuery
 from snuba.clickhouse.query_dsl.accessors import get_time_range
 from snuba.query import ProcessableQuery
 from snuba.query.composite import CompositeQuery
@@ -49,11 +50,13 @@ class TablesCollector(DataSourceVisitor[None, Table], JoinVisitor[None, Table]):
     def __init__(self) -> None:
         self.__tables: Set[str] = set()
         self.__max_time_range: Optional[int] = None
+        self.__unbounded_time_range: bool = False
         self.__has_complex_conditions: bool = False
         self.__final: bool = False
         self.__sample_rate: Optional[float] = None
         self.__all_raw_columns: MutableMapping[str, Set[ColumnExpr]] = {}
         self.__all_conditions: MutableMapping[str, Expression] = {}
+        self.__all_prewheres: MutableMapping[str, Expression] = {}
         self.__all_groupby: MutableMapping[str, Set[Expression]] = {}
         self.__all_array_joins: MutableMapping[str, Set[Expression]] = {}
 
@@ -63,6 +66,13 @@ class TablesCollector(DataSourceVisitor[None, Table], JoinVisitor[None, Table]):
     def get_max_time_range(self) -> Optional[int]:
         return self.__max_time_range
 
+    def any_unbounded_time_range(self) -> bool:
+        """
+        True if the time range of some query could not be found, while
+        get_max_time_range is also None for ranges shorter than a day.
+        """
+        return self.__unbounded_time_range
+
     def has_complex_condition(self) -> bool:
         return self.__has_complex_conditions
 
@@ -78,6 +88,9 @@ class TablesCollector(DataSourceVisitor[None, Table], JoinVisitor[None, Table]):
     def get_all_conditions(self) -> Mapping[str, Expression]:
         return self.__all_conditions
 
+    def get_all_prewheres(self) -> Mapping[str, Expression]:
+        return self.__all_prewheres
+
     def get_all_groupby(self) -> Mapping[str, Set[Expression]]:
         return self.__all_groupby
 
@@ -119,7 +132,9 @@ class TablesCollector(DataSourceVisitor[None, Table], JoinVisitor[None, Table]):
 
     def _visit_simple_query(self, data_source: ProcessableQuery[Table]) -> None:
         time_range = _get_date_range(data_source)
-        if time_range and (
+        if time_range is None:
+            self.__unbounded_time_range = True
+        elif time_range and (
             self.__max_time_range is None or time_range > self.__max_time_range
         ):
             self.__max_time_range = time_range
@@ -137,6 +152,11 @@ class TablesCollector(DataSourceVisitor[None, Table], JoinVisitor[None, Table]):
         if condition is not None:
             self.__all_conditions[table_name] = condition
 
+        if isinstance(data_source, ClickhouseQuery):
+            prewhere = data_source.get_prewhere_ast()
+            if prewhere is not None:
+                self.__all_prewheres[table_name] = prewhere
+
         self.__all_groupby[table_name] = set(data_source.get_groupby())
 
         self.__all_array_joins[table_name] = self._list_array_join(data_source)
@@ -101,6 +101,7 @@ def generate_profile(
             ),
             groupby_cols=_list_columns(collector.get_all_groupby()),
             array_join_cols=_list_columns(collector.get_all_arrayjoin()),
+            prewhere_cols=_list_columns_in_condition(collector.get_all_prewheres()),
         )
     except Exception:
         # Should never happen, but it is not worth failing queries while
@@ -0,0 +1,235 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
+
+from snuba import environment, settings
+from snuba.clickhouse.escaping import escape_identifier, escape_string
+from snuba.clickhouse.native import ClickhousePool
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+logger = logging.getLogger(__name__)
+
+metrics = MetricsWrapper(environment.metrics, "clickhouse.statistics")
+
+
+@dataclass(frozen=True)
+class ColumnStatistics:
+    """
+    Approximate statistics about a column of a ClickHouse table.
+
+    The compressed size comes from `system.columns` while the number of
+    distinct values and the fraction of nulls are estimated on a sample
+    of rows. The sampled fields are None when the column was not sampled.
+    """
+
+    compressed_bytes: int
+    distinct_values: Optional[int] = None
+    null_fraction: Optional[float] = None
+
+
+TableStatistics = Mapping[str, ColumnStatistics]
+
+# Fetches the statistics of a table given the name of the table and the
+# list of columns to sample.
+StatisticsFetcher = Callable[[str, Sequence[str]], TableStatistics]
+
+
+def _get_table_connection(table_name: str) -> Optional[Tuple[ClickhousePool, str, str]]:
+    """
+    Finds the connection to a node storing the local table that backs
+    the table name we see in a query, together with the database and the
+    local table name.
+    """
+    # Storages depend on the query processors that consume these statistics
+    # so the factory cannot be imported at module level.
+    from snuba.clusters.cluster import ClickhouseClientSettings
+    from snuba.datasets.schemas.tables import TableSchema
+    from snuba.datasets.storages.factory import STORAGES
+
+    for storage in STORAGES.values():
+        schema = storage.get_schema()
+        if not isinstance(schema, TableSchema):
+            continue
+        if table_name not in (schema.get_table_name(), schema.get_local_table_name()):
+            continue
+
+        cluster = storage.get_cluster()
+        # Distributed tables have no data on their own, the compressed size
+        # has to be read from a node that stores the local table.
+        node = cluster.get_local_nodes()[0]
+        return (
+            cluster.get_node_connection(ClickhouseClientSettings.QUERY, node),
+            cluster.get_database(),
+            schema.get_local_table_name(),
+        )
+
+    return None
+
+
+def fetch_table_statistics(
+    table_name: str, sampled_columns: Sequence[str]
+) -> TableStatistics:
+    """
+    Reads the compressed size of each column of the table from
+    `system.columns` and samples the distinct values and null fraction
+    for the columns provided.
+
+    Rows are sampled through the sampling key of the table. Tables without
+    one can only be read from the start, in sorting key order, which says
+    nothing about the columns of the sorting key: those are not sampled.
+    """
+    table_connection = _get_table_connection(table_name)
+    if table_connection is None:
+        return {}
+    connection, database, local_table = table_connection
+
+    sizes = {
+        name: int(compressed_bytes)
+        for name, compressed_bytes in connection.execute(
+            "SELECT name, data_compressed_bytes FROM system.columns "
+            f"WHERE database = {escape_string(database)} "
+            f"AND table = {escape_string(local_table)}"
+        )
+    }
+
+    keys = connection.execute(
+        "SELECT sampling_key, sorting_key FROM system.tables "
+        f"WHERE database = {escape_string(database)} "
+        f"AND name = {escape_string(local_table)}"
+    )
+    sampling_key, sorting_key = keys[0] if keys else ("", "")
+
+    columns = [c for c in sampled_columns if c in sizes]
+    if not sampling_key:
+        sorting_key_columns = set(re.findall(r"\w+", sorting_key))
+        columns = [c for c in columns if c not in sorting_key_columns]
+    if not columns:
+        return {name: ColumnStatistics(size) for name, size in sizes.items()}
+
+    rows = int(settings.PREWHERE_STATISTICS_SAMPLE_ROWS)
+    sample_clause = f"SAMPLE {rows} " if sampling_key else ""
+    escaped = [escape_identifier(c) for c in columns]
+    aggregations = ", ".join(
+        f"uniq({column}), countIf(isNull({column}))" for column in escaped
+    )
+    [sample] = connection.execute(
+        f"SELECT count(), {aggregations} FROM ("
+        f"SELECT {', '.join(str(c) for c in escaped)} "
+        f"FROM {escape_identifier(database)}.{escape_identifier(local_table)} "
+        f"{sample_clause}LIMIT {rows})"
+    )
+    sampled_rows = int(sample[0])
+
+    statistics: MutableMapping[str, ColumnStatistics] = {
+        name: ColumnStatistics(size) for name, size in sizes.items()
+    }
+    if sampled_rows == 0:
+        return statistics
+
+    for index, column in enumerate(columns):
+        statistics[column] = ColumnStatistics(
+            compressed_bytes=sizes[column],
+            distinct_values=int(sample[1 + 2 * index]),
+            null_fraction=int(sample[2 + 2 * index]) / sampled_rows,
+        )
+    return statistics
+
+
+class TableStatisticsCache:
+    """
+    In memory cache of the statistics of the tables we query.
+
+    Reading from the cache never hits ClickHouse. Instead, the first time
+    a table (or a new column of the table) is requested, the table is
+    scheduled for a refresh that happens in a background thread. From that
+    point on the statistics of that table are periodically refreshed.
+    Readers get None until the first refresh of a table has completed.
+    """
+
+    def __init__(
+        self,
+        fetcher: StatisticsFetcher = fetch_table_statistics,
+        refresh_interval: float = settings.PREWHERE_STATISTICS_REFRESH_INTERVAL,
+    ) -> None:
+        self.__fetcher = fetcher
+        self.__refresh_interval = refresh_interval
+        self.__lock = threading.Lock()
+        self.__statistics: MutableMapping[str, TableStatistics] = {}
+        self.__refreshed_at: MutableMapping[str, float] = {}
+        self.__requested_columns: MutableMapping[str, Set[str]] = {}
+        self.__pending: Set[str] = set()
+        self.__wakeup = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def get(self, table_name: str, columns: Sequence[str]) -> Optional[TableStatistics]:
+        """
+        Returns the cached statistics for the table if any and schedules
+        a refresh if some of the columns provided have never been sampled.
+        """
+        with self.__lock:
+            requested = self.__requested_columns.get(table_name)
+            if requested is None or not requested.issuperset(columns):
+                self.__requested_columns[table_name] = (requested or set()) | set(
+                    columns
+                )
+                self.__pending.add(table_name)
+                self.__ensure_refresh_thread()
+                self.__wakeup.set()
+            return self.__statistics.get(table_name)
+
+    def refresh(self, table_name: str) -> None:
+        """
+        Fetches the statistics of one table synchronously.
+        """
+        with self.__lock:
+            columns = sorted(self.__requested_columns.get(table_name, set()))
+
+        start = time.time()
+        statistics = self.__fetcher(table_name, columns)
+        metrics.timing(
+            "refresh", (time.time() - start) * 1000, tags={"table": table_name}
+        )
+
+        with self.__lock:
+            self.__statistics[table_name] = statistics
+            self.__refreshed_at[table_name] = time.time()
+
+    def __ensure_refresh_thread(self) -> None:
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__thread = threading.Thread(
+            target=self.__run, name="table-statistics-refresh", daemon=True
+        )
+        self.__thread.start()
+
+    def __tables_to_refresh(self) -> Sequence[str]:
+        now = time.time()
+        with self.__lock:
+            tables = [
+                table
+                for table in self.__requested_columns
+                if table in self.__pending
+                or now - self.__refreshed_at.get(table, 0) >= self.__refresh_interval
+            ]
+            self.__pending.clear()
+        return tables
+
+    def __run(self) -> None:
+        while True:
+            self.__wakeup.wait(timeout=self.__refresh_interval)
+            self.__wakeup.clear()
+            for table_name in self.__tables_to_refresh():
+                try:
+                    self.refresh(table_name)
+                except Exception:
+                    logger.warning(
+                        "Failed to refresh statistics for table %s",
+                        table_name,
+                        exc_info=True,
+                    )
+
+
+table_statistics = TableStatisticsCache()
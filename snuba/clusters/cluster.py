@@ -1,3 +1,4 @@
+import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
@@ -16,6 +17,7 @@ from typing import (
 
 from snuba import settings
 from snuba.clickhouse.escaping import escape_string
+from snuba.clickhouse.hedged_reader import HedgedReader
 from snuba.clickhouse.http import HTTPBatchWriter, InsertStatement, JSONRow
 from snuba.clickhouse.native import ClickhousePool, NativeDriverReader
 from snuba.clusters.storage_sets import DEV_STORAGE_SETS, StorageSetKey
@@ -23,6 +25,8 @@ from snuba.reader import Reader
 from snuba.utils.metrics import MetricsBackend
 from snuba.writer import BatchWriter
 
+logger = logging.getLogger(__name__)
+
 
 class ClickhouseClientSettingsType(NamedTuple):
     settings: Mapping[str, Any]
@@ -157,9 +161,18 @@ class ClickhouseCluster(Cluster[ClickhouseWriterOptions]):
         # The cluster name and distributed cluster name only apply if single_node is set to False
         cluster_name: Optional[str] = None,
         distributed_cluster_name: Optional[str] = None,
+        # Another replica, or load balancer, that slow queries of some
+        # referrers are also sent to (see HedgedReader).
+        hedge_host: Optional[str] = None,
+        hedge_port: Optional[int] = None,
     ):
         super().__init__(storage_sets)
         self.__query_node = ClickhouseNode(host, port)
+        self.__hedge_node = (
+            ClickhouseNode(hedge_host, hedge_port or port)
+            if hedge_host is not None
+            else None
+        )
         self.__user = user
         self.__password = password
         self.__database = database
@@ -209,6 +222,7 @@ class ClickhouseCluster(Cluster[ClickhouseWriterOptions]):
                 self.__database,
                 client_settings=settings,
                 send_receive_timeout=timeout,
+                metrics_tags={"client_settings": client_settings.name.lower()},
             )
 
         return self.__connection_cache[cache_key]
@@ -218,6 +232,15 @@ class ClickhouseCluster(Cluster[ClickhouseWriterOptions]):
             self.__reader = NativeDriverReader(
                 self.get_query_connection(ClickhouseClientSettings.QUERY)
             )
+            if self.__hedge_node is not None:
+                self.__reader = HedgedReader(
+                    self.__reader,
+                    NativeDriverReader(
+                        self.get_node_connection(
+                            ClickhouseClientSettings.QUERY, self.__hedge_node
+                        )
+                    ),
+                )
         return self.__reader
 
     def get_batch_writer(
@@ -296,6 +319,8 @@ CLUSTERS = [
         distributed_cluster_name=cluster["distributed_cluster_name"]
         if "distributed_cluster_name" in cluster
         else None,
+        hedge_host=cluster.get("hedge_host"),
+        hedge_port=cluster.get("hedge_port"),
     )
     for cluster in settings.CLUSTERS
 ]
@@ -335,3 +360,19 @@ def get_cluster(storage_set_key: StorageSetKey) -> ClickhouseCluster:
         storage_set_key not in DEV_STORAGE_SETS or settings.ENABLE_DEV_FEATURES
     ), f"Storage set {storage_set_key} is disabled"
     return _STORAGE_SET_CLUSTER_MAP[storage_set_key]
+
+
+def warmup_query_connections(connections: int) -> None:
+    """
+    Opens connections to the query node of every cluster, so that the
+    first queries of a process do not pay for establishing them.
+    """
+    for cluster in CLUSTERS:
+        try:
+            cluster.get_query_connection(ClickhouseClientSettings.QUERY).warmup(
+                connections
+            )
+        except Exception:
+            logger.warning(
+                "Failed to warm up connections to %s", cluster, exc_info=True
+            )
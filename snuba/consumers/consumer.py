@@ -1,3 +1,4 @@
+import functools
 import itertools
 import logging
 import time
@@ -6,6 +7,7 @@ from pickle import PickleBuffer
 from typing import (
     Any,
     Callable,
+    Iterable,
     Mapping,
     MutableSequence,
     NamedTuple,
@@ -36,11 +38,16 @@ from snuba.datasets.storage import WritableTableStorage
 from snuba.datasets.storages import StorageKey
 from snuba.datasets.table_storage import TableWriter
 from snuba.environment import setup_sentry
-from snuba.processor import InsertBatch, MessageProcessor, ReplacementBatch
+from snuba.processor import (
+    InsertBatch,
+    MessageProcessor,
+    ReplacementBatch,
+    RowAggregator,
+)
 from snuba.utils.metrics import MetricsBackend
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.utils.streams.configuration_builder import build_kafka_producer_configuration
-from snuba.writer import BatchWriter
+from snuba.writer import BatchWriter, WriterTableRow
 
 logger = logging.getLogger("snuba.consumer")
 
@@ -61,34 +68,67 @@ class JSONRowInsertBatch(NamedTuple):
             return type(self), (self.rows, self.origin_timestamp)
 
 
-class InsertBatchWriter(ProcessingStep[JSONRowInsertBatch]):
-    def __init__(self, writer: BatchWriter[JSONRow], metrics: MetricsBackend) -> None:
+class InsertBatchWriter(ProcessingStep[Union[JSONRowInsertBatch, InsertBatch]]):
+    """
+    Writes the rows of all the batches it receives. Batches of rows that
+    are not encoded yet are combined by the row aggregator before being
+    encoded and written.
+    """
+
+    def __init__(
+        self,
+        writer: BatchWriter[JSONRow],
+        metrics: MetricsBackend,
+        row_aggregator: Optional[RowAggregator] = None,
+    ) -> None:
         self.__writer = writer
         self.__metrics = metrics
+        self.__row_aggregator = row_aggregator
 
-        self.__messages: MutableSequence[Message[JSONRowInsertBatch]] = []
+        self.__messages: MutableSequence[
+            Message[Union[JSONRowInsertBatch, InsertBatch]]
+        ] = []
         self.__closed = False
 
     def poll(self) -> None:
         pass
 
-    def submit(self, message: Message[JSONRowInsertBatch]) -> None:
+    def submit(self, message: Message[Union[JSONRowInsertBatch, InsertBatch]]) -> None:
         assert not self.__closed
+        assert (
+            isinstance(message.payload, JSONRowInsertBatch)
+            or self.__row_aggregator is not None
+        ), "writer not configured to aggregate rows"
 
         self.__messages.append(message)
 
+    def __get_rows(self) -> Iterable[JSONRow]:
+        rows: MutableSequence[Sequence[JSONRow]] = []
+        pending_rows: MutableSequence[WriterTableRow] = []
+        for message in self.__messages:
+            if isinstance(message.payload, JSONRowInsertBatch):
+                rows.append(message.payload.rows)
+            else:
+                pending_rows.extend(message.payload.rows)
+
+        if pending_rows:
+            assert self.__row_aggregator is not None
+            aggregated_rows = self.__row_aggregator.aggregate(pending_rows)
+            self.__metrics.increment("rows_aggregated", len(pending_rows))
+            self.__metrics.increment("rows_after_aggregation", len(aggregated_rows))
+            rows.append([json_row_encoder.encode(row) for row in aggregated_rows])
+
+        return itertools.chain.from_iterable(rows)
+
     def close(self) -> None:
         self.__closed = True
 
         if not self.__messages:
             return
 
+        rows = self.__get_rows()
         write_start = time.time()
-        self.__writer.write(
-            itertools.chain.from_iterable(
-                message.payload.rows for message in self.__messages
-            )
-        )
+        self.__writer.write(rows)
         write_finish = time.time()
 
         for message in self.__messages:
@@ -176,7 +216,7 @@ class ReplacementBatchWriter(ProcessingStep[ReplacementBatch]):
 
 
 class ProcessedMessageBatchWriter(
-    ProcessingStep[Union[None, JSONRowInsertBatch, ReplacementBatch]]
+    ProcessingStep[Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch]]
 ):
     def __init__(
         self,
@@ -195,16 +235,19 @@ class ProcessedMessageBatchWriter(
             self.__replacement_batch_writer.poll()
 
     def submit(
-        self, message: Message[Union[None, JSONRowInsertBatch, ReplacementBatch]]
+        self,
+        message: Message[
+            Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch]
+        ],
     ) -> None:
         assert not self.__closed
 
         if message.payload is None:
             return
 
-        if isinstance(message.payload, JSONRowInsertBatch):
+        if isinstance(message.payload, (JSONRowInsertBatch, InsertBatch)):
             self.__insert_batch_writer.submit(
-                cast(Message[JSONRowInsertBatch], message)
+                cast(Message[Union[JSONRowInsertBatch, InsertBatch]], message)
             )
         elif isinstance(message.payload, ReplacementBatch):
             if self.__replacement_batch_writer is None:
@@ -284,14 +327,21 @@ def build_batch_writer(
 
 class MultistorageCollector(
     ProcessingStep[
-        Sequence[Tuple[StorageKey, Union[None, JSONRowInsertBatch, ReplacementBatch]]]
+        Sequence[
+            Tuple[
+                StorageKey,
+                Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch],
+            ]
+        ]
     ]
 ):
     def __init__(
         self,
         steps: Mapping[
             StorageKey,
-            ProcessingStep[Union[None, JSONRowInsertBatch, ReplacementBatch]],
+            ProcessingStep[
+                Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch]
+            ],
         ],
     ):
         self.__steps = steps
@@ -306,7 +356,10 @@ class MultistorageCollector(
         self,
         message: Message[
             Sequence[
-                Tuple[StorageKey, Union[None, JSONRowInsertBatch, ReplacementBatch]]
+                Tuple[
+                    StorageKey,
+                    Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch],
+                ]
             ]
         ],
     ) -> None:
@@ -374,8 +427,10 @@ def process_message(
 
 
 def process_message_multistorage(
-    message: Message[MultistorageKafkaPayload],
-) -> Sequence[Tuple[StorageKey, Union[None, JSONRowInsertBatch, ReplacementBatch]]]:
+    message: Message[MultistorageKafkaPayload], pre_aggregate: bool = False,
+) -> Sequence[
+    Tuple[StorageKey, Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch]]
+]:
     # XXX: Avoid circular import on KafkaMessageMetadata, remove when that type
     # is itself removed.
     from snuba.datasets.storages.factory import get_writable_storage
@@ -386,18 +441,25 @@ def process_message_multistorage(
     )
 
     results: MutableSequence[
-        Tuple[StorageKey, Union[None, JSONRowInsertBatch, ReplacementBatch]]
+        Tuple[
+            StorageKey, Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch]
+        ]
     ] = []
 
     for storage_key in message.payload.storage_keys:
-        result = (
-            get_writable_storage(storage_key)
-            .get_table_writer()
-            .get_stream_loader()
-            .get_processor()
-            .process_message(value, metadata)
+        stream_loader = (
+            get_writable_storage(storage_key).get_table_writer().get_stream_loader()
         )
-        if isinstance(result, InsertBatch):
+        result = stream_loader.get_processor().process_message(value, metadata)
+        if (
+            isinstance(result, InsertBatch)
+            and pre_aggregate
+            and stream_loader.get_row_aggregator() is not None
+        ):
+            # The rows are encoded by the writer once they are aggregated
+            # with the rest of the batch.
+            results.append((storage_key, result))
+        elif isinstance(result, InsertBatch):
             results.append(
                 (
                     storage_key,
@@ -426,6 +488,7 @@ class MultistorageConsumerProcessingStrategyFactory(
         output_block_size: Optional[int],
         metrics: MetricsBackend,
         kafka_override_config: Optional[str] = None,
+        pre_aggregate: bool = False,
     ):
         if processes is not None:
             assert input_block_size is not None, "input block size required"
@@ -445,6 +508,7 @@ class MultistorageConsumerProcessingStrategyFactory(
         self.__input_block_size = input_block_size
         self.__output_block_size = output_block_size
         self.__kafka_override_config = kafka_override_config
+        self.__pre_aggregate = pre_aggregate
         self.__metrics = metrics
 
     def __find_destination_storages(
@@ -484,7 +548,9 @@ class MultistorageConsumerProcessingStrategyFactory(
 
             if self.__kafka_override_config is not None:
                 with open(self.__kafka_override_config) as kafka_config_fh:
-                    logger.debug("Loading the Kafka configuration override from '%s'...")
+                    logger.debug(
+                        "Loading the Kafka configuration override from '%s'..."
+                    )
                     override_params.update(json.load(kafka_config_fh))
 
             replacement_batch_writer = ReplacementBatchWriter(
@@ -505,6 +571,7 @@ class MultistorageConsumerProcessingStrategyFactory(
                     "insertions",
                     {"storage": storage.get_storage_key().value},
                 ),
+                stream_loader.get_row_aggregator() if self.__pre_aggregate else None,
             ),
             replacement_batch_writer,
         )
@@ -512,7 +579,12 @@ class MultistorageConsumerProcessingStrategyFactory(
     def __build_collector(
         self,
     ) -> ProcessingStep[
-        Sequence[Tuple[StorageKey, Union[None, JSONRowInsertBatch, ReplacementBatch]]]
+        Sequence[
+            Tuple[
+                StorageKey,
+                Union[None, JSONRowInsertBatch, InsertBatch, ReplacementBatch],
+            ]
+        ]
     ]:
         return MultistorageCollector(
             {
@@ -537,13 +609,17 @@ class MultistorageConsumerProcessingStrategyFactory(
 
         strategy: ProcessingStrategy[MultistorageKafkaPayload]
 
+        process = functools.partial(
+            process_message_multistorage, pre_aggregate=self.__pre_aggregate
+        )
+
         if self.__processes is None:
-            strategy = TransformStep(process_message_multistorage, collect)
+            strategy = TransformStep(process, collect)
         else:
             assert self.__input_block_size is not None
             assert self.__output_block_size is not None
             strategy = ParallelTransformStep(
-                process_message_multistorage,
+                process,
                 collect,
                 self.__processes,
                 self.__max_batch_size,
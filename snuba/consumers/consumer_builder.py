@@ -56,6 +56,7 @@ class ConsumerBuilder:
         kafka_override_config: Optional[str] = None,
         commit_retry_policy: Optional[RetryPolicy] = None,
         profile_path: Optional[str] = None,
+        catch_up_processes: Optional[int] = None,
     ) -> None:
         self.storage = get_writable_storage(storage_key)
         self.bootstrap_servers = bootstrap_servers
@@ -124,6 +125,7 @@ class ConsumerBuilder:
         self.queued_max_messages_kbytes = queued_max_messages_kbytes
         self.queued_min_messages = queued_min_messages
         self.processes = processes
+        self.catch_up_processes = catch_up_processes
         self.input_block_size = input_block_size
         self.output_block_size = output_block_size
         self.__profile_path = profile_path
@@ -177,6 +179,7 @@ class ConsumerBuilder:
         processor_wrapper: Optional[
             Callable[[MessageProcessor], MessageProcessor]
         ] = None,
+        processes: Optional[int] = None,
     ) -> ProcessingStrategyFactory[KafkaPayload]:
         table_writer = self.storage.get_table_writer()
         stream_loader = table_writer.get_stream_loader()
@@ -200,7 +203,7 @@ class ConsumerBuilder:
             ),
             max_batch_size=self.max_batch_size,
             max_batch_time=self.max_batch_time_ms / 1000.0,
-            processes=self.processes,
+            processes=processes if processes is not None else self.processes,
             input_block_size=self.input_block_size,
             output_block_size=self.output_block_size,
             initialize_parallel_transform=setup_sentry,
@@ -224,11 +227,17 @@ class ConsumerBuilder:
     ) -> StreamProcessor[KafkaPayload]:
         """
         Builds the consumer with a processor that is able to handle snapshots.
+        The messages are processed by catch_up_processes worker processes,
+        when provided, so that the consumer catches up with the snapshot
+        faster. This consumer is never replaced by the base consumer, so
+        these processes are used permanently, until the consumer is
+        restarted, not only during the catch up.
         """
         return self.__build_consumer(
             self.__build_streaming_strategy_factory(
                 lambda processor: SnapshotProcessor(
                     processor, snapshot_id, transaction_data
-                )
+                ),
+                self.catch_up_processes,
             )
         )
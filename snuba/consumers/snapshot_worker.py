@@ -1,13 +1,37 @@
 import logging
-from typing import Optional, Set
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
 
+from snuba import environment
 from snuba.consumers.types import KafkaMessageMetadata
 from snuba.datasets.cdc.types import Event as CDCEvent
 from snuba.processor import MessageProcessor, ProcessedMessage
 from snuba.snapshots import SnapshotId
 from snuba.stateful_consumer.control_protocol import TransactionData
+from snuba.utils.metrics.wrapper import MetricsWrapper
 
 logger = logging.getLogger("snuba.snapshot-consumer")
+metrics = MetricsWrapper(environment.metrics, "snapshot_consumer")
+
+
+class XipList:
+    """
+    The ids of the transactions that were in progress when a snapshot was
+    taken, stored as a sorted array of 64 bit integers. This is much more
+    compact than a set and, unlike the list in the snapshot descriptor,
+    it is searched in logarithmic time.
+    """
+
+    def __init__(self, xids: Iterable[int]) -> None:
+        self.__xids = array("q", sorted(set(xids)))
+
+    def __len__(self) -> int:
+        return len(self.__xids)
+
+    def __contains__(self, xid: int) -> bool:
+        index = bisect_left(self.__xids, xid)
+        return index < len(self.__xids) and self.__xids[index] == xid
 
 
 class SnapshotProcessor(MessageProcessor):
@@ -37,6 +61,14 @@ class SnapshotProcessor(MessageProcessor):
     source stream exceeds that of the snapshot maximum transaction ID), this
     filtering is no longer required and the stream can be safely consumed
     from without using this wrapper.
+
+    Whether a message is filtered only depends on its own transaction id
+    and on the snapshot, this processor keeps no other state. This matters
+    for a parallel catch up: the processor is pickled with every batch sent
+    to the worker processes, so any state would be lost at the end of each
+    batch. For the same reason the catch up metrics are counted per
+    message and only for the messages below xmax: once the consumer is
+    caught up they stop being reported.
     """
 
     def __init__(
@@ -47,42 +79,17 @@ class SnapshotProcessor(MessageProcessor):
     ) -> None:
         self.__processor = processor
         self.__snapshot_id = snapshot_id
-        self.__transaction_data = transaction_data
-
-        self.__catching_up = True
-        self.__skipped: Set[int] = set()
-        self.__xip_list_applied: Set[int] = set()
+        # Only a compact version of the xip list is kept, since this
+        # processor is pickled with every batch of a parallel catch up.
+        self.__xmin = transaction_data.xmin
+        self.__xmax = transaction_data.xmax
+        self.__xip_list = XipList(transaction_data.xip_list)
         logger.debug("Starting snapshot aware worker for id %s", self.__snapshot_id)
 
-    def __accept_message(
-        self, xid: Optional[int], value: CDCEvent, metadata: KafkaMessageMetadata
-    ) -> Optional[ProcessedMessage]:
-        if self.__catching_up and xid and xid >= self.__transaction_data.xmax:
-            logger.info(
-                "Found xid(%s) >= xmax:(%s). Catch up phase is over",
-                xid,
-                self.__transaction_data.xmax,
-            )
-            logger.info(
-                "Skipped %d transactions. Applied %d from xip_list",
-                len(self.__skipped),
-                len(self.__xip_list_applied),
-            )
-            self.__skipped.clear()
-            self.__xip_list_applied.clear()
-            self.__catching_up = False
-
-        return self.__processor.process_message(value, metadata)
-
-    def __drop_message(self, xid: int) -> Optional[ProcessedMessage]:
-        current_len = len(self.__skipped)
-        self.__skipped.add(xid)
-        new_len = len(self.__skipped)
-        if new_len != current_len and new_len % 100 == 0:
-            logger.info(
-                "Skipped %d transactions", len(self.__skipped),
-            )
-        return None
+    def __report_progress(self, xid: int) -> None:
+        xmin, xmax = self.__xmin, self.__xmax
+        progress = (xid - xmin) / (xmax - xmin) if xmax > xmin else 1.0
+        metrics.gauge("catch_up_progress", min(max(progress, 0.0), 1.0))
 
     def process_message(
         self, message: CDCEvent, metadata: KafkaMessageMetadata
@@ -112,30 +119,30 @@ class SnapshotProcessor(MessageProcessor):
           was already committed at the time the snapshot was taken thus it is already
           part of the snapshot.
         - After seeing xmax, all transactions have to be applied since they are either
-          higher of xmax or part of xip_list.
+          higher of xmax or part of xip_list. So the same rules keep holding once caught
+          up, and each message is checked on its own.
         """
         xid = None
         if message["event"] != "commit":
             xid = message.get("xid")
 
-        if xid is not None:
-            if self.__catching_up:
-                if xid < self.__transaction_data.xmin - 2 ** 32:
-                    # xid is the 32 bit integer transaction id. This means it can wrap around
-                    # During normal operation this is not an issue, but if that happens while
-                    # catching up after a snapshot, it would be a cataclysm since we would
-                    # skip all transactions for almost 64 bits worth of transactions.
-                    # Better raising this issue, so the user can stop the process and take a
-                    # new snapshot.
-                    logger.error(
-                        "xid (%d) much lower than xmin (%d)!! Check that xid did not wrap around while paused.",
-                        xid,
-                        self.__transaction_data.xmin,
-                    )
-                if xid < self.__transaction_data.xmax:
-                    if xid in self.__transaction_data.xip_list:
-                        self.__xip_list_applied.add(xid)
-                    else:
-                        return self.__drop_message(xid)
-
-        return self.__accept_message(xid, message, metadata)
+        if xid is not None and xid < self.__xmax:
+            if xid < self.__xmin - 2 ** 32:
+                # xid is the 32 bit integer transaction id. This means it can wrap around
+                # During normal operation this is not an issue, but if that happens while
+                # catching up after a snapshot, it would be a cataclysm since we would
+                # skip all transactions for almost 64 bits worth of transactions.
+                # Better raising this issue, so the user can stop the process and take a
+                # new snapshot.
+                logger.error(
+                    "xid (%d) much lower than xmin (%d)!! Check that xid did not wrap around while paused.",
+                    xid,
+                    self.__xmin,
+                )
+            self.__report_progress(xid)
+            if xid not in self.__xip_list:
+                metrics.increment("catch_up_skipped_messages")
+                return None
+            metrics.increment("catch_up_applied_messages")
+
+        return self.__processor.process_message(message, metadata)
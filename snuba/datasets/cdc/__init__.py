@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 from snuba.datasets.storage import WritableTableStorage
-from snuba.snapshots.loaders.single_table import RowProcessor
+from snuba.snapshots.loaders.single_table import BlockProcessor, RowProcessor
 
 
 class CdcStorage(WritableTableStorage):
@@ -10,16 +10,21 @@ class CdcStorage(WritableTableStorage):
         default_control_topic: str,
         postgres_table: str,
         row_processor: RowProcessor,
+        block_processor: Optional[BlockProcessor] = None,
         **kwargs: Any,
     ):
         super().__init__(**kwargs)
         self.__default_control_topic = default_control_topic
         self.__postgres_table = postgres_table
         self.__row_processor = row_processor
+        self.__block_processor = block_processor
 
     def get_row_processor(self) -> RowProcessor:
         return self.__row_processor
 
+    def get_block_processor(self) -> Optional[BlockProcessor]:
+        return self.__block_processor
+
     def get_default_control_topic(self) -> str:
         return self.__default_control_topic
 
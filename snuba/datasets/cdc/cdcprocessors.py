@@ -18,6 +18,12 @@ date_re = re.compile(
 
 date_with_nanosec = re.compile("^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.")
 
+# Match a whole column of UTC postgres dates, each one followed by a
+# newline, at once. Dates can be empty in nullable columns.
+utc_date = "\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d{1,6})?\+00"
+utc_dates_column_re = re.compile(f"(?:{utc_date}\n)*")
+nullable_utc_dates_column_re = re.compile(f"(?:(?:{utc_date})?\n)*")
+
 
 def parse_postgres_datetime(date: str) -> datetime:
     # Postgres dates express the timezone in hours while strptime expects
@@ -41,6 +47,30 @@ def postgres_date_to_clickhouse(date: str) -> str:
     return f"{match[1]}-{match[2]}-{match[3]} {match[4]}:{match[5]}:{match[6]}"
 
 
+def postgres_dates_to_clickhouse(
+    dates: Sequence[str], null: Optional[str] = None
+) -> Sequence[str]:
+    """
+    Converts a column of postgres date times expressed as strings, like
+    postgres_date_to_clickhouse does for a single date. The format of the
+    whole column is validated with one regex match, then each date only
+    needs to be truncated since the date formats only differ after the
+    seconds.
+
+    If a null value is provided the column is nullable and empty dates
+    are converted to that value.
+    """
+    column_re = utc_dates_column_re if null is None else nullable_utc_dates_column_re
+    if dates and not column_re.fullmatch("\n".join(dates) + "\n"):
+        # Raises the same error as the single date conversion.
+        for date in dates:
+            if date or null is None:
+                postgres_date_to_clickhouse(date)
+    if null is None:
+        return [date[:19] for date in dates]
+    return [date[:19] if date else null for date in dates]
+
+
 class CdcMessageRow(ABC):
     """
     Takes care of the data transformation from WAL to clickhouse and from
@@ -8,8 +8,11 @@ from snuba.datasets.cdc.cdcprocessors import (
     CdcProcessor,
     CdcMessageRow,
     postgres_date_to_clickhouse,
+    postgres_dates_to_clickhouse,
     parse_postgres_datetime,
 )
+from snuba.snapshots import ColumnBlock
+from snuba.snapshots.loaders.single_table import CSV_NULL, BlockProcessor
 from snuba.writer import WriterTableRow
 
 
@@ -76,6 +79,36 @@ class GroupAssigneeRow(CdcMessageRow):
         }
 
 
+class GroupAssigneeBlockProcessor(BlockProcessor):
+    """
+    Produces the same values as GroupAssigneeRow.from_bulk, for a block
+    of rows at a time.
+    """
+
+    def get_columns(self) -> Sequence[str]:
+        return [
+            "offset",
+            "project_id",
+            "group_id",
+            "record_deleted",
+            "date_added",
+            "user_id",
+            "team_id",
+        ]
+
+    def process_block(self, block: ColumnBlock) -> Sequence[Sequence[str]]:
+        zeros = ("0",) * len(block["group_id"])
+        return [
+            zeros,
+            block["project_id"],
+            block["group_id"],
+            zeros,
+            postgres_dates_to_clickhouse(block["date_added"]),
+            [value or CSV_NULL for value in block["user_id"]],
+            [value or CSV_NULL for value in block["team_id"]],
+        ]
+
+
 class GroupAssigneeProcessor(CdcProcessor):
     def __init__(self, postgres_table: str) -> None:
         super().__init__(
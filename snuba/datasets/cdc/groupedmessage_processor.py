@@ -8,8 +8,11 @@ from snuba.datasets.cdc.cdcprocessors import (
     CdcProcessor,
     CdcMessageRow,
     postgres_date_to_clickhouse,
+    postgres_dates_to_clickhouse,
     parse_postgres_datetime,
 )
+from snuba.snapshots import ColumnBlock
+from snuba.snapshots.loaders.single_table import CSV_NULL, BlockProcessor
 from snuba.writer import WriterTableRow
 
 
@@ -106,6 +109,41 @@ class GroupedMessageRow(CdcMessageRow):
         }
 
 
+class GroupedMessageBlockProcessor(BlockProcessor):
+    """
+    Produces the same values as GroupedMessageRow.from_bulk, for a block
+    of rows at a time. Integers are already formatted as ClickHouse
+    expects them in the snapshot, so they are written as they are.
+    """
+
+    def get_columns(self) -> Sequence[str]:
+        return [
+            "offset",
+            "project_id",
+            "id",
+            "record_deleted",
+            "status",
+            "last_seen",
+            "first_seen",
+            "active_at",
+            "first_release_id",
+        ]
+
+    def process_block(self, block: ColumnBlock) -> Sequence[Sequence[str]]:
+        zeros = ("0",) * len(block["id"])
+        return [
+            zeros,
+            block["project_id"],
+            block["id"],
+            zeros,
+            block["status"],
+            postgres_dates_to_clickhouse(block["last_seen"]),
+            postgres_dates_to_clickhouse(block["first_seen"]),
+            postgres_dates_to_clickhouse(block["active_at"], CSV_NULL),
+            [value or CSV_NULL for value in block["first_release_id"]],
+        ]
+
+
 class GroupedMessageProcessor(CdcProcessor):
     def __init__(self, postgres_table: str):
         super(GroupedMessageProcessor, self).__init__(
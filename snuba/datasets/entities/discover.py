@@ -1,5 +1,4 @@
 import random
-from copy import deepcopy
 from dataclasses import dataclass
 from datetime import timedelta
 from typing import List, Mapping, Optional, Sequence, Set, Tuple, Union
@@ -293,7 +292,7 @@ class SampledSimplePipelineBuilder(SimplePipelineBuilder):
     def build_planner(
         self, query: LogicalQuery, settings: RequestSettings,
     ) -> EntityQueryPlanner:
-        new_query = deepcopy(query)
+        new_query = query.clone()
         sampling_rate = state.get_config("snuplicator-sampling-rate", 1.0)
         assert isinstance(sampling_rate, float)
         new_query.set_sample(sampling_rate)
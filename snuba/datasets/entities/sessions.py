@@ -9,13 +9,12 @@ from snuba.clickhouse.translators.snuba.mappers import (
 )
 from snuba.clickhouse.translators.snuba.mapping import TranslationMappers
 from snuba.datasets.entity import Entity
-from snuba.datasets.plans.single_storage import (
-    SelectedStorageQueryPlanBuilder,
-    SingleStorageQueryPlanBuilder,
-)
+from snuba.datasets.plans.single_storage import SingleStorageQueryPlanBuilder
+from snuba.datasets.plans.stitched_storage import StitchedStorageQueryPlanBuilder
 from snuba.datasets.storage import QueryStorageSelector, StorageAndMappers
 from snuba.datasets.storages import StorageKey
 from snuba.datasets.storages.factory import get_storage, get_writable_storage
+from snuba.datasets.storages.sessions import MINUTE_RESOLUTION_WINDOW
 from snuba.pipeline.simple_pipeline import SimplePipelineBuilder
 from snuba.processor import MAX_UINT32, NIL_UUID
 from snuba.query.conditions import (
@@ -203,6 +202,17 @@ sessions_raw_translators = TranslationMappers(
 )
 
 
+# The columns whose values over a time range are the sum of their values
+# over any partition of that time range. Sessions (and so the errored ones)
+# are counted by the hour they started in, while users can span many hours.
+additive_columns = {
+    "sessions",
+    "sessions_crashed",
+    "sessions_abnormal",
+    "sessions_errored",
+}
+
+
 class SessionsQueryStorageSelector(QueryStorageSelector):
     def __init__(self) -> None:
         self.materialized_storage = get_storage(StorageKey.SESSIONS_HOURLY)
@@ -240,8 +250,16 @@ class SessionsEntity(Entity):
         super().__init__(
             storages=[writable_storage, materialized_storage],
             query_pipeline_builder=SimplePipelineBuilder(
-                query_plan_builder=SelectedStorageQueryPlanBuilder(
-                    selector=SessionsQueryStorageSelector()
+                query_plan_builder=StitchedStorageQueryPlanBuilder(
+                    selector=SessionsQueryStorageSelector(),
+                    aggregated=StorageAndMappers(
+                        materialized_storage, sessions_hourly_translators
+                    ),
+                    raw=StorageAndMappers(writable_storage, sessions_raw_translators),
+                    time_column="started",
+                    resolution=3600,
+                    max_raw_window=MINUTE_RESOLUTION_WINDOW,
+                    additive_columns=additive_columns,
                 ),
             ),
             abstract_column_set=read_schema.get_columns(),
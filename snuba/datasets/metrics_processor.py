@@ -1,14 +1,26 @@
+import itertools
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Any, Mapping, Optional
+from typing import (
+    Any,
+    Hashable,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from snuba.consumers.types import KafkaMessageMetadata
 from snuba.processor import (
     InsertBatch,
     MessageProcessor,
     ProcessedMessage,
+    RowAggregator,
     _ensure_valid_date,
 )
+from snuba.writer import WriterTableRow
 
 
 class MetricsProcessor(MessageProcessor, ABC):
@@ -91,3 +103,80 @@ class DistributionsMetricsProcessor(MetricsProcessor):
                 v, (int, float)
             ), "Illegal value in set. Int expected: {v}"
         return {"values": values}
+
+
+class MetricsAggregator(RowAggregator, ABC):
+    """
+    Combines the buckets of a batch that have the same metric, tags and
+    retention and fall in the same minute, since the materialized views
+    aggregate them together anyway. The timestamp of the combined bucket
+    is the start of its minute.
+    """
+
+    @abstractmethod
+    def _merge_values(self, values: Sequence[Any]) -> Mapping[str, Any]:
+        """
+        Merges the values of the buckets that are combined into the value
+        columns of the combined bucket.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_value(self, row: WriterTableRow) -> Any:
+        raise NotImplementedError
+
+    def aggregate(self, rows: Sequence[WriterTableRow]) -> Sequence[WriterTableRow]:
+        groups: MutableMapping[
+            Tuple[Hashable, ...], Tuple[MutableMapping[str, Any], MutableSequence[Any]]
+        ] = {}
+        for row in rows:
+            # The materialized views aggregate the buckets by minute.
+            timestamp = row["timestamp"].replace(second=0, microsecond=0)
+            key = (
+                row["org_id"],
+                row["project_id"],
+                row["metric_id"],
+                timestamp,
+                tuple(row["tags.key"]),
+                tuple(row["tags.value"]),
+                row["materialization_version"],
+                row["retention_days"],
+            )
+            group = groups.get(key)
+            if group is None:
+                groups[key] = ({**row, "timestamp": timestamp}, [self._get_value(row)])
+            else:
+                # The combined bucket points at the last message it contains.
+                group[0]["partition"] = row["partition"]
+                group[0]["offset"] = row["offset"]
+                group[1].append(self._get_value(row))
+
+        return [
+            {**row, **self._merge_values(values)} for row, values in groups.values()
+        ]
+
+
+class SetsMetricsAggregator(MetricsAggregator):
+    def _get_value(self, row: WriterTableRow) -> Any:
+        return row["set_values"]
+
+    def _merge_values(self, values: Sequence[Any]) -> Mapping[str, Any]:
+        return {"set_values": sorted(set(itertools.chain.from_iterable(values)))}
+
+
+class CounterMetricsAggregator(MetricsAggregator):
+    def _get_value(self, row: WriterTableRow) -> Any:
+        return row["value"]
+
+    def _merge_values(self, values: Sequence[Any]) -> Mapping[str, Any]:
+        return {"value": sum(values)}
+
+
+class DistributionsMetricsAggregator(MetricsAggregator):
+    def _get_value(self, row: WriterTableRow) -> Any:
+        return row["values"]
+
+    def _merge_values(self, values: Sequence[Any]) -> Mapping[str, Any]:
+        # Every value is kept, since the quantiles are computed on all of
+        # them.
+        return {"values": list(itertools.chain.from_iterable(values))}
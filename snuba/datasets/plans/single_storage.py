@@ -18,6 +18,7 @@ from snuba.datasets.plans.translator.query import QueryTranslator
 from snuba.datasets.schemas import RelationalSource
 from snuba.datasets.schemas.tables import TableSource
 from snuba.datasets.storage import QueryStorageSelector, ReadableStorage
+from snuba.pipeline.processors_timing import time_processor
 from snuba.query.data_source.simple import Table
 from snuba.query.logical import Query as LogicalQuery
 from snuba.query.processors.conditions_enforcer import MandatoryConditionEnforcer
@@ -50,10 +51,9 @@ class SimpleQueryPlanExecutionStrategy(QueryPlanExecutionStrategy[Query]):
         def process_and_run_query(
             query: Query, request_settings: RequestSettings
         ) -> QueryResult:
+            tags = {"table": query.get_from_clause().table_name}
             for processor in self.__query_processors:
-                with sentry_sdk.start_span(
-                    description=type(processor).__name__, op="processor"
-                ):
+                with time_processor(processor, request_settings, tags):
                     processor.process_query(query, request_settings)
             return runner(query, request_settings, self.__cluster.get_reader())
 
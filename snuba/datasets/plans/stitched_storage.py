@@ -0,0 +1,428 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
+
+import sentry_sdk
+
+from snuba import environment, state
+from snuba.clickhouse.processors import QueryProcessor
+from snuba.clickhouse.query import Query
+from snuba.clickhouse.query_dsl.accessors import get_time_range_expressions
+from snuba.clusters.cluster import ClickhouseCluster
+from snuba.datasets.plans.query_plan import (
+    ClickhouseQueryPlan,
+    ClickhouseQueryPlanBuilder,
+    QueryPlanExecutionStrategy,
+    QueryRunner,
+)
+from snuba.datasets.plans.single_storage import (
+    SelectedStorageQueryPlanBuilder,
+    get_query_data_source,
+)
+from snuba.datasets.plans.translator.query import QueryTranslator
+from snuba.datasets.storage import QueryStorageSelector, StorageAndMappers
+from snuba.pipeline.processors_timing import time_processor
+from snuba.query import OrderByDirection
+from snuba.query.conditions import (
+    ConditionFunctions,
+    binary_condition,
+    combine_and_conditions,
+    get_first_level_and_conditions,
+)
+from snuba.query.expressions import Column, Literal
+from snuba.query.logical import Query as LogicalQuery
+from snuba.query.processors.conditions_enforcer import MandatoryConditionEnforcer
+from snuba.query.processors.mandatory_condition_applier import MandatoryConditionApplier
+from snuba.query.processors.timeseries_processor import extract_granularity_from_query
+from snuba.reader import Row
+from snuba.request.request_settings import RequestSettings
+from snuba.util import with_span
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from snuba.web import QueryResult
+
+metrics = MetricsWrapper(environment.metrics, "query.stitching")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _align(value: datetime, granularity: int, up: bool) -> datetime:
+    """
+    Rounds the datetime to a multiple of the granularity since the epoch,
+    which is where the time buckets of a time series query start.
+    """
+    epoch = EPOCH if value.tzinfo is None else EPOCH.replace(tzinfo=timezone.utc)
+    remainder = (value - epoch) % timedelta(seconds=granularity)
+    if not remainder:
+        return value
+    floor = value - remainder
+    return floor + timedelta(seconds=granularity) if up else floor
+
+
+def _narrow_time_range(
+    query: Query, time_column: str, start: Optional[datetime], end: Optional[datetime],
+) -> Query:
+    """
+    Returns a copy of the query restricted to the time range provided. The
+    range must be within the one of the query, so the existing conditions
+    are kept.
+    """
+    query = query.clone()
+    conditions = []
+    condition = query.get_condition()
+    if condition is not None:
+        conditions.append(condition)
+    if start is not None:
+        conditions.append(
+            binary_condition(
+                ConditionFunctions.GTE,
+                Column(None, None, time_column),
+                Literal(None, start),
+            )
+        )
+    if end is not None:
+        conditions.append(
+            binary_condition(
+                ConditionFunctions.LT,
+                Column(None, None, time_column),
+                Literal(None, end),
+            )
+        )
+    query.set_ast_condition(combine_and_conditions(conditions))
+    return query
+
+
+@dataclass(frozen=True)
+class StitchedMerge:
+    """
+    Describes how to assemble the results of the parts of a stitched query
+    into the result of the whole query.
+
+    When the query groups by time buckets, each bucket is served entirely
+    by one part, so the rows are concatenated. Otherwise the same group can
+    be returned by every part and the rows of a group are combined by
+    summing the additive columns, which are the only aggregates that can
+    be combined once they are finalized.
+    """
+
+    group_keys: Optional[Sequence[str]]
+    additive_keys: Sequence[str]
+    orderby: Sequence[Tuple[str, OrderByDirection]]
+    limit: Optional[int]
+    offset: int
+
+    def get_part_limit(self) -> Optional[int]:
+        return self.limit + self.offset if self.limit is not None else None
+
+    def is_complete(self, result: QueryResult) -> bool:
+        """
+        Rows of the same group can only be combined if none of them were
+        cut by the limit of a part.
+        """
+        part_limit = self.get_part_limit()
+        return (
+            self.group_keys is None
+            or part_limit is None
+            or len(result.result["data"]) < part_limit
+        )
+
+    def merge(self, results: Sequence[QueryResult]) -> QueryResult:
+        rows: Sequence[Row]
+        if self.group_keys is None:
+            rows = [row for result in results for row in result.result["data"]]
+        else:
+            groups: MutableMapping[Tuple[Any, ...], Row] = {}
+            for result in results:
+                for row in result.result["data"]:
+                    key = tuple(row[name] for name in self.group_keys)
+                    if key not in groups:
+                        groups[key] = {**row}
+                    else:
+                        for name in self.additive_keys:
+                            groups[key][name] += row[name]
+            rows = list(groups.values())
+
+        # The sort is stable, so sorting by each key starting from the last
+        # one sorts by all of them. Nulls go last as they do in ClickHouse.
+        for name, direction in reversed(self.orderby):
+            if direction == OrderByDirection.ASC:
+                rows = sorted(rows, key=lambda row: (row[name] is None, row[name]))
+            else:
+                rows = sorted(
+                    rows,
+                    key=lambda row: (row[name] is not None, row[name]),
+                    reverse=True,
+                )
+
+        end = self.offset + self.limit if self.limit is not None else None
+        first = results[0]
+        merged = first.result.copy()
+        merged["data"] = list(rows[self.offset : end])
+        return QueryResult(merged, first.extra)
+
+
+class StitchedQueryPlanExecutionStrategy(QueryPlanExecutionStrategy[Query]):
+    """
+    Runs the aligned middle of the time range of the query on the
+    aggregated storage and the edges before and after it on the raw
+    storage, then merges the results.
+    """
+
+    def __init__(
+        self,
+        cluster: ClickhouseCluster,
+        db_query_processors: Sequence[QueryProcessor],
+        raw_query: Query,
+        raw_db_query_processors: Sequence[QueryProcessor],
+        time_column: str,
+        time_range: Tuple[datetime, datetime, datetime, datetime],
+        merge: StitchedMerge,
+    ) -> None:
+        self.__cluster = cluster
+        self.__query_processors = db_query_processors
+        self.__raw_query = raw_query
+        self.__raw_query_processors = raw_db_query_processors
+        self.__time_column = time_column
+        self.__time_range = time_range
+        self.__merge = merge
+
+    @with_span()
+    def execute(
+        self, query: Query, request_settings: RequestSettings, runner: QueryRunner,
+    ) -> QueryResult:
+        def process_and_run_query(
+            query: Query, processors: Sequence[QueryProcessor]
+        ) -> QueryResult:
+            tags = {"table": query.get_from_clause().table_name}
+            for processor in processors:
+                with time_processor(processor, request_settings, tags):
+                    processor.process_query(query, request_settings)
+            return runner(query, request_settings, self.__cluster.get_reader())
+
+        start, aligned_start, aligned_end, end = self.__time_range
+        parts = [
+            (
+                _narrow_time_range(
+                    query, self.__time_column, aligned_start, aligned_end
+                ),
+                self.__query_processors,
+            )
+        ]
+        if start < aligned_start:
+            parts.append(
+                (
+                    _narrow_time_range(
+                        self.__raw_query, self.__time_column, None, aligned_start
+                    ),
+                    self.__raw_query_processors,
+                )
+            )
+        if aligned_end < end:
+            parts.append(
+                (
+                    _narrow_time_range(
+                        self.__raw_query, self.__time_column, aligned_end, None
+                    ),
+                    self.__raw_query_processors,
+                )
+            )
+
+        results = []
+        for part, processors in parts:
+            part.set_offset(0)
+            part_limit = self.__merge.get_part_limit()
+            if part_limit is not None:
+                part.set_limit(part_limit)
+            with sentry_sdk.start_span(
+                description=part.get_from_clause().table_name, op="stitched_part"
+            ):
+                result = process_and_run_query(part, processors)
+            if not self.__merge.is_complete(result):
+                # The groups cannot be combined, run the query on the
+                # aggregated storage alone, as if it was not stitched.
+                metrics.increment("incomplete")
+                return process_and_run_query(query, self.__query_processors)
+            results.append(result)
+
+        return self.__merge.merge(results)
+
+
+class StitchedStorageQueryPlanBuilder(ClickhouseQueryPlanBuilder):
+    """
+    Builds plans for entities that have a storage aggregated at a coarse
+    time resolution (like an hourly materialized view) on top of the raw
+    storage.
+
+    Queries whose time range is not aligned to the time buckets would
+    otherwise be served entirely by one storage, either scanning the raw
+    storage for the whole range or losing precision at its edges. These
+    are split so that the full buckets are served by the aggregated
+    storage and only the partial buckets at the edges by the raw one.
+
+    Queries that cannot be stitched are planned by the selector.
+    """
+
+    def __init__(
+        self,
+        selector: QueryStorageSelector,
+        aggregated: StorageAndMappers,
+        raw: StorageAndMappers,
+        time_column: str,
+        resolution: int,
+        max_raw_window: timedelta,
+        additive_columns: Set[str],
+        post_processors: Optional[Sequence[QueryProcessor]] = None,
+    ) -> None:
+        self.__selected_storage_builder = SelectedStorageQueryPlanBuilder(
+            selector, post_processors
+        )
+        self.__aggregated = aggregated
+        self.__raw = raw
+        self.__time_column = time_column
+        self.__resolution = resolution
+        self.__max_raw_window = max_raw_window
+        self.__additive_columns = additive_columns
+        self.__post_processors = post_processors or []
+
+    def __get_time_range(
+        self, query: LogicalQuery, granularity: int
+    ) -> Optional[Tuple[datetime, datetime, datetime, datetime]]:
+        condition = query.get_condition()
+        if condition is None:
+            return None
+        lower, upper = get_time_range_expressions(
+            get_first_level_and_conditions(condition), self.__time_column
+        )
+        if lower is None or upper is None:
+            return None
+        start, end = lower[0], upper[0]
+
+        aligned_start = _align(start, granularity, up=True)
+        aligned_end = _align(end, granularity, up=False)
+        if (
+            aligned_start >= aligned_end
+            or (aligned_start == start and aligned_end == end)
+            or aligned_start - start > self.__max_raw_window
+            or end - aligned_end > self.__max_raw_window
+        ):
+            return None
+        return start, aligned_start, aligned_end, end
+
+    def __get_merge(
+        self, query: LogicalQuery, groups_by_time: bool
+    ) -> Optional[StitchedMerge]:
+        if (
+            query.has_totals()
+            or query.get_limitby() is not None
+            or query.get_arrayjoin() is not None
+        ):
+            return None
+
+        selected = query.get_selected_columns()
+        names: Mapping[Any, str] = {s.expression: s.name for s in selected if s.name}
+        orderby = []
+        for item in query.get_orderby():
+            if item.expression not in names:
+                return None
+            orderby.append((names[item.expression], item.direction))
+
+        if groups_by_time:
+            group_keys = None
+            additive_keys: Sequence[str] = []
+        else:
+            # Rows of the same group are combined, so each group must be
+            # identified by the selected columns and all the aggregates
+            # must be additive.
+            groupby = query.get_groupby()
+            if query.get_having() is not None or any(
+                expression not in names for expression in groupby
+            ):
+                return None
+            group_keys = [names[expression] for expression in groupby]
+            additive_keys = [name for name in names.values() if name not in group_keys]
+            for expression, name in names.items():
+                if name in additive_keys and not (
+                    isinstance(expression, Column)
+                    and expression.column_name in self.__additive_columns
+                ):
+                    return None
+
+        return StitchedMerge(
+            group_keys=group_keys,
+            additive_keys=additive_keys,
+            orderby=orderby,
+            limit=query.get_limit(),
+            offset=query.get_offset(),
+        )
+
+    def __translate(self, query: LogicalQuery, source: StorageAndMappers) -> Query:
+        # The QueryTranslator class should be instantiated once for each call to build_plan,
+        # to avoid cache conflicts.
+        clickhouse_query = QueryTranslator(source.mappers).translate(query)
+        clickhouse_query.set_from_clause(
+            get_query_data_source(
+                source.storage.get_schema().get_data_source(),
+                final=query.get_final(),
+                sampling_rate=query.get_sample(),
+            )
+        )
+        return clickhouse_query
+
+    def __get_db_query_processors(
+        self, source: StorageAndMappers
+    ) -> Sequence[QueryProcessor]:
+        return [
+            *source.storage.get_query_processors(),
+            *self.__post_processors,
+            MandatoryConditionApplier(),
+            MandatoryConditionEnforcer(
+                source.storage.get_mandatory_condition_checkers()
+            ),
+        ]
+
+    @with_span()
+    def build_and_rank_plans(
+        self, query: LogicalQuery, settings: RequestSettings
+    ) -> Sequence[ClickhouseQueryPlan]:
+        granularity = extract_granularity_from_query(query, self.__time_column)
+        time_range = None
+        merge = None
+        if (
+            state.get_config("use_stitching", 1)
+            and (granularity or self.__resolution) % self.__resolution == 0
+        ):
+            time_range = self.__get_time_range(query, granularity or self.__resolution)
+            if time_range is not None:
+                merge = self.__get_merge(query, granularity is not None)
+
+        if time_range is None or merge is None:
+            return self.__selected_storage_builder.build_and_rank_plans(query, settings)
+
+        metrics.increment(
+            "stitched",
+            tags={"merge": "concatenate" if merge.group_keys is None else "sum"},
+        )
+
+        with sentry_sdk.start_span(
+            op="build_plan.stitched_storage", description="translate"
+        ):
+            aggregated_query = self.__translate(query, self.__aggregated)
+            raw_query = self.__translate(query, self.__raw)
+
+        db_query_processors = self.__get_db_query_processors(self.__aggregated)
+        return [
+            ClickhouseQueryPlan(
+                query=aggregated_query,
+                plan_query_processors=[],
+                db_query_processors=db_query_processors,
+                storage_set_key=self.__aggregated.storage.get_storage_set_key(),
+                execution_strategy=StitchedQueryPlanExecutionStrategy(
+                    cluster=self.__aggregated.storage.get_cluster(),
+                    db_query_processors=db_query_processors,
+                    raw_query=raw_query,
+                    raw_db_query_processors=self.__get_db_query_processors(self.__raw),
+                    time_column=self.__time_column,
+                    time_range=time_range,
+                    merge=merge,
+                ),
+            )
+        ]
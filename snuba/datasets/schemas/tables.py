@@ -47,6 +47,7 @@ class TableSchema(Schema):
         storage_set_key: StorageSetKey,
         mandatory_conditions: Optional[Sequence[FunctionCall]] = None,
         part_format: Optional[Sequence[util.PartSegment]] = None,
+        sampling_key: Optional[str] = None,
     ):
         self.__local_table_name = local_table_name
         self.__dist_table_name = dist_table_name
@@ -54,6 +55,7 @@ class TableSchema(Schema):
         self.__columns = columns
         self.__mandatory_conditions = mandatory_conditions
         self.__part_format = part_format
+        self.__sampling_key = sampling_key
 
     def get_data_source(self) -> TableSource:
         """
@@ -93,6 +95,13 @@ class TableSchema(Schema):
         """
         return self.__part_format
 
+    def get_sampling_key(self) -> Optional[str]:
+        """
+        The SAMPLE BY expression of the table. Queries on tables without
+        one cannot have a SAMPLE clause.
+        """
+        return self.__sampling_key
+
 
 class WritableTableSchema(TableSchema):
     """
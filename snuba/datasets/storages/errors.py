@@ -24,6 +24,7 @@ schema = WritableTableSchema(
     storage_set_key=StorageSetKey.EVENTS,
     mandatory_conditions=mandatory_conditions,
     part_format=[util.PartSegment.RETENTION_DAYS, util.PartSegment.DATE],
+    sampling_key="cityHash64(event_id)",
 )
 
 storage = WritableTableStorage(
@@ -17,6 +17,7 @@ schema = TableSchema(
     dist_table_name="errors_dist_ro",
     storage_set_key=StorageSetKey.EVENTS_RO,
     mandatory_conditions=mandatory_conditions,
+    sampling_key="cityHash64(event_id)",
 )
 
 storage = ReadableTableStorage(
@@ -26,6 +26,7 @@ schema = WritableTableSchema(
     storage_set_key=StorageSetKey.EVENTS,
     mandatory_conditions=mandatory_conditions,
     part_format=[util.PartSegment.DATE, util.PartSegment.RETENTION_DAYS],
+    sampling_key="cityHash64(toString(event_id))",
 )
 
 
@@ -1,100 +1,106 @@
-from typing import Mapping
+from importlib import import_module
+from typing import Iterator, Mapping, Tuple, TypeVar
 
 from snuba import settings
 from snuba.datasets.cdc import CdcStorage
 from snuba.datasets.storage import ReadableTableStorage, WritableTableStorage
 from snuba.datasets.storages import StorageKey
-from snuba.datasets.storages.discover import storage as discover_storage
-from snuba.datasets.storages.errors import storage as errors_storage
-from snuba.datasets.storages.errors_ro import storage as errors_ro_storage
-from snuba.datasets.storages.events import storage as events_storage
-from snuba.datasets.storages.events_ro import storage as events_ro_storage
-from snuba.datasets.storages.groupassignees import storage as groupassignees_storage
-from snuba.datasets.storages.groupedmessages import storage as groupedmessages_storage
-from snuba.datasets.storages.metrics import counters_buckets as metrics_counters_buckets
-from snuba.datasets.storages.metrics import counters_storage as metrics_counters_storage
-from snuba.datasets.storages.metrics import (
-    distributions_buckets as metrics_distributions_buckets,
-)
-from snuba.datasets.storages.metrics import (
-    distributions_storage as metrics_distributions_storage,
-)
-from snuba.datasets.storages.metrics import sets_buckets as metrics_sets_buckets
-from snuba.datasets.storages.metrics import sets_storage as metrics_sets_storage
-from snuba.datasets.storages.outcomes import (
-    materialized_storage as outcomes_hourly_storage,
-)
-from snuba.datasets.storages.outcomes import raw_storage as outcomes_raw_storage
-from snuba.datasets.storages.querylog import storage as querylog_storage
-from snuba.datasets.storages.sessions import (
-    materialized_storage as sessions_hourly_storage,
-)
-from snuba.datasets.storages.sessions import (
-    org_materialized_storage as org_sessions_hourly_storage,
-)
-from snuba.datasets.storages.sessions import raw_storage as sessions_raw_storage
-from snuba.datasets.storages.spans import storage as spans_storage
-from snuba.datasets.storages.transactions import storage as transactions_storage
-
-DEV_CDC_STORAGES: Mapping[StorageKey, CdcStorage] = {}
-
-CDC_STORAGES: Mapping[StorageKey, CdcStorage] = {
-    **{
-        storage.get_storage_key(): storage
-        for storage in [groupedmessages_storage, groupassignees_storage]
-    },
-    **(DEV_CDC_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
-}
 
-DEV_WRITABLE_STORAGES: Mapping[StorageKey, WritableTableStorage] = {
-    metrics_counters_buckets.get_storage_key(): metrics_counters_buckets,
-    metrics_distributions_buckets.get_storage_key(): metrics_distributions_buckets,
-    metrics_sets_buckets.get_storage_key(): metrics_sets_buckets,
+TStorage = TypeVar("TStorage", bound=ReadableTableStorage)
+
+
+class _LazyStorages(Mapping[StorageKey, TStorage]):
+    """
+    Maps storage keys to the storages, given the module (relative to
+    `snuba.datasets.storages`) and the attribute each storage is defined
+    as. The module of a storage is only imported the first time that
+    storage is accessed, so processes that need a few storages (or only
+    their keys) do not import and build all of them.
+    """
+
+    def __init__(self, locations: Mapping[StorageKey, Tuple[str, str]]) -> None:
+        self.__locations = locations
+
+    def __getitem__(self, storage_key: StorageKey) -> TStorage:
+        module_name, attribute = self.__locations[storage_key]
+        storage: TStorage = getattr(
+            import_module(f"snuba.datasets.storages.{module_name}"), attribute
+        )
+        return storage
+
+    def __iter__(self) -> Iterator[StorageKey]:
+        return iter(self.__locations)
+
+    def __len__(self) -> int:
+        return len(self.__locations)
+
+
+_DEV_CDC_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {}
+
+_CDC_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {
+    StorageKey.GROUPEDMESSAGES: ("groupedmessages", "storage"),
+    StorageKey.GROUPASSIGNEES: ("groupassignees", "storage"),
+    **(_DEV_CDC_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
 }
 
-WRITABLE_STORAGES: Mapping[StorageKey, WritableTableStorage] = {
-    **CDC_STORAGES,
-    **{
-        storage.get_storage_key(): storage
-        for storage in [
-            errors_storage,
-            events_storage,
-            outcomes_raw_storage,
-            querylog_storage,
-            sessions_raw_storage,
-            transactions_storage,
-            spans_storage,
-        ]
-    },
-    **(DEV_WRITABLE_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
+_DEV_WRITABLE_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {
+    StorageKey.METRICS_COUNTERS_BUCKETS: ("metrics", "counters_buckets"),
+    StorageKey.METRICS_DISTRIBUTIONS_BUCKETS: ("metrics", "distributions_buckets"),
+    StorageKey.METRICS_BUCKETS: ("metrics", "sets_buckets"),
 }
 
-DEV_NON_WRITABLE_STORAGES: Mapping[StorageKey, ReadableTableStorage] = {
-    metrics_counters_storage.get_storage_key(): metrics_counters_storage,
-    metrics_distributions_storage.get_storage_key(): metrics_distributions_storage,
-    metrics_sets_storage.get_storage_key(): metrics_sets_storage,
+_WRITABLE_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {
+    **_CDC_STORAGES,
+    StorageKey.ERRORS: ("errors", "storage"),
+    StorageKey.EVENTS: ("events", "storage"),
+    StorageKey.OUTCOMES_RAW: ("outcomes", "raw_storage"),
+    StorageKey.QUERYLOG: ("querylog", "storage"),
+    StorageKey.SESSIONS_RAW: ("sessions", "raw_storage"),
+    StorageKey.TRANSACTIONS: ("transactions", "storage"),
+    StorageKey.SPANS: ("spans", "storage"),
+    **(_DEV_WRITABLE_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
 }
 
-NON_WRITABLE_STORAGES: Mapping[StorageKey, ReadableTableStorage] = {
-    **{
-        storage.get_storage_key(): storage
-        for storage in [
-            discover_storage,
-            errors_ro_storage,
-            events_ro_storage,
-            outcomes_hourly_storage,
-            sessions_hourly_storage,
-            org_sessions_hourly_storage,
-        ]
-    },
-    **(DEV_NON_WRITABLE_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
+_DEV_NON_WRITABLE_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {
+    StorageKey.METRICS_COUNTERS: ("metrics", "counters_storage"),
+    StorageKey.METRICS_DISTRIBUTIONS: ("metrics", "distributions_storage"),
+    StorageKey.METRICS_SETS: ("metrics", "sets_storage"),
 }
 
-STORAGES: Mapping[StorageKey, ReadableTableStorage] = {
-    **WRITABLE_STORAGES,
-    **NON_WRITABLE_STORAGES,
+_NON_WRITABLE_STORAGES: Mapping[StorageKey, Tuple[str, str]] = {
+    StorageKey.DISCOVER: ("discover", "storage"),
+    StorageKey.ERRORS_RO: ("errors_ro", "storage"),
+    StorageKey.EVENTS_RO: ("events_ro", "storage"),
+    StorageKey.OUTCOMES_HOURLY: ("outcomes", "materialized_storage"),
+    StorageKey.SESSIONS_HOURLY: ("sessions", "materialized_storage"),
+    StorageKey.ORG_SESSIONS: ("sessions", "org_materialized_storage"),
+    **(_DEV_NON_WRITABLE_STORAGES if settings.ENABLE_DEV_FEATURES else {}),
 }
 
+DEV_CDC_STORAGES: Mapping[StorageKey, CdcStorage] = _LazyStorages(_DEV_CDC_STORAGES)
+
+CDC_STORAGES: Mapping[StorageKey, CdcStorage] = _LazyStorages(_CDC_STORAGES)
+
+DEV_WRITABLE_STORAGES: Mapping[StorageKey, WritableTableStorage] = _LazyStorages(
+    _DEV_WRITABLE_STORAGES
+)
+
+WRITABLE_STORAGES: Mapping[StorageKey, WritableTableStorage] = _LazyStorages(
+    _WRITABLE_STORAGES
+)
+
+DEV_NON_WRITABLE_STORAGES: Mapping[StorageKey, ReadableTableStorage] = _LazyStorages(
+    _DEV_NON_WRITABLE_STORAGES
+)
+
+NON_WRITABLE_STORAGES: Mapping[StorageKey, ReadableTableStorage] = _LazyStorages(
+    _NON_WRITABLE_STORAGES
+)
+
+STORAGES: Mapping[StorageKey, ReadableTableStorage] = _LazyStorages(
+    {**_WRITABLE_STORAGES, **_NON_WRITABLE_STORAGES}
+)
+
 
 def get_storage(storage_key: StorageKey) -> ReadableTableStorage:
     return STORAGES[storage_key]
@@ -4,6 +4,7 @@ from snuba.clickhouse.columns import UInt
 from snuba.clusters.storage_sets import StorageSetKey
 from snuba.datasets.cdc import CdcStorage
 from snuba.datasets.cdc.groupassignee_processor import (
+    GroupAssigneeBlockProcessor,
     GroupAssigneeProcessor,
     GroupAssigneeRow,
 )
@@ -57,4 +58,5 @@ storage = CdcStorage(
     default_control_topic="cdc_control",
     postgres_table=POSTGRES_TABLE,
     row_processor=lambda row: GroupAssigneeRow.from_bulk(row).to_clickhouse(),
+    block_processor=GroupAssigneeBlockProcessor(),
 )
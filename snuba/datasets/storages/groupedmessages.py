@@ -4,6 +4,7 @@ from snuba.clickhouse.columns import UInt
 from snuba.clusters.storage_sets import StorageSetKey
 from snuba.datasets.cdc import CdcStorage
 from snuba.datasets.cdc.groupedmessage_processor import (
+    GroupedMessageBlockProcessor,
     GroupedMessageProcessor,
     GroupedMessageRow,
 )
@@ -52,6 +53,7 @@ schema = WritableTableSchema(
             Literal(None, 0),
         ),
     ],
+    sampling_key="id",
 )
 
 POSTGRES_TABLE = "sentry_groupedmessage"
@@ -72,4 +74,5 @@ storage = CdcStorage(
     default_control_topic="cdc_control",
     postgres_table=POSTGRES_TABLE,
     row_processor=lambda row: GroupedMessageRow.from_bulk(row).to_clickhouse(),
+    block_processor=GroupedMessageBlockProcessor(),
 )
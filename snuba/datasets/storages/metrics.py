@@ -13,8 +13,11 @@ from snuba.clickhouse.columns import (
 )
 from snuba.clusters.storage_sets import StorageSetKey
 from snuba.datasets.metrics_processor import (
+    CounterMetricsAggregator,
     CounterMetricsProcessor,
+    DistributionsMetricsAggregator,
     DistributionsMetricsProcessor,
+    SetsMetricsAggregator,
     SetsMetricsProcessor,
 )
 from snuba.datasets.schemas.tables import TableSchema, WritableTableSchema
@@ -58,7 +61,9 @@ sets_buckets = WritableTableStorage(
     ),
     query_processors=[],
     stream_loader=build_kafka_stream_loader_from_settings(
-        processor=SetsMetricsProcessor(), default_topic=Topic.METRICS,
+        processor=SetsMetricsProcessor(),
+        default_topic=Topic.METRICS,
+        row_aggregator=SetsMetricsAggregator(),
     ),
 )
 
@@ -76,7 +81,9 @@ counters_buckets = WritableTableStorage(
     ),
     query_processors=[],
     stream_loader=build_kafka_stream_loader_from_settings(
-        processor=CounterMetricsProcessor(), default_topic=Topic.METRICS,
+        processor=CounterMetricsProcessor(),
+        default_topic=Topic.METRICS,
+        row_aggregator=CounterMetricsAggregator(),
     ),
 )
 
@@ -97,7 +104,9 @@ distributions_buckets = WritableTableStorage(
     ),
     query_processors=[],
     stream_loader=build_kafka_stream_loader_from_settings(
-        processor=DistributionsMetricsProcessor(), default_topic=Topic.METRICS,
+        processor=DistributionsMetricsProcessor(),
+        default_topic=Topic.METRICS,
+        row_aggregator=DistributionsMetricsAggregator(),
     ),
 )
 
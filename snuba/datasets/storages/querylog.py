@@ -62,6 +62,7 @@ schema = WritableTableSchema(
     local_table_name="querylog_local",
     dist_table_name="querylog_dist",
     storage_set_key=StorageSetKey.QUERYLOG,
+    sampling_key="request_id",
 )
 
 storage = WritableTableStorage(
@@ -102,12 +102,19 @@ materialized_view_schema = TableSchema(
 )
 
 
+# NOTE: the product side is restricted to a 6h window, however it rounds
+# outwards, which extends the window to 7h.
+MINUTE_RESOLUTION_WINDOW = timedelta(hours=7)
+
+
 class MinuteResolutionProcessor(QueryProcessor):
     def process_query(self, query: Query, request_settings: RequestSettings) -> None:
-        # NOTE: the product side is restricted to a 6h window, however it rounds
-        # outwards, which extends the window to 7h.
         from_date, to_date = get_time_range(query, "started")
-        if not from_date or not to_date or (to_date - from_date) > timedelta(hours=7):
+        if (
+            not from_date
+            or not to_date
+            or (to_date - from_date) > MINUTE_RESOLUTION_WINDOW
+        ):
             raise ValidationException(
                 "Minute-resolution queries are restricted to a 7-hour time window."
             )
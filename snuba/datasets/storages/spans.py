@@ -42,6 +42,7 @@ schema = WritableTableSchema(
     local_table_name="spans_experimental_local",
     dist_table_name="spans_experimental_dist",
     storage_set_key=StorageSetKey.TRANSACTIONS,
+    sampling_key="cityHash64(span_id)",
 )
 
 storage = WritableTableStorage(
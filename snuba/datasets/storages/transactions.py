@@ -94,6 +94,7 @@ schema = WritableTableSchema(
     storage_set_key=StorageSetKey.TRANSACTIONS,
     mandatory_conditions=[],
     part_format=[util.PartSegment.RETENTION_DAYS, util.PartSegment.DATE],
+    sampling_key="cityHash64(span_id)",
 )
 
 
@@ -12,11 +12,15 @@ from snuba.clusters.cluster import (
 from snuba.clusters.storage_sets import StorageSetKey
 from snuba.datasets.message_filters import StreamMessageFilter
 from snuba.datasets.schemas.tables import WritableTableSchema
-from snuba.processor import MessageProcessor
+from snuba.processor import MessageProcessor, RowAggregator
 from snuba.replacers.replacer_processor import ReplacerProcessor
 from snuba.snapshots import BulkLoadSource
 from snuba.snapshots.loaders import BulkLoader
-from snuba.snapshots.loaders.single_table import RowProcessor, SingleTableBulkLoader
+from snuba.snapshots.loaders.single_table import (
+    BlockProcessor,
+    RowProcessor,
+    SingleTableBulkLoader,
+)
 from snuba.utils.metrics import MetricsBackend
 from snuba.utils.streams.topics import Topic, get_topic_creation_config
 from snuba.writer import BatchWriter
@@ -68,6 +72,7 @@ class KafkaStreamLoader:
         replacement_topic_spec: Optional[KafkaTopicSpec] = None,
         commit_log_topic_spec: Optional[KafkaTopicSpec] = None,
         subscription_result_topic_spec: Optional[KafkaTopicSpec] = None,
+        row_aggregator: Optional[RowAggregator] = None,
     ) -> None:
         self.__processor = processor
         self.__default_topic_spec = default_topic_spec
@@ -75,6 +80,7 @@ class KafkaStreamLoader:
         self.__commit_log_topic_spec = commit_log_topic_spec
         self.__subscription_result_topic_spec = subscription_result_topic_spec
         self.__pre_filter = pre_filter
+        self.__row_aggregator = row_aggregator
 
     def get_processor(self) -> MessageProcessor:
         return self.__processor
@@ -86,6 +92,13 @@ class KafkaStreamLoader:
         """
         return self.__pre_filter
 
+    def get_row_aggregator(self) -> Optional[RowAggregator]:
+        """
+        Returns the aggregator (or none if none is defined) consumers can
+        apply to the processed rows of a batch before writing it.
+        """
+        return self.__row_aggregator
+
     def get_default_topic_spec(self) -> KafkaTopicSpec:
         return self.__default_topic_spec
 
@@ -106,6 +119,7 @@ def build_kafka_stream_loader_from_settings(
     replacement_topic: Optional[Topic] = None,
     commit_log_topic: Optional[Topic] = None,
     subscription_result_topic: Optional[Topic] = None,
+    row_aggregator: Optional[RowAggregator] = None,
 ) -> KafkaStreamLoader:
     default_topic_spec = KafkaTopicSpec(default_topic)
 
@@ -135,6 +149,7 @@ def build_kafka_stream_loader_from_settings(
         replacement_topic_spec,
         commit_log_topic_spec,
         subscription_result_topic_spec=subscription_result_topic_spec,
+        row_aggregator=row_aggregator,
     )
 
 
@@ -219,6 +234,7 @@ class TableWriter:
         source_table: str,
         row_processor: RowProcessor,
         table_name: Optional[str] = None,
+        block_processor: Optional[BlockProcessor] = None,
     ) -> BulkLoader:
         """
         Returns the instance of the bulk loader to populate the dataset from an
@@ -233,6 +249,7 @@ class TableWriter:
             clickhouse=get_cluster(self.__storage_set).get_query_connection(
                 ClickhouseClientSettings.QUERY
             ),
+            block_processor=block_processor,
         )
 
     def get_stream_loader(self) -> KafkaStreamLoader:
@@ -2,8 +2,6 @@ from __future__ import annotations
 
 from typing import Mapping, NamedTuple, Optional, Sequence, Tuple, Union
 
-import sentry_sdk
-
 from snuba.clickhouse.processors import CompositeQueryProcessor, QueryProcessor
 from snuba.clickhouse.query import Query as ClickhouseQuery
 from snuba.clusters.cluster import ClickhouseCluster, get_cluster
@@ -17,6 +15,7 @@ from snuba.datasets.plans.query_plan import (
     SubqueryProcessors,
 )
 from snuba.pipeline.plans_selector import select_best_plans
+from snuba.pipeline.processors_timing import time_processor
 from snuba.pipeline.query_pipeline import QueryExecutionPipeline, QueryPlanner
 from snuba.query import ProcessableQuery
 from snuba.query.composite import CompositeQuery
@@ -363,10 +362,9 @@ class ProcessorsExecutor(DataSourceVisitor[None, Table], JoinVisitor[None, Table
     def __process_simple_query(
         self, clickhouse_query: ClickhouseQuery, processors: Sequence[QueryProcessor]
     ) -> None:
+        tags = {"table": clickhouse_query.get_from_clause().table_name}
         for clickhouse_processor in processors:
-            with sentry_sdk.start_span(
-                description=type(clickhouse_processor).__name__, op="processor"
-            ):
+            with time_processor(clickhouse_processor, self.__settings, tags):
                 clickhouse_processor.process_query(clickhouse_query, self.__settings)
 
     def _visit_simple_source(self, data_source: Table) -> None:
@@ -428,7 +426,8 @@ class CompositeExecutionStrategy(QueryPlanExecutionStrategy[CompositeQuery[Table
         ).visit(query)
 
         for p in self.__composite_processors:
-            p.process_query(query, request_settings)
+            with time_processor(p, request_settings, {"table": "composite"}):
+                p.process_query(query, request_settings)
 
         return runner(query, request_settings, self.__cluster.get_reader())
 
@@ -1,9 +1,9 @@
 from typing import Callable, Sequence
 
-import sentry_sdk
 from snuba.clickhouse.processors import QueryProcessor
 from snuba.datasets.entities.factory import get_entity
 from snuba.datasets.plans.query_plan import ClickhouseQueryPlan
+from snuba.pipeline.processors_timing import time_processor
 from snuba.query.logical import Query as LogicalQuery
 from snuba.request.request_settings import RequestSettings
 
@@ -22,10 +22,9 @@ def _execute_clickhouse_processors(
     execution strategy to be executed at every database query.
     This function can be used in either case by customizing the sequence.
     """
+    tags = {"table": query_plan.query.get_from_clause().table_name}
     for clickhouse_processor in processors(query_plan):
-        with sentry_sdk.start_span(
-            description=type(clickhouse_processor).__name__, op="processor"
-        ):
+        with time_processor(clickhouse_processor, settings, tags):
             clickhouse_processor.process_query(query_plan.query, settings)
 
 
@@ -65,10 +64,10 @@ def execute_entity_processors(query: LogicalQuery, settings: RequestSettings) ->
     Executes the entity query processors for the query. These are taken
     from the entity.
     """
-    entity = get_entity(query.get_from_clause().key)
+    entity_key = query.get_from_clause().key
+    entity = get_entity(entity_key)
 
+    tags = {"entity": entity_key.value}
     for processor in entity.get_query_processors():
-        with sentry_sdk.start_span(
-            description=type(processor).__name__, op="processor"
-        ):
+        with time_processor(processor, settings, tags):
             processor.process_query(query, settings)
@@ -0,0 +1,38 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import sentry_sdk
+
+from snuba import environment
+from snuba.request.request_settings import RequestSettings
+from snuba.utils.metrics.types import Tags
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+metrics = MetricsWrapper(environment.metrics, "api")
+
+
+@contextmanager
+def time_processor(
+    processor: object, request_settings: RequestSettings, tags: Tags,
+) -> Iterator[None]:
+    """
+    Wraps the execution of a query processor (of any kind) in a Sentry
+    span and measures how long it takes through a monotonic clock.
+
+    The duration is sent as a timing metric tagged with the processor
+    class and the tags provided (the entity or the table the processor
+    runs on) and it is accumulated on the request settings so that the
+    total per processor ends up in the querylog stats.
+    """
+    name = type(processor).__name__
+    with sentry_sdk.start_span(description=name, op="processor"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            metrics.timing(
+                "query_processor", duration_ms, tags={**tags, "processor": name}
+            )
+            request_settings.record_processor_duration(name, duration_ms)
@@ -54,6 +54,19 @@ class MessageProcessor(ABC):
         raise NotImplementedError
 
 
+class RowAggregator(ABC):
+    """
+    Combines the rows of a batch that the storage would aggregate together
+    anyway (for example in a materialized view), so that fewer rows are
+    written. The rows produced must aggregate to the same result as the
+    rows provided.
+    """
+
+    @abstractmethod
+    def aggregate(self, rows: Sequence[WriterTableRow]) -> Sequence[WriterTableRow]:
+        raise NotImplementedError
+
+
 class InvalidMessageType(Exception):
     pass
 
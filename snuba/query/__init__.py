@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, replace
 from enum import Enum
@@ -57,6 +58,25 @@ class SelectedExpression:
 
 
 TExp = TypeVar("TExp", bound=Expression)
+TQuery = TypeVar("TQuery", bound="Query")
+
+
+def _transform_selected(
+    selected: SelectedExpression, expression: Expression
+) -> SelectedExpression:
+    return (
+        selected
+        if expression is selected.expression
+        else replace(selected, expression=expression)
+    )
+
+
+def _transform_orderby(clause: OrderBy, expression: Expression) -> OrderBy:
+    return (
+        clause
+        if expression is clause.expression
+        else replace(clause, expression=expression)
+    )
 
 
 class Query(DataSource, ABC):
@@ -116,6 +136,23 @@ class Query(DataSource, ABC):
         self.__granularity = granularity
         self.__experiments = experiments or {}
 
+    def clone(self: TQuery) -> TQuery:
+        """
+        Returns a copy of this query that can be modified without
+        affecting the original one.
+
+        Expressions are immutable, so they are shared between the two
+        queries instead of being deep copied. Only the mutable containers
+        of the query are copied. Subclasses that hold mutable nodes (like
+        nested queries) have to extend this method to copy them.
+        """
+        ret = copy.copy(self)
+        ret.__selected_columns = list(self.__selected_columns)
+        ret.__groupby = list(self.__groupby)
+        ret.__order_by = list(self.__order_by)
+        ret.__experiments = dict(self.__experiments)
+        return ret
+
     def get_columns(self) -> ColumnSet:
         """
         From the DataSource class. It returns the schema exposed by this
@@ -287,6 +324,9 @@ class Query(DataSource, ABC):
         to be mutable as of now. This is because there are still parts of the query
         processing that depends on the Query instance not to be replaced during the
         query.
+
+        The nodes that are not changed by the transformation are preserved,
+        thus they can be shared with clones of this query.
         """
 
         def transform_expression_list(
@@ -294,14 +334,10 @@ class Query(DataSource, ABC):
         ) -> Sequence[Expression]:
             return list(map(lambda exp: exp.transform(func), expressions),)
 
-        self.__selected_columns = list(
-            map(
-                lambda selected: replace(
-                    selected, expression=selected.expression.transform(func)
-                ),
-                self.__selected_columns,
-            )
-        )
+        self.__selected_columns = [
+            _transform_selected(selected, selected.expression.transform(func))
+            for selected in self.__selected_columns
+        ]
         if not skip_array_join:
             self.__array_join = (
                 self.__array_join.transform(func) if self.__array_join else None
@@ -312,19 +348,15 @@ class Query(DataSource, ABC):
             )
         self.__groupby = transform_expression_list(self.__groupby)
         self.__having = self.__having.transform(func) if self.__having else None
-        self.__order_by = list(
-            map(
-                lambda clause: replace(
-                    clause, expression=clause.expression.transform(func)
-                ),
-                self.__order_by,
-            )
-        )
+        self.__order_by = [
+            _transform_orderby(clause, clause.expression.transform(func))
+            for clause in self.__order_by
+        ]
 
         if self.__limitby is not None:
-            self.__limitby = LimitBy(
-                self.__limitby.limit, self.__limitby.expression.transform(func)
-            )
+            limitby_expression = self.__limitby.expression.transform(func)
+            if limitby_expression is not self.__limitby.expression:
+                self.__limitby = LimitBy(self.__limitby.limit, limitby_expression)
 
         self._transform_expressions_impl(func)
 
@@ -347,14 +379,10 @@ class Query(DataSource, ABC):
         The transformation happens in place.
         """
 
-        self.__selected_columns = list(
-            map(
-                lambda selected: replace(
-                    selected, expression=selected.expression.accept(visitor)
-                ),
-                self.__selected_columns,
-            )
-        )
+        self.__selected_columns = [
+            _transform_selected(selected, selected.expression.accept(visitor))
+            for selected in self.__selected_columns
+        ]
         if self.__array_join is not None:
             self.__array_join = self.__array_join.accept(visitor)
         if self.__condition is not None:
@@ -362,14 +390,10 @@ class Query(DataSource, ABC):
         self.__groupby = [e.accept(visitor) for e in (self.__groupby or [])]
         if self.__having is not None:
             self.__having = self.__having.accept(visitor)
-        self.__order_by = list(
-            map(
-                lambda clause: replace(
-                    clause, expression=clause.expression.accept(visitor)
-                ),
-                self.__order_by,
-            )
-        )
+        self.__order_by = [
+            _transform_orderby(clause, clause.expression.accept(visitor))
+            for clause in self.__order_by
+        ]
         self._transform_impl(visitor)
 
     def __get_all_ast_referenced_expressions(
@@ -85,6 +85,16 @@ class CompositeQuery(Query, Generic[TSimpleDataSource]):
 
         return "\n".join(format_query(cast(CompositeQuery[SimpleDataSource], self)))
 
+    def clone(self) -> CompositeQuery[TSimpleDataSource]:
+        """
+        Nested queries are mutable so, contrarily to simple data sources,
+        they are cloned as well.
+        """
+        ret = super().clone()
+        if self.__from_clause is not None:
+            ret.__from_clause = self.__from_clause.clone()
+        return ret
+
     def get_from_clause(
         self,
     ) -> Union[
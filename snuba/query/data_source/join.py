@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 from typing import (
     Generic,
@@ -69,6 +69,14 @@ class JoinNode(ABC, Generic[TSimpleDataSource]):
     def get_alias_node_map(self) -> Mapping[str, IndividualNode[TSimpleDataSource]]:
         raise NotImplementedError
 
+    @abstractmethod
+    def clone(self) -> JoinNode[TSimpleDataSource]:
+        """
+        Returns a copy of this node where the subqueries, which are
+        mutable, are cloned. See Query.clone.
+        """
+        raise NotImplementedError
+
 
 @dataclass(frozen=True)
 class IndividualNode(JoinNode[TSimpleDataSource], Generic[TSimpleDataSource]):
@@ -97,6 +105,11 @@ class IndividualNode(JoinNode[TSimpleDataSource], Generic[TSimpleDataSource]):
     def accept(self, visitor: JoinVisitor[TReturn, TSimpleDataSource]) -> TReturn:
         return visitor.visit_individual_node(self)
 
+    def clone(self) -> IndividualNode[TSimpleDataSource]:
+        if isinstance(self.data_source, ProcessableQuery):
+            return replace(self, data_source=self.data_source.clone())
+        return self
+
 
 def entity_from_node(node: IndividualNode[Entity]) -> EntityKey:
     assert isinstance(node.data_source, Entity)
@@ -171,6 +184,11 @@ class JoinClause(DataSource, JoinNode[TSimpleDataSource], Generic[TSimpleDataSou
     def accept(self, visitor: JoinVisitor[TReturn, TSimpleDataSource]) -> TReturn:
         return visitor.visit_join_clause(self)
 
+    def clone(self) -> JoinClause[TSimpleDataSource]:
+        return replace(
+            self, left_node=self.left_node.clone(), right_node=self.right_node.clone()
+        )
+
 
 TReturn = TypeVar("TReturn")
 
@@ -3,7 +3,19 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, replace
 from datetime import date, datetime
-from typing import Callable, Generic, Iterator, Optional, Tuple, TypeVar, Union
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from snuba import settings
 
@@ -68,6 +80,11 @@ class Expression(_Expression, ABC):
         """
         raise NotImplementedError
 
+    def __getstate__(self) -> Mapping[str, Any]:
+        # The cached hash depends on the hash seed of the process, so it
+        # cannot be carried over to another process. See cached_hash.
+        return {k: v for k, v in self.__dict__.items() if k != _CACHED_HASH}
+
     def __repr__(self) -> str:
         """returns a stringified version of the expression AST that is concise and easy to parse visually.
         Not expected to be used for anything except debugging
@@ -80,6 +97,38 @@ class Expression(_Expression, ABC):
             return super().__repr__()
 
 
+_CACHED_HASH = "_cached_hash"
+
+TExpressionClass = TypeVar("TExpressionClass", bound=Type[Expression])
+
+
+def cached_hash(cls: TExpressionClass) -> TExpressionClass:
+    """
+    Class decorator that memoizes the hash generated by the dataclass
+    decorator on each instance.
+
+    Expressions are immutable and they are hashed very often when
+    building sets of them. Without caching, hashing an expression
+    recomputes the hash of the entire subtree, with this decorator
+    applied to all the expression classes it only hashes the direct
+    children, which have their hash cached already.
+    """
+    generated_hash = cls.__hash__
+
+    def __hash__(self: Expression) -> int:
+        try:
+            return cast(int, self.__dict__[_CACHED_HASH])
+        except KeyError:
+            value = generated_hash(self)
+            # Bypasses the frozen dataclass check. The hash is not part
+            # of the value of the expression.
+            object.__setattr__(self, _CACHED_HASH, value)
+            return value
+
+    setattr(cls, "__hash__", __hash__)
+    return cls
+
+
 class ExpressionVisitor(ABC, Generic[TVisited]):
     """
     Implementation of a Visitor pattern to simplify traversal of the AST while preserving
@@ -222,6 +271,22 @@ class StringifyVisitor(ExpressionVisitor[str]):
 OptionalScalarType = Union[None, bool, str, float, int, date, datetime]
 
 
+def _transform_children(
+    children: Tuple[Expression, ...], func: Callable[[Expression], Expression]
+) -> Tuple[Expression, ...]:
+    """
+    Transforms a tuple of children expressions. Returns the original
+    tuple if none of them changed so the parent does not need to be
+    rebuilt. Expressions are immutable so they can be shared between
+    the original tree and the transformed one.
+    """
+    transformed = tuple(child.transform(func) for child in children)
+    if all(new is old for new, old in zip(transformed, children)):
+        return children
+    return transformed
+
+
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class Literal(Expression):
     """
@@ -240,6 +305,7 @@ class Literal(Expression):
         return visitor.visit_literal(self)
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class Column(Expression):
     """
@@ -259,6 +325,7 @@ class Column(Expression):
         return visitor.visit_column(self)
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class SubscriptableReference(Expression):
     """
@@ -278,8 +345,12 @@ class SubscriptableReference(Expression):
         return visitor.visit_subscriptable_reference(self)
 
     def transform(self, func: Callable[[Expression], Expression]) -> Expression:
-        transformed = replace(
-            self, column=self.column.transform(func), key=self.key.transform(func),
+        column = self.column.transform(func)
+        key = self.key.transform(func)
+        transformed = (
+            self
+            if column is self.column and key is self.key
+            else replace(self, column=column, key=key)
         )
         return func(transformed)
 
@@ -296,6 +367,7 @@ class SubscriptableReference(Expression):
         yield self
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class FunctionCall(Expression):
     """
@@ -323,10 +395,15 @@ class FunctionCall(Expression):
         the root with something else, with different children, we trust the
         transformation function and we do not run that same function over the
         new children.
+
+        If the transformation function does not change any node, this
+        returns self instead of building an identical copy of the subtree.
         """
-        transformed = replace(
-            self,
-            parameters=tuple(map(lambda child: child.transform(func), self.parameters)),
+        parameters = _transform_children(self.parameters, func)
+        transformed = (
+            self
+            if parameters is self.parameters
+            else replace(self, parameters=parameters)
         )
         return func(transformed)
 
@@ -345,6 +422,7 @@ class FunctionCall(Expression):
         return visitor.visit_function_call(self)
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class CurriedFunctionCall(Expression):
     """
@@ -370,10 +448,15 @@ class CurriedFunctionCall(Expression):
         one transforms the internal function before applying the function to the
         parameters.
         """
-        transformed = replace(
-            self,
-            internal_function=self.internal_function.transform(func),
-            parameters=tuple(map(lambda child: child.transform(func), self.parameters)),
+        internal_function = self.internal_function.transform(func)
+        parameters = _transform_children(self.parameters, func)
+        transformed = (
+            self
+            if internal_function is self.internal_function
+            and parameters is self.parameters
+            else replace(
+                self, internal_function=internal_function, parameters=parameters
+            )
         )
         return func(transformed)
 
@@ -392,6 +475,7 @@ class CurriedFunctionCall(Expression):
         return visitor.visit_curried_function_call(self)
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class Argument(Expression):
     """
@@ -411,6 +495,7 @@ class Argument(Expression):
         return visitor.visit_argument(self)
 
 
+@cached_hash
 @dataclass(frozen=True, repr=_AUTO_REPR)
 class Lambda(Expression):
     """
@@ -428,7 +513,12 @@ class Lambda(Expression):
         Applies the transformation to the inner expression but not to the parameters
         declaration.
         """
-        transformed = replace(self, transformation=self.transformation.transform(func))
+        transformation = self.transformation.transform(func)
+        transformed = (
+            self
+            if transformation is self.transformation
+            else replace(self, transformation=transformation)
+        )
         return func(transformed)
 
     def __iter__(self) -> Iterator[Expression]:
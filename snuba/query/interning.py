@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from dataclasses import fields
+from typing import Any, Hashable, Union
+from weakref import WeakValueDictionary
+
+from snuba.query import ProcessableQuery, Query
+from snuba.query.composite import CompositeQuery
+from snuba.query.data_source.join import IndividualNode, JoinClause, JoinNode
+from snuba.query.expressions import Expression
+
+
+def _value_key(value: Any) -> Hashable:
+    if isinstance(value, Expression):
+        # Children are interned before their parent so, if they are
+        # structurally equal, they are the same instance.
+        return id(value)
+    if isinstance(value, tuple):
+        return tuple(_value_key(v) for v in value)
+    # The type is part of the key because equal values of different
+    # types (like True and 1) are not interchangeable in a query.
+    return (type(value), value)
+
+
+def _node_key(node: Expression) -> Hashable:
+    return (type(node), *(_value_key(getattr(node, f.name)) for f in fields(node)))
+
+
+class ExpressionInterner:
+    """
+    Hash consing of AST expressions. Structurally equal subtrees
+    interned through the same instance of this class are replaced by
+    one shared instance, which reduces the memory taken by the AST of
+    large queries and makes comparing these subtrees mostly an identity
+    check.
+
+    Interned expressions are only weakly referenced, so the table does
+    not keep alive expressions that are not used by any query anymore.
+    """
+
+    def __init__(self) -> None:
+        self.__nodes: WeakValueDictionary[Hashable, Expression] = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self.__nodes)
+
+    def __intern_node(self, node: Expression) -> Expression:
+        key = _node_key(node)
+        interned = self.__nodes.get(key)
+        if interned is None:
+            self.__nodes[key] = node
+            return node
+        return interned
+
+    def intern(self, expression: Expression) -> Expression:
+        """
+        Returns an expression equal to the one provided, where each node
+        is replaced by the interned instance of an equal node if one
+        exists.
+        """
+        # Transform works bottom up, so the children of a node are
+        # interned before the node itself.
+        return expression.transform(self.__intern_node)
+
+    def intern_query(self, query: Union[Query, CompositeQuery[Any]]) -> None:
+        """
+        Interns in place all the expressions of a query, including the
+        ones of its subqueries.
+        """
+        query.transform_expressions(self.intern)
+        if isinstance(query, CompositeQuery):
+            from_clause = query.get_from_clause()
+            if isinstance(from_clause, JoinClause):
+                self.__intern_join_node(from_clause)
+            else:
+                self.intern_query(from_clause)
+
+    def __intern_join_node(self, node: JoinNode[Any]) -> None:
+        if isinstance(node, JoinClause):
+            self.__intern_join_node(node.left_node)
+            self.__intern_join_node(node.right_node)
+        elif isinstance(node, IndividualNode) and isinstance(
+            node.data_source, ProcessableQuery
+        ):
+            self.intern_query(node.data_source)
+
+
+expression_interner = ExpressionInterner()
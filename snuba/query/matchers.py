@@ -5,7 +5,21 @@ from collections import ChainMap
 from dataclasses import dataclass, field
 from datetime import date, datetime
 from typing import Any as AnyType
-from typing import Generic, Mapping, Optional, Sequence, Tuple, Type, TypeVar, Union
+from typing import (
+    Callable,
+    FrozenSet,
+    Generic,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from snuba.query.expressions import Column as ColumnExpr
 from snuba.query.expressions import Expression
@@ -17,6 +31,7 @@ from snuba.query.expressions import SubscriptableReference as SubscriptableRefer
 MatchType = Union[Expression, OptionalScalarType]
 
 TMatchedType = TypeVar("TMatchedType", covariant=True)
+T = TypeVar("T")
 
 
 @dataclass(frozen=True)
@@ -91,6 +106,41 @@ class MatchResult:
         return MatchResult(ChainMap(self.results, values.results))
 
 
+# A compiled pattern. It receives the node to match and a mapping where
+# the parameters found are added. It returns True if the node matches.
+# The mapping may contain partial results when the node does not match,
+# so callers that need to discard them have to provide a fresh one.
+Matcher = Callable[[AnyType, MutableMapping[str, MatchType]], bool]
+
+
+class CompiledPattern(NamedTuple):
+    """
+    The result of compiling a Pattern. Beside the matcher it carries
+    what is statically known about the nodes the pattern can match so
+    that patterns composing this one (like Or and FunctionCall) can
+    discard a node without running the matcher at all.
+    """
+
+    matcher: Matcher
+    # If set, the pattern only matches instances of this type.
+    node_type: Optional[type] = None
+    # If set, the pattern only matches function calls with one of
+    # these names.
+    function_names: Optional[FrozenSet[str]] = None
+    # If set, the pattern only matches scalars equal to one of these
+    # values.
+    values: Optional[FrozenSet[AnyType]] = None
+
+
+def _add_results(
+    source: Mapping[str, MatchType], results: MutableMapping[str, MatchType]
+) -> None:
+    # Parameters found first take precedence, which is consistent with
+    # the way MatchResult.merge builds the ChainMap.
+    for name, value in source.items():
+        results.setdefault(name, value)
+
+
 class Pattern(ABC, Generic[TMatchedType]):
     """
     Tries to match a given node (like an AST Expression) with the rules
@@ -129,9 +179,74 @@ class Pattern(ABC, Generic[TMatchedType]):
         """
         raise NotImplementedError
 
+    def compile(self) -> CompiledPattern:
+        """
+        Returns the compiled version of this pattern. Patterns are
+        immutable so the compiled pattern is built the first time it is
+        requested and then memoized on the instance.
+        """
+        compiled = self.__dict__.get("_compiled_pattern")
+        if compiled is None:
+            compiled = self._compile()
+            # Bypasses the frozen dataclass check. This is a cache, not
+            # part of the value of the pattern.
+            object.__setattr__(self, "_compiled_pattern", compiled)
+        return compiled
+
+    def __getstate__(self) -> Mapping[str, AnyType]:
+        # The compiled pattern is made of closures, which cannot be pickled,
+        # and it is rebuilt when needed anyway.
+        return {k: v for k, v in self.__dict__.items() if k != "_compiled_pattern"}
+
+    def _compile(self) -> CompiledPattern:
+        """
+        Builds the compiled pattern. Patterns defined outside of this
+        module only need to implement match, and this wraps it.
+        """
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            result = self.match(node)
+            if result is None:
+                return False
+            _add_results(result.results, results)
+            return True
+
+        return CompiledPattern(match)
+
+
+class _CompiledPattern(Pattern[TMatchedType]):
+    """
+    Base class for the patterns defined in this module. They implement
+    the matching logic once in _compile and match runs the compiled
+    pattern, which does not need to build and merge intermediate
+    MatchResult objects.
+    """
+
+    def match(self, node: AnyType) -> Optional[MatchResult]:
+        results: MutableMapping[str, MatchType] = {}
+        return MatchResult(results) if self.compile().matcher(node, results) else None
+
+    @abstractmethod
+    def _compile(self) -> CompiledPattern:
+        raise NotImplementedError
+
+
+def _equals(value: AnyType) -> CompiledPattern:
+    def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+        return bool(node == value)
+
+    return CompiledPattern(match, values=frozenset([value]))
+
+
+def _is_instance(node_type: type) -> CompiledPattern:
+    def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+        return isinstance(node, node_type)
+
+    return CompiledPattern(match, node_type=node_type)
+
 
 @dataclass(frozen=True)
-class Param(Pattern[TMatchedType]):
+class Param(_CompiledPattern[TMatchedType]):
     """
     Defines a named parameter in a Pattern. When matching the overall
     Pattern, if the Pattern nested in this object matches, the
@@ -148,103 +263,181 @@ class Param(Pattern[TMatchedType]):
     name: str
     pattern: Pattern[TMatchedType]
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        result = self.pattern.match(node)
-        if result is None:
-            return None
-        return result.merge(MatchResult({self.name: node}))
+    def _compile(self) -> CompiledPattern:
+        inner = self.pattern.compile()
+        inner_matcher = inner.matcher
+        name = self.name
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            if not inner_matcher(node, results):
+                return False
+            results.setdefault(name, node)
+            return True
+
+        return inner._replace(matcher=match)
 
 
 @dataclass(frozen=True)
-class AnyExpression(Pattern[Expression]):
+class AnyExpression(_CompiledPattern[Expression]):
     """
     Matches any expression of the type provided.
     This allows us to match any Expression since the Any class cannot
     match abstract classes (like Expression)
     """
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if isinstance(node, Expression) else None
+    def _compile(self) -> CompiledPattern:
+        return _is_instance(Expression)
 
 
 @dataclass(frozen=True)
-class Any(Pattern[TMatchedType]):
+class Any(_CompiledPattern[TMatchedType]):
     """
     Match any concrete expression/scalar of the type provided.
     """
 
     type: Type[TMatchedType]
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if isinstance(node, self.type) else None
+    def _compile(self) -> CompiledPattern:
+        return _is_instance(self.type)
 
 
 @dataclass(frozen=True)
-class String(Pattern[str]):
+class String(_CompiledPattern[str]):
     """
     Matches one specific string.
     """
 
     value: str
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if node == self.value else None
+    def _compile(self) -> CompiledPattern:
+        return _equals(self.value)
 
 
 @dataclass(frozen=True)
-class Integer(Pattern[int]):
+class Integer(_CompiledPattern[int]):
     """
     Matches one specific integer.
     """
 
     value: int
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if node == self.value else None
+    def _compile(self) -> CompiledPattern:
+        return _equals(self.value)
 
 
 @dataclass(frozen=True)
-class OptionalString(Pattern[Optional[str]]):
+class OptionalString(_CompiledPattern[Optional[str]]):
     """
     Matches one specific string (or None).
     """
 
     value: Optional[str]
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if node == self.value else None
+    def _compile(self) -> CompiledPattern:
+        return _equals(self.value)
 
 
 @dataclass(frozen=True)
-class AnyOptionalString(Pattern[Optional[str]]):
+class AnyOptionalString(_CompiledPattern[Optional[str]]):
     """
     Matches any string including the None value. This cannot be done with
     Any(type) because that cannot match Union[str, None].
     """
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        return MatchResult() if node is None or isinstance(node, str) else None
+    def _compile(self) -> CompiledPattern:
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            return node is None or isinstance(node, str)
+
+        return CompiledPattern(match)
 
 
 @dataclass(frozen=True)
-class Or(Pattern[TMatchedType]):
+class Or(_CompiledPattern[TMatchedType]):
     """
     Union of multiple patterns. Matches if at least one is a valid match
     and returns the first valid one.
+
+    When compiled, the alternatives that cannot match a node, because
+    of its type or its function name, are discarded through a lookup
+    instead of trying them one by one.
     """
 
     patterns: Sequence[Pattern[TMatchedType]]
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        for p in self.patterns:
-            ret = p.match(node)
-            if ret:
-                return ret
-        return None
+    def _compile(self) -> CompiledPattern:
+        alternatives = [p.compile() for p in self.patterns]
+        # The candidate alternatives for each node type we have seen. The
+        # second element maps function names to the candidates for a
+        # function call with that name, the first element contains the
+        # candidates for any other node of that type.
+        candidates: MutableMapping[
+            type, Tuple[Sequence[Matcher], Mapping[str, Sequence[Matcher]]]
+        ] = {}
+
+        def build_candidates(
+            node_type: type,
+        ) -> Tuple[Sequence[Matcher], Mapping[str, Sequence[Matcher]]]:
+            applicable = [
+                a
+                for a in alternatives
+                if a.node_type is None or issubclass(node_type, a.node_type)
+            ]
+            by_name: MutableMapping[str, List[Matcher]] = {}
+            for alternative in applicable:
+                for name in alternative.function_names or []:
+                    by_name[name] = [
+                        a.matcher
+                        for a in applicable
+                        if a.function_names is None or name in a.function_names
+                    ]
+            return (
+                [a.matcher for a in applicable if a.function_names is None],
+                by_name,
+            )
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            node_type = type(node)
+            node_candidates = candidates.get(node_type)
+            if node_candidates is None:
+                node_candidates = build_candidates(node_type)
+                candidates[node_type] = node_candidates
+            default, by_name = node_candidates
+            matchers = by_name.get(node.function_name, default) if by_name else default
+            for matcher in matchers:
+                # Discards the parameters of the alternatives that do not match.
+                partial_results: MutableMapping[str, MatchType] = {}
+                if matcher(node, partial_results):
+                    _add_results(partial_results, results)
+                    return True
+            return False
+
+        node_types = {a.node_type for a in alternatives}
+        return CompiledPattern(
+            match,
+            node_type=node_types.pop() if len(node_types) == 1 else None,
+            function_names=_union([a.function_names for a in alternatives]),
+            values=_union([a.values for a in alternatives]),
+        )
+
+
+def _union(sets: Sequence[Optional[FrozenSet[T]]]) -> Optional[FrozenSet[T]]:
+    """
+    Union of the sets provided, None means any value is possible.
+    """
+    ret: FrozenSet[T] = frozenset()
+    for s in sets:
+        if s is None:
+            return None
+        ret |= s
+    return ret
+
+
+def _compile_optional(pattern: Optional[Pattern[AnyType]]) -> Optional[Matcher]:
+    return pattern.compile().matcher if pattern is not None else None
 
 
 @dataclass(frozen=True)
-class Column(Pattern[ColumnExpr]):
+class Column(_CompiledPattern[ColumnExpr]):
     """
     Matches a Column in an AST expression.
     The column is defined by alias, name and table. For each,
@@ -256,40 +449,39 @@ class Column(Pattern[ColumnExpr]):
     table_name: Optional[Pattern[Optional[str]]] = None
     column_name: Optional[Pattern[str]] = None
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        if not isinstance(node, ColumnExpr):
-            return None
+    def _compile(self) -> CompiledPattern:
+        table_name = _compile_optional(self.table_name)
+        column_name = _compile_optional(self.column_name)
 
-        result = MatchResult()
-        for pattern, value in (
-            (self.table_name, node.table_name),
-            (self.column_name, node.column_name),
-        ):
-            if pattern is not None:
-                partial_result = pattern.match(value)
-                if partial_result is None:
-                    return None
-                result = result.merge(partial_result)
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            if not isinstance(node, ColumnExpr):
+                return False
+            if table_name is not None and not table_name(node.table_name, results):
+                return False
+            if column_name is not None and not column_name(node.column_name, results):
+                return False
+            return True
 
-        return result
+        return CompiledPattern(match, node_type=ColumnExpr)
 
 
 @dataclass(frozen=True)
-class Literal(Pattern[LiteralExpr]):
+class Literal(_CompiledPattern[LiteralExpr]):
     value: Optional[Pattern[OptionalScalarType]] = None
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        if not isinstance(node, LiteralExpr):
-            return None
+    def _compile(self) -> CompiledPattern:
+        value = _compile_optional(self.value)
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            if not isinstance(node, LiteralExpr):
+                return False
+            return value is None or value(node.value, results)
 
-        if self.value is not None:
-            return self.value.match(node.value)
-        else:
-            return MatchResult()
+        return CompiledPattern(match, node_type=LiteralExpr)
 
 
 @dataclass(frozen=True)
-class FunctionCall(Pattern[FunctionCallExpr]):
+class FunctionCall(_CompiledPattern[FunctionCallExpr]):
     """
     Matches a Function in the AST expression.
     It works like the Column Pattern. if alias, function_name and function_parameters
@@ -315,43 +507,64 @@ class FunctionCall(Pattern[FunctionCallExpr]):
     # to also specify the parameters field.
     all_parameters: Optional[Pattern[Expression]] = None
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        if not isinstance(node, FunctionCallExpr):
-            return None
-
-        result = MatchResult()
-
-        if self.function_name is not None:
-            partial_result = self.function_name.match(node.function_name)
-            if partial_result is None:
-                return None
-            result = result.merge(partial_result)
-
-        if self.parameters:
-            if not self.with_optionals:
-                if len(self.parameters) != len(node.parameters):
-                    return None
-            else:
-                if len(self.parameters) > len(node.parameters):
-                    return None
-
-            for index, param_pattern in enumerate(self.parameters):
-                p_result = param_pattern.match(node.parameters[index])
-                if p_result is None:
-                    return None
-                else:
-                    result = result.merge(p_result)
-
-        if self.all_parameters:
-            for p in node.parameters:
-                if not self.all_parameters.match(p):
-                    return None
-
-        return result
+    def _compile(self) -> CompiledPattern:
+        function_names = (
+            self.function_name.compile().values
+            if self.function_name is not None
+            else None
+        )
+        # Checking the name against the set of valid names is enough
+        # unless the name pattern has to extract parameters.
+        function_name = (
+            None
+            if isinstance(self.function_name, String)
+            else _compile_optional(self.function_name)
+        )
+        parameters = tuple(p.compile().matcher for p in self.parameters or ())
+        with_optionals = self.with_optionals
+        all_parameters = (
+            _compile_optional(self.all_parameters) if self.all_parameters else None
+        )
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            if not isinstance(node, FunctionCallExpr):
+                return False
+            if function_names is not None and node.function_name not in function_names:
+                return False
+            if function_name is not None and not function_name(
+                node.function_name, results
+            ):
+                return False
+
+            if parameters:
+                if not with_optionals:
+                    if len(parameters) != len(node.parameters):
+                        return False
+                elif len(parameters) > len(node.parameters):
+                    return False
+
+                for param_matcher, param in zip(parameters, node.parameters):
+                    if not param_matcher(param, results):
+                        return False
+
+            if all_parameters is not None:
+                for param in node.parameters:
+                    if not all_parameters(param, {}):
+                        return False
+
+            return True
+
+        return CompiledPattern(
+            match,
+            node_type=FunctionCallExpr,
+            function_names=frozenset(function_names)
+            if function_names is not None
+            else None,
+        )
 
 
 @dataclass(frozen=True)
-class SubscriptableReference(Pattern[SubscriptableReferenceExpr]):
+class SubscriptableReference(_CompiledPattern[SubscriptableReferenceExpr]):
     """
     Matches a SubscriptableReference in the AST expression.
     If column_name and key arguments are provided, they have to match, otherwise they are ignored.
@@ -360,25 +573,22 @@ class SubscriptableReference(Pattern[SubscriptableReferenceExpr]):
     column_name: Optional[Pattern[str]] = None
     key: Optional[Pattern[str]] = None
 
-    def match(self, node: AnyType) -> Optional[MatchResult]:
-        if not isinstance(node, SubscriptableReferenceExpr):
-            return None
-
-        result = MatchResult()
-
-        if self.column_name is not None:
-            partial_result = self.column_name.match(node.column.column_name)
-            if partial_result is None:
-                return None
-            result = result.merge(partial_result)
-
-        if self.key is not None:
-            partial_result = self.key.match(node.key.value)
-            if partial_result is None:
-                return None
-            result = result.merge(partial_result)
-
-        return result
+    def _compile(self) -> CompiledPattern:
+        column_name = _compile_optional(self.column_name)
+        key = _compile_optional(self.key)
+
+        def match(node: AnyType, results: MutableMapping[str, MatchType]) -> bool:
+            if not isinstance(node, SubscriptableReferenceExpr):
+                return False
+            if column_name is not None and not column_name(
+                node.column.column_name, results
+            ):
+                return False
+            if key is not None and not key(node.key.value, results):
+                return False
+            return True
+
+        return CompiledPattern(match, node_type=SubscriptableReferenceExpr)
 
 
 # TODO: Add more Patterns when needed.
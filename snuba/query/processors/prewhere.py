@@ -1,15 +1,20 @@
-from typing import Optional, Sequence
+from typing import Mapping, Optional, Sequence, Set, Tuple
 
 from snuba import settings
 from snuba.clickhouse.processors import QueryProcessor
 from snuba.clickhouse.query import Query
+from snuba.clickhouse.statistics import (
+    TableStatistics,
+    TableStatisticsCache,
+    table_statistics,
+)
 from snuba.query.accessors import get_columns_in_expression
 from snuba.query.conditions import (
     ConditionFunctions,
     combine_and_conditions,
     get_first_level_and_conditions,
 )
-from snuba.query.expressions import FunctionCall
+from snuba.query.expressions import Column, Expression, FunctionCall
 from snuba.request.request_settings import RequestSettings
 
 ALLOWED_OPERATORS = [
@@ -25,6 +30,85 @@ ALLOWED_OPERATORS = [
     ConditionFunctions.LIKE,
 ]
 
+# Fraction of the rows we expect a condition to select when we cannot
+# estimate it through the column statistics.
+DEFAULT_SELECTIVITY: Mapping[str, float] = {
+    ConditionFunctions.GT: 1 / 3,
+    ConditionFunctions.LT: 1 / 3,
+    ConditionFunctions.GTE: 1 / 3,
+    ConditionFunctions.LTE: 1 / 3,
+    ConditionFunctions.EQ: 0.1,
+    ConditionFunctions.NEQ: 0.9,
+    ConditionFunctions.IN: 0.3,
+    ConditionFunctions.IS_NULL: 0.1,
+    ConditionFunctions.IS_NOT_NULL: 0.9,
+    ConditionFunctions.LIKE: 0.25,
+}
+
+
+def estimate_selectivity(condition: FunctionCall, statistics: TableStatistics) -> float:
+    """
+    Estimates the fraction of rows selected by a top level condition.
+    When the condition is on a plain column the sampled distinct values
+    and null fraction of the column are used, otherwise we fall back to a
+    default per operator.
+    """
+    default = DEFAULT_SELECTIVITY[condition.function_name]
+    if not condition.parameters or not isinstance(condition.parameters[0], Column):
+        return default
+
+    column_stats = statistics.get(condition.parameters[0].column_name)
+    if column_stats is None:
+        return default
+
+    null_fraction = column_stats.null_fraction
+    if null_fraction is not None:
+        if condition.function_name == ConditionFunctions.IS_NULL:
+            return null_fraction
+        if condition.function_name == ConditionFunctions.IS_NOT_NULL:
+            return 1 - null_fraction
+
+    distinct_values = column_stats.distinct_values
+    if not distinct_values:
+        return default
+    if condition.function_name == ConditionFunctions.EQ:
+        return 1 / distinct_values
+    if condition.function_name == ConditionFunctions.NEQ:
+        return 1 - 1 / distinct_values
+    if (
+        condition.function_name == ConditionFunctions.IN
+        and len(condition.parameters) == 2
+        and isinstance(condition.parameters[1], FunctionCall)
+    ):
+        return min(1.0, len(condition.parameters[1].parameters) / distinct_values)
+    return default
+
+
+def estimate_saved_bytes(
+    condition: FunctionCall,
+    condition_columns: Set[str],
+    query_columns: Set[str],
+    statistics: TableStatistics,
+) -> Optional[float]:
+    """
+    Estimates how many compressed bytes we avoid reading by evaluating the
+    condition in the prewhere clause. Only the rows selected by the prewhere
+    condition are read for the other columns of the query, so the saving
+    is proportional to the size of those columns and to the fraction of the
+    rows the condition filters out.
+
+    Returns None if there are no statistics for the condition columns.
+    """
+    if not condition_columns or any(c not in statistics for c in condition_columns):
+        return None
+
+    other_bytes = sum(
+        statistics[c].compressed_bytes
+        for c in query_columns - condition_columns
+        if c in statistics
+    )
+    return (1 - estimate_selectivity(condition, statistics)) * other_bytes
+
 
 class PrewhereProcessor(QueryProcessor):
     """
@@ -35,6 +119,12 @@ class PrewhereProcessor(QueryProcessor):
     - a single top-level condition (not in an OR statement)
     - any of its referenced columns must be in the list provided by
       the query data source.
+
+    Candidates are ranked by their position in the list, unless column
+    statistics are enabled. In that case, once the statistics of the table
+    are available, candidates are ranked by the amount of data we expect
+    them to save from being read (see estimate_saved_bytes). Candidates we
+    cannot estimate follow in the static order.
     """
 
     def __init__(
@@ -42,10 +132,22 @@ class PrewhereProcessor(QueryProcessor):
         prewhere_candidates: Sequence[str],
         omit_if_final: Optional[Sequence[str]] = None,
         max_prewhere_conditions: Optional[int] = None,
+        statistics: Optional[TableStatisticsCache] = None,
     ) -> None:
         self.__prewhere_candidates = prewhere_candidates
         self.__omit_if_final = omit_if_final
         self.__max_prewhere_conditions: Optional[int] = max_prewhere_conditions
+        self.__statistics = statistics
+
+    def __get_statistics(
+        self, query: Query, prewhere_keys: Sequence[str]
+    ) -> Optional[TableStatistics]:
+        statistics = self.__statistics
+        if statistics is None:
+            if not settings.PREWHERE_USE_COLUMN_STATISTICS:
+                return None
+            statistics = table_statistics
+        return statistics.get(query.get_from_clause().table_name, prewhere_keys)
 
     def process_query(self, query: Query, request_settings: RequestSettings) -> None:
         max_prewhere_conditions: int = (
@@ -90,20 +192,30 @@ class PrewhereProcessor(QueryProcessor):
         if not prewhere_candidates:
             return
 
-        # Use the condition that has the highest priority (based on the
-        # position of its columns in the prewhere keys list)
-        sorted_candidates = sorted(
-            [
-                (
-                    min(
-                        prewhere_keys.index(col.column_name)
-                        for col in cols
-                        if col.column_name in prewhere_keys
-                    ),
-                    cond,
+        statistics = self.__get_statistics(query, prewhere_keys)
+        query_columns = {c.column_name for c in query.get_all_ast_referenced_columns()}
+
+        def priority(cols: Set[Column], cond: Expression) -> Tuple[int, float, int]:
+            # Position of the condition columns in the prewhere keys list.
+            static_priority = min(
+                prewhere_keys.index(col.column_name)
+                for col in cols
+                if col.column_name in prewhere_keys
+            )
+            saved_bytes = (
+                estimate_saved_bytes(
+                    cond, {col.column_name for col in cols}, query_columns, statistics,
                 )
-                for cols, cond in prewhere_candidates
-            ],
+                if statistics and isinstance(cond, FunctionCall)
+                else None
+            )
+            if saved_bytes is None:
+                return (1, 0, static_priority)
+            return (0, -saved_bytes, static_priority)
+
+        # Use the condition that has the highest priority
+        sorted_candidates = sorted(
+            [(priority(cols, cond), cond) for cols, cond in prewhere_candidates],
             key=lambda priority_and_col: priority_and_col[0],
         )
         prewhere_conditions = [cond for _, cond in sorted_candidates][
@@ -4,6 +4,7 @@ import sentry_sdk
 from sentry_sdk import Hub
 
 from snuba import environment, settings, state
+from snuba.querylog.query_log_collector import query_log_collector
 from snuba.querylog.query_metadata import QueryStatus, SnubaQueryMetadata
 from snuba.request import Request
 from snuba.utils.metrics.timer import Timer
@@ -27,7 +28,13 @@ def record_query(
         # We convert this to a dict before passing it to state in order to avoid a
         # circular dependency, where state would depend on the higher level
         # QueryMetadata class
-        state.record_query(query_metadata.to_dict())
+        def record() -> None:
+            state.record_query(query_metadata.to_dict())
+
+        # The record is completed with the stats of ClickHouse if its
+        # queries are looked up in the query log.
+        if not query_log_collector.defer(query_metadata, record):
+            record()
 
         final = str(request.query.get_final())
         referrer = request.referrer or "none"
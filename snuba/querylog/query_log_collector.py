@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import (
+    Any,
+    Callable,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+)
+
+from snuba import environment, settings
+from snuba.clickhouse.escaping import escape_string
+from snuba.clickhouse.formatter.nodes import FormattedQuery, StringNode
+from snuba.querylog.query_metadata import SnubaQueryMetadata
+from snuba.reader import Reader
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from snuba.web.fingerprints import fingerprint_stats
+
+logger = logging.getLogger(__name__)
+
+metrics = MetricsWrapper(environment.metrics, "query_log_collector")
+
+# The ProfileEvents of a query that are added to its stats, all the others
+# are discarded.
+PROFILE_EVENTS = (
+    "SelectedParts",
+    "SelectedRanges",
+    "SelectedMarks",
+    "SelectedRows",
+    "SelectedBytes",
+    "OSCPUVirtualTimeMicroseconds",
+)
+
+# Entries that are never recorded (dry runs, for example) are dropped
+# this long after their lookups are done.
+UNRECORDED_TTL_SEC = 60
+
+
+@dataclass
+class _Lookup:
+    reader: Reader
+    query_id: str
+    start: float
+    attempts: int = 0
+    done: bool = False
+    profile: Optional[Mapping[str, Any]] = None
+
+
+@dataclass
+class _Entry:
+    query_metadata: SnubaQueryMetadata
+    lookups: MutableSequence[_Lookup] = field(default_factory=list)
+    record: Optional[Callable[[], None]] = None
+    done_at: Optional[float] = None
+
+
+def _get_start(row: Mapping[str, Any]) -> int:
+    return int(row["start"])
+
+
+class QueryLogCollector:
+    """
+    Looks up the queries executed by this process in the `system.query_log`
+    table of the ClickHouse node that ran them, in the background, and adds
+    what ClickHouse knows about them (rows and bytes read, memory used and
+    some ProfileEvents) to their stats in the querylog.
+
+    ClickHouse flushes the query log every few seconds, so queries are only
+    looked up `delay` seconds after they started, in batches of at most
+    `batch_size` queries per node every `interval` seconds, and given up
+    after `max_attempts` lookups. Recording a Snuba query in the querylog
+    is deferred until all its ClickHouse queries have been looked up.
+
+    Nothing here runs on the query path besides keeping track of queries:
+    at most `max_pending` Snuba queries are tracked at a time, the others
+    are recorded right away without ClickHouse stats.
+    """
+
+    def __init__(
+        self,
+        delay: float = settings.QUERY_LOG_PROFILE_DELAY_SEC,
+        interval: float = settings.QUERY_LOG_PROFILE_INTERVAL_SEC,
+        max_attempts: int = settings.QUERY_LOG_PROFILE_MAX_ATTEMPTS,
+        max_pending: int = settings.QUERY_LOG_PROFILE_MAX_PENDING,
+        batch_size: int = settings.QUERY_LOG_PROFILE_BATCH_SIZE,
+    ) -> None:
+        self.__delay = delay
+        self.__interval = interval
+        self.__max_attempts = max_attempts
+        self.__max_pending = max_pending
+        self.__batch_size = batch_size
+        self.__lock = threading.Lock()
+        # Keyed by the id of the query metadata since it is not hashable.
+        self.__entries: MutableMapping[int, _Entry] = {}
+        self.__thread: Optional[threading.Thread] = None
+
+    def track(
+        self,
+        query_metadata: SnubaQueryMetadata,
+        reader: Reader,
+        query_id: str,
+        start: float,
+    ) -> None:
+        """
+        Schedules the lookup of a ClickHouse query that started at `start`
+        with the reader that executed it.
+        """
+        with self.__lock:
+            entry = self.__entries.get(id(query_metadata))
+            if entry is None:
+                if len(self.__entries) >= self.__max_pending:
+                    metrics.increment("dropped")
+                    return
+                entry = self.__entries[id(query_metadata)] = _Entry(query_metadata)
+            entry.lookups.append(_Lookup(reader, query_id, start))
+            entry.done_at = None
+
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+
+    def defer(
+        self, query_metadata: SnubaQueryMetadata, record: Callable[[], None]
+    ) -> bool:
+        """
+        Defers recording a Snuba query until its ClickHouse queries have been
+        looked up. Returns False, without calling `record`, if none of them
+        is being tracked.
+        """
+        with self.__lock:
+            entry = self.__entries.get(id(query_metadata))
+            if entry is None:
+                return False
+            entry.record = record
+            return True
+
+    def __run(self) -> None:
+        while True:
+            time.sleep(self.__interval)
+            try:
+                self.collect(time.time())
+            except Exception:
+                logger.exception("Failed to collect the query log")
+
+    def collect(self, now: float) -> None:
+        """
+        Runs one round of lookups, for the queries that are due, and records
+        the Snuba queries whose lookups are all done.
+        """
+        batches: MutableMapping[int, MutableSequence[_Lookup]] = {}
+        with self.__lock:
+            for entry in self.__entries.values():
+                for lookup in entry.lookups:
+                    if not lookup.done and lookup.start + self.__delay <= now:
+                        batches.setdefault(id(lookup.reader), []).append(lookup)
+
+        for lookups in batches.values():
+            for index in range(0, len(lookups), self.__batch_size):
+                self.__lookup(lookups[index : index + self.__batch_size])
+
+        completed = []
+        with self.__lock:
+            for key, entry in list(self.__entries.items()):
+                if not all(lookup.done for lookup in entry.lookups):
+                    continue
+                if entry.done_at is None:
+                    entry.done_at = now
+                if entry.record is not None:
+                    completed.append(self.__entries.pop(key))
+                elif now - entry.done_at > UNRECORDED_TTL_SEC:
+                    del self.__entries[key]
+
+        for entry in completed:
+            self.__complete(entry)
+
+    def __lookup(self, lookups: Sequence[_Lookup]) -> None:
+        # The query id is the cache key of the query so the same id can be
+        # found more than once, the closest start time is the one we ran.
+        start = min(lookup.start for lookup in lookups)
+        query_ids = ", ".join(
+            sorted({escape_string(lookup.query_id) for lookup in lookups})
+        )
+        sql = (
+            "SELECT query_id, toUnixTimestamp(query_start_time) AS start, "
+            "read_rows, read_bytes, memory_usage, "
+            "ProfileEvents.Names AS event_names, "
+            "ProfileEvents.Values AS event_values "
+            "FROM system.query_log "
+            "WHERE type = 'QueryFinish' "
+            f"AND event_date >= toDate({int(start)}) "
+            f"AND event_time >= toDateTime({int(start)}) "
+            f"AND query_id IN ({query_ids})"
+        )
+        try:
+            rows = lookups[0].reader.execute(FormattedQuery([StringNode(sql)]))["data"]
+        except Exception:
+            logger.warning("Failed to look up queries in the query log", exc_info=True)
+            metrics.increment("lookup_failed")
+            rows = []
+
+        with self.__lock:
+            for lookup in lookups:
+                candidates = [
+                    row
+                    for row in rows
+                    if row["query_id"] == lookup.query_id
+                    and row["start"] >= int(lookup.start)
+                ]
+                if candidates:
+                    row = min(candidates, key=_get_start)
+                    lookup.profile = {
+                        "read_rows": row["read_rows"],
+                        "read_bytes": row["read_bytes"],
+                        "memory_usage": row["memory_usage"],
+                        "profile_events": {
+                            name: value
+                            for name, value in zip(
+                                row["event_names"], row["event_values"]
+                            )
+                            if name in PROFILE_EVENTS
+                        },
+                    }
+                    lookup.done = True
+                else:
+                    lookup.attempts += 1
+                    if lookup.attempts >= self.__max_attempts:
+                        metrics.increment("not_found")
+                        lookup.done = True
+
+    def __complete(self, entry: _Entry) -> None:
+        profiles = {
+            lookup.query_id: lookup.profile
+            for lookup in entry.lookups
+            if lookup.profile is not None
+        }
+        query_list = entry.query_metadata.query_list
+        for index, query in enumerate(query_list):
+            profile = profiles.get(query.stats.get("query_id", ""))
+            if profile is None:
+                continue
+            query_list[index] = replace(query, stats={**query.stats, **profile})
+
+            tags = {"table": query.stats.get("clickhouse_table", "")}
+            metrics.timing("read_rows", profile["read_rows"], tags=tags)
+            metrics.timing("read_bytes", profile["read_bytes"], tags=tags)
+            metrics.timing("memory_usage", profile["memory_usage"], tags=tags)
+            fingerprint = query.stats.get("fingerprint")
+            if fingerprint is not None:
+                fingerprint_stats.record_rows_read(
+                    fingerprint, query.sql_anonymized, profile["read_rows"]
+                )
+
+        try:
+            assert entry.record is not None
+            entry.record()
+        except Exception:
+            logger.exception("Failed to record a query")
+
+
+query_log_collector = QueryLogCollector()
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Dict, Mapping, MutableSequence, Optional, Set
 
@@ -49,6 +49,8 @@ class ClickhouseQueryProfile:
     groupby_cols: Columnset
     # Columns in arrayjoin statements
     array_join_cols: Columnset
+    # Columns in the conditions moved to the prewhere clause
+    prewhere_cols: Columnset = field(default_factory=set)
 
     def to_dict(self) -> Mapping[str, Any]:
         return {
@@ -59,6 +61,7 @@ class ClickhouseQueryProfile:
             "where_profile": self.where_profile.to_dict(),
             "groupby_cols": sorted(self.groupby_cols),
             "array_join_cols": sorted(self.array_join_cols),
+            "prewhere_cols": sorted(self.prewhere_cols),
         }
 
 
@@ -110,6 +110,41 @@ def build_result_transformer(
     return transform_result
 
 
+def build_column_transformer(
+    column_transformations: Sequence[Tuple[Pattern[str], Callable[[Any], Any]]],
+) -> Callable[[Sequence[Column], MutableSequence[Sequence[Any]]], None]:
+    """
+    Like ``build_result_transformer``, but builds a function that mutates
+    a column-oriented result, given as its meta and the sequence of the
+    values of each of its columns, transforming whole columns at once.
+    """
+
+    def transform_columns(
+        meta: Sequence[Column], columns: MutableSequence[Sequence[Any]]
+    ) -> None:
+        for index, column in enumerate(meta):
+            is_nullable, type = unwrap_nullable_type(column["type"])
+
+            transformer = next(
+                (
+                    transformer
+                    for pattern, transformer in column_transformations
+                    if pattern.match(type)
+                ),
+                None,
+            )
+
+            if transformer is None:
+                continue
+
+            if is_nullable:
+                transformer = transform_nullable(transformer)
+
+            columns[index] = [transformer(value) for value in columns[index]]
+
+    return transform_columns
+
+
 class Reader(ABC):
     @abstractmethod
     def execute(
@@ -121,3 +156,10 @@ class Reader(ABC):
     ) -> Result:
         """Execute a query."""
         raise NotImplementedError
+
+    def cancel(self, query_id: str) -> None:
+        """
+        Stops the execution of the query that was given this id in its
+        settings. Readers that cannot cancel queries ignore this.
+        """
+        return None
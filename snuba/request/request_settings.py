@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Sequence
+from typing import Mapping, MutableMapping, Sequence
 
 from snuba.state.rate_limit import RateLimitParameters, get_global_rate_limit_params
 
@@ -43,6 +43,17 @@ class RequestSettings(ABC):
     def add_rate_limit(self, rate_limit_param: RateLimitParameters) -> None:
         pass
 
+    @abstractmethod
+    def record_processor_duration(self, processor: str, duration_ms: float) -> None:
+        """
+        Accumulates the time spent by a query processor on this request.
+        """
+        pass
+
+    @abstractmethod
+    def get_processor_durations(self) -> Mapping[str, float]:
+        pass
+
 
 class HTTPRequestSettings(RequestSettings):
     """
@@ -65,6 +76,7 @@ class HTTPRequestSettings(RequestSettings):
         self.__dry_run = dry_run
         self.__legacy = legacy
         self.__rate_limit_params = [get_global_rate_limit_params()]
+        self.__processor_durations: MutableMapping[str, float] = {}
 
     def get_turbo(self) -> bool:
         return self.__turbo
@@ -87,6 +99,14 @@ class HTTPRequestSettings(RequestSettings):
     def add_rate_limit(self, rate_limit_param: RateLimitParameters) -> None:
         self.__rate_limit_params.append(rate_limit_param)
 
+    def record_processor_duration(self, processor: str, duration_ms: float) -> None:
+        self.__processor_durations[processor] = (
+            self.__processor_durations.get(processor, 0.0) + duration_ms
+        )
+
+    def get_processor_durations(self) -> Mapping[str, float]:
+        return self.__processor_durations
+
 
 class SubscriptionRequestSettings(RequestSettings):
     """
@@ -96,6 +116,7 @@ class SubscriptionRequestSettings(RequestSettings):
 
     def __init__(self, consistent: bool = True) -> None:
         self.__consistent = consistent
+        self.__processor_durations: MutableMapping[str, float] = {}
 
     def get_turbo(self) -> bool:
         return False
@@ -117,3 +138,11 @@ class SubscriptionRequestSettings(RequestSettings):
 
     def add_rate_limit(self, rate_limit_param: RateLimitParameters) -> None:
         pass
+
+    def record_processor_duration(self, processor: str, duration_ms: float) -> None:
+        self.__processor_durations[processor] = (
+            self.__processor_durations.get(processor, 0.0) + duration_ms
+        )
+
+    def get_processor_durations(self) -> Mapping[str, float]:
+        return self.__processor_durations
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import itertools
-from typing import Any, Mapping, MutableMapping, NamedTuple, Type
+from functools import lru_cache
+from typing import Any, Mapping, MutableMapping, NamedTuple, Optional, Type
 
 import jsonschema
 import sentry_sdk
 
 from snuba import environment
 from snuba.datasets.entities.factory import get_entity
+from snuba.datasets.entity import Entity
 from snuba.query.extensions import QueryExtension
 from snuba.query.logical import Query
 from snuba.query.schema import GENERIC_QUERY_SCHEMA, SNQL_QUERY_SCHEMA
@@ -18,7 +20,7 @@ from snuba.request.request_settings import (
     RequestSettings,
     SubscriptionRequestSettings,
 )
-from snuba.schemas import Schema, validate_jsonschema
+from snuba.schemas import JsonSchemaValidator, Schema
 from snuba.utils.metrics.wrapper import MetricsWrapper
 
 metrics = MetricsWrapper(environment.metrics, "parser")
@@ -80,6 +82,24 @@ class RequestSchema:
                 ] = definition_schema
 
         self.__composite_schema["required"] = set(self.__composite_schema["required"])
+        self.__validator = JsonSchemaValidator(self.__composite_schema)
+
+    @classmethod
+    def build(
+        cls,
+        entity: Optional[Entity],
+        settings_class: Type[RequestSettings],
+        language: Language,
+    ) -> RequestSchema:
+        """
+        Returns the schema of the requests on the entity with these settings
+        and language. It is built once and shared by all these requests.
+        SnQL requests have no extensions, so they share the same schema
+        whatever the entity.
+        """
+        return _build_request_schema(
+            entity if language == Language.LEGACY else None, settings_class, language
+        )
 
     @classmethod
     def build_with_extensions(
@@ -109,7 +129,7 @@ class RequestSchema:
 
     def validate(self, value: MutableMapping[str, Any]) -> RequestParts:
         try:
-            value = validate_jsonschema(value, self.__composite_schema)
+            value = self.__validator.validate(value)
         except jsonschema.ValidationError as error:
             raise JsonSchemaValidationException(str(error)) from error
 
@@ -186,6 +206,17 @@ SETTINGS_SCHEMAS: Mapping[Type[RequestSettings], Schema] = {
 }
 
 
+# Entities are built once, so they are a stable key, unlike the extensions
+# they build on every call.
+@lru_cache(maxsize=None)
+def _build_request_schema(
+    entity: Optional[Entity], settings_class: Type[RequestSettings], language: Language,
+) -> RequestSchema:
+    return RequestSchema.build_with_extensions(
+        entity.get_extensions() if entity is not None else {}, settings_class, language,
+    )
+
+
 def apply_query_extensions(
     query: Query, extensions: Mapping[str, Mapping[str, Any]], settings: RequestSettings
 ) -> None:
@@ -4,12 +4,14 @@ from typing import Any, Callable, ChainMap, MutableMapping, Sequence, Type, Unio
 
 import sentry_sdk
 
+from snuba import settings as snuba_settings
 from snuba import state
 from snuba.clickhouse.query_dsl.accessors import get_object_ids_in_query_ast
 from snuba.datasets.dataset import Dataset
 from snuba.query.composite import CompositeQuery
 from snuba.query.data_source.simple import Entity
 from snuba.query.exceptions import InvalidQueryException
+from snuba.query.interning import expression_interner
 from snuba.query.logical import Query
 from snuba.query.parser import parse_query
 from snuba.query.snql.parser import parse_snql_query as _parse_snql_query
@@ -87,6 +89,8 @@ def build_request(
                 )
 
             query = parser(request_parts, settings_obj, dataset)
+            if snuba_settings.INTERN_QUERY_EXPRESSIONS:
+                expression_interner.intern_query(query)
 
             project_ids = get_object_ids_in_query_ast(query, "project_id")
             if project_ids is not None and len(project_ids) == 1:
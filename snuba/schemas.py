@@ -1,4 +1,5 @@
 import copy
+import threading
 from typing import Any, Generator, Mapping, MutableMapping
 
 import jsonschema
@@ -7,53 +8,117 @@ import jsonschema
 Schema = Mapping[str, Any]  # placeholder for JSON schema
 
 
-def validate_jsonschema(
-    value: MutableMapping[str, Any],
-    schema: MutableMapping[str, Any],
-    set_defaults: bool = True,
-) -> MutableMapping[str, Any]:
-    """
-    Validates a value against the provided schema, returning the validated
-    value if the value conforms to the schema, otherwise raising a
-    ``jsonschema.ValidationError``.
-    """
-    orig = jsonschema.Draft6Validator.VALIDATORS["properties"]
-
-    def validate_and_default(
-        validator: object,
-        properties: Mapping[str, Any],
-        instance: MutableMapping[str, Any],
-        schema: Mapping[str, Any],
-    ) -> Generator[Exception, None, None]:
+_validate_properties = jsonschema.Draft6Validator.VALIDATORS["properties"]
+
+
+def _validate_and_default(
+    validator: jsonschema.Draft4Validator,
+    properties: Mapping[str, Any],
+    instance: MutableMapping[str, Any],
+    schema: Mapping[str, Any],
+) -> Generator[Exception, None, None]:
+    if validator.is_type(instance, "object"):
         for property, subschema in properties.items():
-            if property not in instance and "default" in subschema:
+            if property in instance:
+                # Nested objects are copied before they get their defaults,
+                # so the value being validated is never mutated.
+                if "properties" in subschema and isinstance(instance[property], dict):
+                    instance[property] = dict(instance[property])
+            elif "default" in subschema:
                 if callable(subschema["default"]):
                     default_value = subschema["default"]()
                 else:
                     default_value = copy.deepcopy(subschema["default"])
                 instance[property] = default_value
 
-        for error in orig(validator, properties, instance, schema):
-            yield error
+    for error in _validate_properties(validator, properties, instance, schema):
+        yield error
+
+
+_DefaultingValidator = jsonschema.validators.extend(
+    jsonschema.Draft4Validator, {"properties": _validate_and_default}
+)
 
-    # Using schema defaults during validation will cause the input value to be
-    # mutated, so to be on the safe side we create a deep copy of that value to
-    # avoid unwanted side effects for the calling function.
-    if set_defaults:
-        value = copy.deepcopy(value)
 
-    validator_cls = (
-        jsonschema.validators.extend(
-            jsonschema.Draft4Validator, {"properties": validate_and_default}
+def _count_defaults(schema: Any) -> int:
+    if isinstance(schema, Mapping):
+        return int("default" in schema) + sum(
+            _count_defaults(value) for value in schema.values()
         )
-        if set_defaults
-        else jsonschema.Draft6Validator
+    elif isinstance(schema, (list, tuple)):
+        return sum(_count_defaults(value) for value in schema)
+    return 0
+
+
+def _count_inline_defaults(schema: Mapping[str, Any]) -> int:
+    return int("default" in schema) + sum(
+        _count_inline_defaults(subschema)
+        for subschema in schema.get("properties", {}).values()
     )
 
-    validator_cls(
-        schema,
-        types={"array": (list, tuple)},
-        format_checker=jsonschema.FormatChecker(),
-    ).validate(value, schema)
 
-    return value
+class JsonSchemaValidator:
+    """
+    Validates values against a schema. The validator is built once and
+    reused for every value, rather than for each validation.
+
+    When defaults are set, the value is copied so the caller's value is
+    never mutated. If every default of the schema is declared on the
+    properties of nested objects (not under references, combinators or
+    array items), only the objects that may receive defaults are copied,
+    and only shallowly. Otherwise the whole value is deep copied.
+    """
+
+    def __init__(self, schema: MutableMapping[str, Any], set_defaults: bool = True):
+        self.__schema = schema
+        self.__set_defaults = set_defaults
+        self.__shallow_copy = _count_defaults(schema) == _count_inline_defaults(schema)
+        # The reference resolver of a validator keeps a stack of scopes
+        # while validating, so a validator is not shared between threads.
+        self.__local = threading.local()
+
+    def __get_validator(self) -> jsonschema.Draft4Validator:
+        validator = getattr(self.__local, "validator", None)
+        if validator is None:
+            validator_cls = (
+                _DefaultingValidator
+                if self.__set_defaults
+                else jsonschema.Draft6Validator
+            )
+            validator = validator_cls(
+                self.__schema,
+                types={"array": (list, tuple)},
+                format_checker=jsonschema.FormatChecker(),
+            )
+            self.__local.validator = validator
+        return validator
+
+    def validate(self, value: MutableMapping[str, Any]) -> MutableMapping[str, Any]:
+        """
+        Returns the validated value if it conforms to the schema, otherwise
+        raises a ``jsonschema.ValidationError``.
+        """
+        if self.__set_defaults:
+            if self.__shallow_copy and isinstance(value, dict):
+                value = dict(value)
+            else:
+                value = copy.deepcopy(value)
+
+        self.__get_validator().validate(value)
+        return value
+
+
+def validate_jsonschema(
+    value: MutableMapping[str, Any],
+    schema: MutableMapping[str, Any],
+    set_defaults: bool = True,
+) -> MutableMapping[str, Any]:
+    """
+    Validates a value against the provided schema, returning the validated
+    value if the value conforms to the schema, otherwise raising a
+    ``jsonschema.ValidationError``.
+
+    This builds a new validator for each call, use a ``JsonSchemaValidator``
+    to validate many values against the same schema.
+    """
+    return JsonSchemaValidator(schema, set_defaults).validate(value)
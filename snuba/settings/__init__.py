@@ -1,5 +1,5 @@
 import os
-from typing import Any, Mapping, MutableMapping, Sequence, Set
+from typing import Any, Mapping, MutableMapping, Optional, Sequence, Set
 
 from snuba.settings.validation import _validate_settings
 
@@ -18,6 +18,18 @@ DISABLED_DATASETS: Set[str] = {"metrics"}
 
 # Clickhouse Options
 CLICKHOUSE_MAX_POOL_SIZE = 25
+# Connections each API process opens to the query nodes when it starts.
+CLICKHOUSE_POOL_WARMUP_CONNECTIONS = 0
+# Idle connections are pinged at this interval so that they are still
+# open when a query needs them.
+CLICKHOUSE_POOL_KEEPALIVE_INTERVAL_SEC: Optional[float] = None
+# Connections are closed and opened again once they are this old, which
+# spreads them over nodes added behind a load balancer.
+CLICKHOUSE_POOL_MAX_CONNECTION_AGE_SEC: Optional[float] = None
+# Threads running the queries of the referrers that have hedged reads
+# enabled, for the clusters with a hedge_host (see
+# snuba.clickhouse.hedged_reader).
+HEDGED_READS_MAX_WORKERS = 64
 
 CLUSTERS: Sequence[Mapping[str, Any]] = [
     {
@@ -51,6 +63,9 @@ DOGSTATSD_SAMPLING_RATES = {
     "subscriptions.receive_latency": 0.1,
     "subscriptions.process_message": 0.1,
 }
+# When set, metrics are aggregated in process and sent to DogStatsd once
+# per interval instead of once per call.
+DOGSTATSD_AGGREGATION_INTERVAL_SEC: Optional[float] = None
 
 # Redis Options
 USE_REDIS_CLUSTER = os.environ.get("USE_REDIS_CLUSTER", "0") != "0"
@@ -79,6 +94,11 @@ SNAPSHOT_LOAD_PRODUCT = "snuba"
 SNAPSHOT_CONTROL_TOPIC_INIT_TIMEOUT = 30
 BULK_CLICKHOUSE_BUFFER = 10000
 BULK_BINARY_LOAD_CHUNK = 2 ** 22  # 4 MB
+# Approximate size of the ranges a table file is split into by parallel
+# bulk loads. This is also the granularity of the load checkpoints.
+BULK_LOAD_RANGE_SIZE = 2 ** 27  # 128 MB
+# Rows of the snapshot transformed at once by the bulk load block processors
+BULK_LOAD_BLOCK_SIZE = 10000
 
 # Processor/Writer Options
 
@@ -105,6 +125,61 @@ DEFAULT_RETENTION_DAYS = 90
 RETENTION_OVERRIDES: Mapping[int, int] = {}
 
 MAX_PREWHERE_CONDITIONS = 1
+# Rank the prewhere candidates through the column sizes and the sampled
+# selectivity of the conditions instead of the static candidates order.
+PREWHERE_USE_COLUMN_STATISTICS = False
+PREWHERE_STATISTICS_REFRESH_INTERVAL = 10 * 60
+PREWHERE_STATISTICS_SAMPLE_ROWS = 100000
+
+# Expensive queries that are queued by the admission control, instead of
+# being rejected, wait for one of these slots. The budgets are runtime
+# configs (see snuba.web.admission).
+ADMISSION_QUEUE_SLOTS = 4
+ADMISSION_MIN_SAMPLING_RATE = 0.01
+
+# Maximum number of queries running at the same time in each API process,
+# the others wait in per referrer queues served by weighted fair queueing
+# (see snuba.web.scheduler). Queries are not queued when this is None.
+QUERY_SCHEDULER_MAX_IN_FLIGHT: Optional[int] = None
+# Weights of the priority classes, referrers not listed in the mapping
+# below belong to the default class.
+QUERY_SCHEDULER_CLASS_WEIGHTS: Mapping[str, float] = {
+    "alerts": 8,
+    "ui": 4,
+    "default": 2,
+    "export": 1,
+}
+QUERY_SCHEDULER_REFERRER_CLASSES: Mapping[str, str] = {}
+
+# Queries submitted with ?async=1 run on a thread pool of the API process
+# and their responses are kept in Redis until they are polled.
+ASYNC_QUERY_WORKERS = 4
+ASYNC_QUERY_MAX_PENDING = 32
+ASYNC_QUERY_RESULT_TTL = 10 * 60
+ASYNC_QUERY_MAX_WAIT_SEC = 30
+# Threads parsing and running queries in each process of the ASGI API.
+# A synchronous query holds one of them until it completes, so only async
+# queries whose results are long polled go beyond this concurrency.
+ASGI_QUERY_WORKERS = 32
+# Builds all the datasets, entities and storages when the API starts,
+# before its workers are forked, instead of on the first query of each
+# dataset in each worker (see snuba.web.boot).
+PREWARM_REGISTRIES = False
+# Each API process keeps statistics of the queries it runs grouped by
+# fingerprint (see snuba.web.fingerprints) over the last
+# FINGERPRINT_STATS_WINDOWS intervals.
+FINGERPRINT_STATS_INTERVAL_SEC = 60
+FINGERPRINT_STATS_WINDOWS = 15
+FINGERPRINT_STATS_MAX_FINGERPRINTS = 1000
+# When the query_log_profile_enabled runtime config is set, the queries run
+# by the API are looked up in system.query_log in the background and their
+# ClickHouse stats are added to the querylog (see
+# snuba.querylog.query_log_collector).
+QUERY_LOG_PROFILE_DELAY_SEC = 10
+QUERY_LOG_PROFILE_INTERVAL_SEC = 5
+QUERY_LOG_PROFILE_MAX_ATTEMPTS = 3
+QUERY_LOG_PROFILE_MAX_PENDING = 10000
+QUERY_LOG_PROFILE_BATCH_SIZE = 500
 
 STATS_IN_RESPONSE = False
 
@@ -123,6 +198,9 @@ TURBO_SAMPLE_RATE = 0.1
 
 PROJECT_STACKTRACE_BLACKLIST: Set[int] = set()
 PRETTY_FORMAT_EXPRESSIONS = True
+# Replaces structurally equal subtrees of the AST of each query with
+# a shared instance after parsing.
+INTERN_QUERY_EXPRESSIONS = False
 
 TOPIC_PARTITION_COUNTS: Mapping[str, int] = {}  # (topic name, # of partitions)
 
@@ -8,6 +8,9 @@ from typing import Any, Generator, Iterable, Mapping, NewType, Optional, Sequenc
 
 SnapshotId = NewType("SnapshotId", str)
 SnapshotTableRow = Mapping[str, Any]
+# A sequence of consecutive rows of a table file, stored by column. Each
+# column holds the raw values of the file.
+ColumnBlock = Mapping[str, Sequence[str]]
 
 
 @dataclass(frozen=True)
@@ -89,6 +92,17 @@ class SnapshotDescriptor:
         raise ValueError(f"Table {table_name} does not exists in the snapshot")
 
 
+@dataclass(frozen=True)
+class FileRange:
+    """
+    A range of bytes [start, end) of a table file. Ranges always start
+    and end at row boundaries so they can be parsed independently.
+    """
+
+    start: int
+    end: int
+
+
 class BulkLoadSource(ABC):
     """
     Represent a source we can bulk load Snuba datasets from.
@@ -101,11 +115,38 @@ class BulkLoadSource(ABC):
     def get_descriptor(self) -> SnapshotDescriptor:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_table_file_size(self, table_name: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_table_file_ranges(self, table: str, count: int) -> Sequence[FileRange]:
+        """
+        Splits the rows of a table file in at most count ranges of
+        approximately the same size, which can be loaded in parallel.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     @contextmanager
     def get_parsed_table_file(
-        self, table: str
+        self, table: str, file_range: Optional[FileRange] = None,
     ) -> Generator[Iterable[SnapshotTableRow], None, None]:
+        """
+        Provides the rows of a table file, all of them or only the ones
+        in the range provided.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    @contextmanager
+    def get_table_file_blocks(
+        self, table: str, block_size: int, file_range: Optional[FileRange] = None,
+    ) -> Generator[Iterable[ColumnBlock], None, None]:
+        """
+        Provides the same rows as get_parsed_table_file, in blocks of at
+        most block_size rows, without building an object for each row.
+        """
         raise NotImplementedError
 
     @abstractmethod
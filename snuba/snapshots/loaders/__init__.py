@@ -6,6 +6,9 @@ from snuba.writer import BatchWriter, BufferedWriterWrapper, WriterTableRow
 
 ProgressCallback = Callable[[int], None]
 
+WriterFactory = Callable[[], BufferedWriterWrapper[JSONRow, WriterTableRow]]
+BlockWriterFactory = Callable[[], BatchWriter[bytes]]
+
 
 class BulkLoader(ABC):
     """
@@ -25,6 +28,41 @@ class BulkLoader(ABC):
     ) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def load_parallel(
+        self,
+        writer_factory: WriterFactory,
+        ignore_existing_data: bool,
+        progress_callback: Optional[ProgressCallback],
+        workers: int,
+        checkpoint_path: Optional[str],
+    ) -> None:
+        """
+        Loads the data like load does, but splits the source in ranges
+        that are processed and written by a pool of worker processes,
+        each one with its own writer built through the factory.
+
+        If a checkpoint path is provided the completed ranges are recorded
+        there, and loading again with the same checkpoint skips them.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_blocks(
+        self,
+        writer_factory: BlockWriterFactory,
+        ignore_existing_data: bool,
+        progress_callback: Optional[ProgressCallback],
+        workers: int,
+        checkpoint_path: Optional[str],
+    ) -> None:
+        """
+        Loads the data like load_parallel does, but transforms the source
+        in blocks of rows instead of one row at a time. The blocks are
+        written in CSV format through writers built by the factory.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def load_preprocessed(
         self,
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Callable, Sequence, Set
+
+from snuba.snapshots import FileRange, SnapshotId
+
+
+class BulkLoadCheckpoint:
+    """
+    Keeps track, in a JSON file, of the ranges of a table file that have
+    been completely loaded so that an interrupted bulk load can resume
+    from where it stopped instead of starting over.
+
+    The ranges themselves are stored in the file as well, since splitting
+    the table again with different parameters would produce different
+    boundaries.
+
+    Rows of a range that was being loaded when the process stopped are
+    loaded again when resuming. This relies on the destination table
+    deduplicating rows with the same key (the CDC tables are Replacing
+    Merge Trees).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        snapshot_id: SnapshotId,
+        table: str,
+        ranges: Sequence[FileRange],
+        completed: Set[FileRange],
+    ) -> None:
+        self.__path = path
+        self.__snapshot_id = snapshot_id
+        self.__table = table
+        self.__ranges = ranges
+        self.__completed = completed
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        snapshot_id: SnapshotId,
+        table: str,
+        ranges_provider: Callable[[], Sequence[FileRange]],
+    ) -> BulkLoadCheckpoint:
+        """
+        Loads the checkpoint file if it exists, otherwise it splits the
+        table through the ranges provider and creates the file.
+        """
+        if not os.path.exists(path):
+            checkpoint = BulkLoadCheckpoint(
+                path, snapshot_id, table, ranges_provider(), set()
+            )
+            checkpoint.__save()
+            return checkpoint
+
+        with open(path, "r") as checkpoint_file:
+            content = json.load(checkpoint_file)
+
+        if content["snapshot_id"] != snapshot_id or content["table"] != table:
+            raise ValueError(
+                "The checkpoint %s belongs to the load of table %s from snapshot %s"
+                % (path, content["table"], content["snapshot_id"])
+            )
+
+        return BulkLoadCheckpoint(
+            path,
+            snapshot_id,
+            table,
+            [FileRange(start, end) for start, end in content["ranges"]],
+            {FileRange(start, end) for start, end in content["completed"]},
+        )
+
+    def is_resumed(self) -> bool:
+        return bool(self.__completed)
+
+    def get_completed_bytes(self) -> int:
+        return sum(r.end - r.start for r in self.__completed)
+
+    def get_pending_ranges(self) -> Sequence[FileRange]:
+        return [r for r in self.__ranges if r not in self.__completed]
+
+    def complete(self, file_range: FileRange) -> None:
+        self.__completed.add(file_range)
+        self.__save()
+
+    def __save(self) -> None:
+        content = {
+            "snapshot_id": self.__snapshot_id,
+            "table": self.__table,
+            "ranges": [[r.start, r.end] for r in self.__ranges],
+            "completed": sorted([r.start, r.end] for r in self.__completed),
+        }
+        # Writes a new file and replaces the old one so that the
+        # checkpoint is never left half written.
+        temp_path = f"{self.__path}.tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump(content, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.__path)
@@ -6,12 +6,24 @@ import logging
 import os.path
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Generator, Iterable, NewType, Sequence
+from itertools import islice
+from typing import (
+    BinaryIO,
+    Generator,
+    Iterable,
+    Iterator,
+    NewType,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import jsonschema
 from snuba import settings
 from snuba.snapshots import (
     BulkLoadSource,
+    ColumnBlock,
+    FileRange,
     SnapshotDescriptor,
     SnapshotTableRow,
     TableConfig,
@@ -96,6 +108,55 @@ class PostgresSnapshotDescriptor(SnapshotDescriptor):
 logger = logging.getLogger("snuba.postgres-snapshot")
 
 
+def _find_row_boundaries(
+    table_file: BinaryIO, start: int, offsets: Sequence[int]
+) -> Sequence[int]:
+    """
+    Returns the offsets where rows begin that are closest to the offsets
+    provided (in ascending order), looking forward. Offsets that fall in
+    the same row share the same boundary and offsets in the last row do
+    not have one.
+
+    Quoted values can contain new lines, so a new line only terminates
+    a row when it is preceded by an even number of quotes since the
+    beginning of the file (quotes within values are escaped by doubling
+    them in the Postgres CSV format). This needs a sequential scan of the
+    file, though counting quotes runs at IO speed.
+    """
+    boundaries = []
+    pending = list(offsets)
+    table_file.seek(start)
+    chunk_start = start
+    quotes = 0
+    for chunk in iter(lambda: table_file.read(settings.BULK_BINARY_LOAD_CHUNK), b""):
+        chunk_end = chunk_start + len(chunk)
+        position = 0
+        chunk_quotes = quotes
+        while pending and pending[0] < chunk_end:
+            search_from = max(pending[0] - chunk_start, position)
+            chunk_quotes += chunk.count(b'"', position, search_from)
+            position = search_from
+            newline = chunk.find(b"\n", position)
+            while newline != -1:
+                chunk_quotes += chunk.count(b'"', position, newline)
+                position = newline
+                if chunk_quotes % 2 == 0:
+                    break
+                newline = chunk.find(b"\n", newline + 1)
+            if newline == -1:
+                # The row continues in the next chunk.
+                break
+            boundary = chunk_start + newline + 1
+            boundaries.append(boundary)
+            while pending and pending[0] < boundary:
+                pending.pop(0)
+
+        quotes += chunk.count(b'"')
+        chunk_start = chunk_end
+
+    return boundaries
+
+
 class PostgresSnapshot(BulkLoadSource):
     """
     TODO: Make this a library to be reused outside of Snuba when after this
@@ -156,18 +217,55 @@ class PostgresSnapshot(BulkLoadSource):
         path = self.__get_table_path(table_name)
         return os.stat(path).st_size
 
+    def get_table_file_ranges(self, table: str, count: int) -> Sequence[FileRange]:
+        table_desc = self.__descriptor.get_table(table)
+        # A gzip stream can only be read sequentially, it cannot be split
+        # in ranges without decompressing it.
+        assert not table_desc.zip, "Cannot split a gzip table file"
+
+        table_path = self.__get_table_path(table)
+        try:
+            with open(table_path, "rb") as table_file:
+                rows_start = len(table_file.readline())
+                file_size = os.fstat(table_file.fileno()).st_size
+                step = (file_size - rows_start) / count
+                boundaries = _find_row_boundaries(
+                    table_file,
+                    rows_start,
+                    [int(rows_start + step * i) for i in range(1, count)],
+                )
+        except FileNotFoundError:
+            raise ValueError(
+                "The snapshot does not contain the requested table %s" % table,
+            )
+
+        starts = [rows_start, *boundaries]
+        ends = [*boundaries, file_size]
+        return [
+            FileRange(start, end) for start, end in zip(starts, ends) if start < end
+        ]
+
     @contextmanager
-    def get_parsed_table_file(
-        self, table: str,
-    ) -> Generator[Iterable[SnapshotTableRow], None, None]:
+    def __open_table_file(
+        self, table: str, file_range: Optional[FileRange]
+    ) -> Generator[Tuple[Sequence[str], Iterator[str]], None, None]:
+        """
+        Validates the header of a table file and provides the columns it
+        contains together with the lines of the range requested.
+        """
         table_desc = self.__descriptor.get_table(table)
         assert not table_desc.zip, "Cannot parse a gzip table file on the fly"
 
         table_path = self.__get_table_path(table)
         try:
-            with open(table_path, "r") as table_file:
-                csv_file = csv.DictReader(table_file)
-                columns = csv_file.fieldnames
+            with open(table_path, "rb") as table_file:
+                columns: Sequence[str] = next(
+                    csv.reader([table_file.readline().decode("utf-8")]), []
+                )
+                if file_range is None:
+                    file_range = FileRange(
+                        table_file.tell(), os.fstat(table_file.fileno()).st_size
+                    )
 
                 descriptor_columns = self.__descriptor.get_table(table).columns
                 assert (
@@ -195,13 +293,38 @@ class PostgresSnapshot(BulkLoadSource):
                         "Won't pre-validate snapshot columns. There is nothing in the descriptor"
                     )
 
-                yield csv_file
+                yield columns, _read_lines(table_file, file_range)
 
         except FileNotFoundError:
             raise ValueError(
                 "The snapshot does not contain the requested table %s" % table,
             )
 
+    @contextmanager
+    def get_parsed_table_file(
+        self, table: str, file_range: Optional[FileRange] = None,
+    ) -> Generator[Iterable[SnapshotTableRow], None, None]:
+        with self.__open_table_file(table, file_range) as (columns, lines):
+            yield csv.DictReader(lines, fieldnames=columns)
+
+    @contextmanager
+    def get_table_file_blocks(
+        self, table: str, block_size: int, file_range: Optional[FileRange] = None,
+    ) -> Generator[Iterable[ColumnBlock], None, None]:
+        with self.__open_table_file(table, file_range) as (columns, lines):
+
+            def blocks() -> Iterator[ColumnBlock]:
+                rows = csv.reader(lines)
+                while True:
+                    block = list(islice(rows, block_size))
+                    if not block:
+                        return
+                    # Transposing the rows builds the columns in C without
+                    # going through every value in Python.
+                    yield dict(zip(columns, zip(*block)))
+
+            yield blocks()
+
     @contextmanager
     def get_preprocessed_table_file(
         self, table: str
@@ -223,3 +346,14 @@ class PostgresSnapshot(BulkLoadSource):
             raise ValueError(
                 "The snapshot does not contain the requested table %s" % table,
             )
+
+
+def _read_lines(table_file: BinaryIO, file_range: FileRange) -> Iterator[str]:
+    table_file.seek(file_range.start)
+    position = file_range.start
+    while position < file_range.end:
+        line = table_file.readline()
+        if not line:
+            return
+        position += len(line)
+        yield line.decode("utf-8")
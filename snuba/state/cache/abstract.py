@@ -1,3 +1,4 @@
+import threading
 from abc import ABC, abstractmethod
 from typing import Callable, Generic, Optional, TypeVar
 
@@ -15,6 +16,10 @@ class ExecutionTimeoutError(ExecutionError):
     pass
 
 
+class ExecutionAbandonedError(Exception):
+    pass
+
+
 class Cache(Generic[TValue], ABC):
     @abstractmethod
     def get(self, key: str) -> Optional[TValue]:
@@ -38,6 +43,8 @@ class Cache(Generic[TValue], ABC):
         record_cache_hit_type: Callable[[int], None],
         timeout: int,
         timer: Optional[Timer] = None,
+        abandoned: Optional[threading.Event] = None,
+        cancel: Optional[Callable[[], None]] = None,
     ) -> TValue:
         """
         Implements a read-through caching pattern for the value at the given
@@ -1,8 +1,10 @@
 import concurrent.futures
 import logging
+import threading
+import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, MutableMapping, Optional
 
 from pkg_resources import resource_string
 
@@ -11,6 +13,7 @@ from snuba.redis import RedisClientType
 from snuba.state import get_config
 from snuba.state.cache.abstract import (
     Cache,
+    ExecutionAbandonedError,
     ExecutionError,
     ExecutionTimeoutError,
     TValue,
@@ -25,6 +28,25 @@ RESULT_VALUE = 0
 RESULT_EXECUTE = 1
 RESULT_WAIT = 2
 
+# How often the client executing a task checks whether its caller went away.
+ABANDONED_CHECK_INTERVAL_SEC = 0.5
+
+
+class _InFlight:
+    """
+    A readthrough call in progress in this process, that other callers for
+    the same key wait for instead of going through Redis themselves. The
+    value is shared encoded, so each caller decodes its own copy and can
+    mutate it.
+    """
+
+    def __init__(self) -> None:
+        self.future: "Future[bytes]" = Future()
+        self.followers = 0
+
+    def has_followers(self) -> bool:
+        return self.followers > 0
+
 
 class RedisCache(Cache[TValue]):
     def __init__(
@@ -38,6 +60,8 @@ class RedisCache(Cache[TValue]):
         self.__prefix = prefix
         self.__codec = codec
         self.__executor = executor
+        self.__in_flight_lock = threading.Lock()
+        self.__in_flight: MutableMapping[str, _InFlight] = {}
 
         # TODO: This should probably be lazily instantiated, rather than
         # automatically happening at startup.
@@ -62,6 +86,33 @@ class RedisCache(Cache[TValue]):
 
         return self.__codec.decode(value)
 
+    def __wait_for_task(
+        self,
+        future: "Future[TValue]",
+        timeout: int,
+        wait_queue_key: str,
+        abandoned: Optional[threading.Event],
+        has_followers: Callable[[], bool],
+    ) -> TValue:
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            try:
+                if abandoned is None:
+                    return future.result(remaining)
+                return future.result(min(remaining, ABANDONED_CHECK_INTERVAL_SEC))
+            except concurrent.futures.TimeoutError:
+                if abandoned is None or time.time() >= deadline:
+                    raise
+                # The wait queue holds our own entry and one for each of the
+                # clients waiting for the value in other processes.
+                if (
+                    abandoned.is_set()
+                    and not has_followers()
+                    and self.__client.llen(wait_queue_key) <= 1
+                ):
+                    raise ExecutionAbandonedError("no client is waiting for the value")
+
     def set(self, key: str, value: TValue) -> None:
         self.__client.set(
             self.__build_key(key),
@@ -76,6 +127,87 @@ class RedisCache(Cache[TValue]):
         record_cache_hit_type: Callable[[int], None],
         timeout: int,
         timer: Optional[Timer] = None,
+        abandoned: Optional[threading.Event] = None,
+        cancel: Optional[Callable[[], None]] = None,
+    ) -> TValue:
+        if not get_config("coalesce_readthrough", 1):
+            return self.__get_readthrough(
+                key,
+                function,
+                record_cache_hit_type,
+                timeout,
+                timer,
+                abandoned,
+                cancel,
+                lambda: False,
+            )
+
+        # Concurrent calls for the same key in this process share the result
+        # of the first one, and only that one takes part in the Redis
+        # protocol, so they do not each run the scripts and block a thread
+        # on Redis. They get the exception of the first call if it fails.
+        # The result is mutated by the callers, so it is shared encoded.
+        with self.__in_flight_lock:
+            in_flight = self.__in_flight.get(key)
+            if in_flight is None:
+                in_flight = self.__in_flight[key] = _InFlight()
+                leader = True
+            else:
+                in_flight.followers += 1
+                leader = False
+
+        if not leader:
+            # This is the same as waiting on the Redis wait queue.
+            record_cache_hit_type(RESULT_WAIT)
+            try:
+                encoded = in_flight.future.result(timeout)
+            except concurrent.futures.TimeoutError as error:
+                raise TimeoutError("timed out waiting for result") from error
+            finally:
+                with self.__in_flight_lock:
+                    in_flight.followers -= 1
+                if timer is not None:
+                    timer.mark("dedupe_wait")
+            return self.__codec.decode(encoded)
+
+        try:
+            value = self.__get_readthrough(
+                key,
+                function,
+                record_cache_hit_type,
+                timeout,
+                timer,
+                abandoned,
+                cancel,
+                in_flight.has_followers,
+            )
+        except Exception as error:
+            in_flight.future.set_exception(error)
+            raise
+        finally:
+            # No caller can join once the call is removed, so the value is
+            # only encoded for the ones that already did.
+            with self.__in_flight_lock:
+                del self.__in_flight[key]
+                has_followers = in_flight.has_followers()
+
+        if has_followers:
+            try:
+                in_flight.future.set_result(self.__codec.encode(value))
+            except Exception as error:
+                in_flight.future.set_exception(error)
+        return value
+
+    def __get_readthrough(
+        self,
+        key: str,
+        function: Callable[[], TValue],
+        record_cache_hit_type: Callable[[int], None],
+        timeout: int,
+        timer: Optional[Timer],
+        abandoned: Optional[threading.Event],
+        cancel: Optional[Callable[[], None]],
+        has_followers: Callable[[], bool],
     ) -> TValue:
         # This method is designed with the following goals in mind:
         # 1. The value generation function is only executed when no value
@@ -155,12 +287,23 @@ class RedisCache(Cache[TValue]):
             argv = [task_ident, 60]
             try:
                 # The task is run in a thread pool so that we can return
-                # control to the caller once the timeout is reached.
-                value = self.__executor.submit(function).result(task_timeout)
+                # control to the caller once the timeout is reached, or once
+                # the caller goes away.
+                future = self.__executor.submit(function)
+                value = self.__wait_for_task(
+                    future, task_timeout, wait_queue_key, abandoned, has_followers
+                )
                 argv.extend(
                     [self.__codec.encode(value), get_config("cache_expiry_sec", 1)]
                 )
-            except concurrent.futures.TimeoutError as error:
+            except (concurrent.futures.TimeoutError, ExecutionAbandonedError) as error:
+                # Nobody is waiting for the value anymore (the other clients
+                # stop waiting at the same deadline) so the work is wasted.
+                future.cancel()
+                if cancel is not None:
+                    cancel()
+                if isinstance(error, ExecutionAbandonedError):
+                    raise
                 raise TimeoutError("timed out waiting for value") from error
             finally:
                 # Regardless of whether the function succeeded or failed, we
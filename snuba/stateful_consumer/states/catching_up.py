@@ -16,8 +16,9 @@ class CatchingUpState(State[ConsumerStateCompletionEvent, Optional[ConsumerState
     In this state the consumer consumes the main topic but
     it discards the transacitons that were present in the
     snapshot (xid < xmax and not in xip_list).
-    Once this phase is done the consumer goes back to normal
-    consumption.
+    Once this phase is done the same consumer keeps running, with
+    the same processes, until it is shut down: there is nothing left
+    to discard since all the transactions are past xmax.
     """
 
     def __init__(self, consumer_builder: ConsumerBuilder) -> None:
@@ -144,10 +144,8 @@ class LegacySubscriptionData(SubscriptionData):
         :param timestamp: Date that the query should run up until
         :param offset: Maximum offset we should query for
         """
-        schema = RequestSchema.build_with_extensions(
-            dataset.get_default_entity().get_extensions(),
-            SubscriptionRequestSettings,
-            Language.LEGACY,
+        schema = RequestSchema.build(
+            dataset.get_default_entity(), SubscriptionRequestSettings, Language.LEGACY,
         )
         extra_conditions: Sequence[Condition] = []
         if offset is not None:
@@ -273,9 +271,7 @@ class SnQLSubscriptionData(SubscriptionData):
         timer: Timer,
         metrics: Optional[MetricsBackend] = None,
     ) -> Request:
-        schema = RequestSchema.build_with_extensions(
-            {}, SubscriptionRequestSettings, Language.SNQL,
-        )
+        schema = RequestSchema.build(None, SubscriptionRequestSettings, Language.SNQL,)
 
         request = build_request(
             {"query": self.query},
@@ -139,7 +139,7 @@ class SubscriptionWorker(
                 request_copy = Request(
                     id=request.id,
                     body=copy.deepcopy(request.body),
-                    query=copy.deepcopy(request.query),
+                    query=request.query.clone(),
                     settings=SubscriptionRequestSettings(consistent=True),
                     referrer=request.referrer,
                 )
@@ -158,7 +158,7 @@ class SubscriptionWorker(
                 request_copy = Request(
                     id=request.id,
                     body=copy.deepcopy(request.body),
-                    query=copy.deepcopy(request.query),
+                    query=request.query.clone(),
                     settings=SubscriptionRequestSettings(consistent=False),
                     referrer=request.referrer,
                 )
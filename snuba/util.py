@@ -1,3 +1,4 @@
+import atexit
 import inspect
 import logging
 import numbers
@@ -241,7 +242,7 @@ def create_metrics(
 
     from snuba.utils.metrics.backends.datadog import DatadogMetricsBackend
 
-    return DatadogMetricsBackend(
+    backend: MetricsBackend = DatadogMetricsBackend(
         partial(
             DogStatsd,
             host=host,
@@ -254,6 +255,17 @@ def create_metrics(
         sample_rates,
     )
 
+    if settings.DOGSTATSD_AGGREGATION_INTERVAL_SEC is not None:
+        from snuba.utils.metrics.aggregating import AggregatingMetricsBackend
+
+        aggregating_backend = AggregatingMetricsBackend(
+            backend, settings.DOGSTATSD_AGGREGATION_INTERVAL_SEC
+        )
+        atexit.register(aggregating_backend.close)
+        backend = aggregating_backend
+
+    return backend
+
 
 def with_span(op: str = "function") -> Callable[[F], F]:
     """ Wraps a function call in a Sentry AM span
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+from threading import Event, Lock, Thread
+from typing import Dict, Iterator, MutableMapping, Optional, Tuple, Union
+
+from snuba.utils.metrics.backends.abstract import MetricsBackend
+from snuba.utils.metrics.types import Tags
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """
+    Counts values in logarithmic buckets: every value is approximated
+    with a relative error that is at most the precision provided.
+    Histograms built with the same precision can be merged without any
+    additional loss, like on different threads or flush intervals.
+    """
+
+    def __init__(self, precision: float = 0.01) -> None:
+        self.__precision = precision
+        self.__log_base = math.log1p(2 * precision)
+        # Values that are not positive are counted in the None bucket.
+        self.__buckets: Dict[Optional[int], int] = {}
+
+    def __len__(self) -> int:
+        return sum(self.__buckets.values())
+
+    def record(self, value: Union[int, float], count: int = 1) -> None:
+        index = math.floor(math.log(value) / self.__log_base) if value > 0 else None
+        self.__buckets[index] = self.__buckets.get(index, 0) + count
+
+    def merge(self, other: Histogram) -> None:
+        assert (
+            other.__precision == self.__precision
+        ), "Cannot merge histograms with different precisions"
+        for index, count in other.__buckets.items():
+            self.__buckets[index] = self.__buckets.get(index, 0) + count
+
+    def __iter__(self) -> Iterator[Tuple[float, int]]:
+        """
+        Returns the value representing each bucket, which is the center
+        of the bucket, with the number of values counted in it.
+        """
+        for index, count in self.__buckets.items():
+            if index is None:
+                yield 0.0, count
+            else:
+                yield math.exp((index + 0.5) * self.__log_base), count
+
+
+class AggregatingMetricsBackend(MetricsBackend):
+    """
+    Wraps a metrics backend, aggregating in process the metrics recorded
+    and forwarding them to the backend once per flush interval: counters
+    are summed, only the last value of each gauge is kept and timings are
+    counted in histograms.
+
+    The metrics are flushed by a dedicated thread, so recording a metric
+    never waits for the backend, and an idle process still sends what it
+    recorded. The thread is started again in the child of a fork, which
+    does not inherit it. Call close when the process stops in order not
+    to lose the last interval.
+    """
+
+    def __init__(
+        self,
+        backend: MetricsBackend,
+        flush_interval_sec: float,
+        histogram_precision: float = 0.01,
+    ) -> None:
+        self.__backend = backend
+        self.__flush_interval_sec = flush_interval_sec
+        self.__histogram_precision = histogram_precision
+
+        self.__lock = Lock()
+        # Only one flush at a time forwards metrics to the backend.
+        self.__flush_lock = Lock()
+        self.__tags: MutableMapping[SeriesKey, Optional[Tags]] = {}
+        self.__counters: MutableMapping[SeriesKey, Union[int, float]] = {}
+        self.__gauges: MutableMapping[SeriesKey, Union[int, float]] = {}
+        self.__timings: MutableMapping[SeriesKey, Histogram] = {}
+
+        self.__closed = Event()
+        self.__start_flusher()
+        os.register_at_fork(after_in_child=self.__after_fork)
+
+    def __start_flusher(self) -> None:
+        Thread(target=self.__run_flusher, name="metrics-flush", daemon=True).start()
+
+    def __run_flusher(self) -> None:
+        while not self.__closed.wait(self.__flush_interval_sec):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush metrics")
+
+    def __after_fork(self) -> None:
+        # The locks could be held by a thread that does not exist in the
+        # child, and the metrics recorded so far are sent by the parent.
+        self.__lock = Lock()
+        self.__flush_lock = Lock()
+        self.__tags, self.__counters, self.__gauges, self.__timings = {}, {}, {}, {}
+        if not self.__closed.is_set():
+            self.__start_flusher()
+
+    def __get_key(self, name: str, tags: Optional[Tags]) -> SeriesKey:
+        key = (name, tuple(tags.items()) if tags is not None else ())
+        if key not in self.__tags:
+            # Keeps a copy since the caller could modify the mapping.
+            self.__tags[key] = dict(tags) if tags is not None else None
+        return key
+
+    def increment(
+        self, name: str, value: Union[int, float] = 1, tags: Optional[Tags] = None
+    ) -> None:
+        with self.__lock:
+            key = self.__get_key(name, tags)
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def gauge(
+        self, name: str, value: Union[int, float], tags: Optional[Tags] = None
+    ) -> None:
+        with self.__lock:
+            self.__gauges[self.__get_key(name, tags)] = value
+
+    def timing(
+        self, name: str, value: Union[int, float], tags: Optional[Tags] = None
+    ) -> None:
+        self.timings(name, value, 1, tags)
+
+    def timings(
+        self,
+        name: str,
+        value: Union[int, float],
+        count: int,
+        tags: Optional[Tags] = None,
+    ) -> None:
+        with self.__lock:
+            key = self.__get_key(name, tags)
+            histogram = self.__timings.get(key)
+            if histogram is None:
+                histogram = self.__timings[key] = Histogram(self.__histogram_precision)
+            histogram.record(value, count)
+
+    def flush(self) -> None:
+        """
+        Forwards to the backend everything recorded since the previous
+        flush.
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                tags, self.__tags = self.__tags, {}
+                counters, self.__counters = self.__counters, {}
+                gauges, self.__gauges = self.__gauges, {}
+                timings, self.__timings = self.__timings, {}
+
+            # The backend is called outside of the recording lock so that
+            # recording metrics never waits for the network.
+            for key, value in counters.items():
+                self.__backend.increment(key[0], value, tags[key])
+            for key, value in gauges.items():
+                self.__backend.gauge(key[0], value, tags[key])
+            for key, histogram in timings.items():
+                for value, count in histogram:
+                    self.__backend.timings(key[0], value, count, tags[key])
+
+    def close(self) -> None:
+        """
+        Stops the flush thread after a last flush.
+        """
+        self.__closed.set()
+        self.flush()
@@ -26,3 +26,18 @@ class MetricsBackend(ABC):
         self, name: str, value: Union[int, float], tags: Optional[Tags] = None
     ) -> None:
         raise NotImplementedError
+
+    def timings(
+        self,
+        name: str,
+        value: Union[int, float],
+        count: int,
+        tags: Optional[Tags] = None,
+    ) -> None:
+        """
+        Records the same timing value count times. This is how pre
+        aggregated timings are recorded, backends that can send several
+        samples at once should override it.
+        """
+        for _ in range(count):
+            self.timing(name, value, tags)
@@ -1,5 +1,7 @@
 import threading
-from typing import Callable, Optional, Mapping, Sequence, Union
+from functools import lru_cache
+from random import random
+from typing import Callable, Optional, Mapping, Sequence, Tuple, Union
 
 from datadog import DogStatsd
 
@@ -7,6 +9,13 @@ from snuba.utils.metrics.backends.abstract import MetricsBackend
 from snuba.utils.metrics.types import Tags
 
 
+@lru_cache(maxsize=1024)
+def _format_tags(tags: Tuple[Tuple[str, str], ...]) -> Sequence[str]:
+    # The same few tag sets are used over and over, so they are only
+    # formatted once. DogStatsd does not modify the list it receives.
+    return [f"{key}:{value}" for key, value in tags]
+
+
 class DatadogMetricsBackend(MetricsBackend):
     """
     A metrics backend that records metrics to Datadog.
@@ -42,7 +51,7 @@ class DatadogMetricsBackend(MetricsBackend):
         if tags is None:
             return None
         else:
-            return [f"{key}:{value}" for key, value in tags.items()]
+            return _format_tags(tuple(tags.items()))
 
     def increment(
         self, name: str, value: Union[int, float] = 1, tags: Optional[Tags] = None
@@ -73,3 +82,27 @@ class DatadogMetricsBackend(MetricsBackend):
             tags=self.__normalize_tags(tags),
             sample_rate=self.__sample_rates.get(name, 1.0),
         )
+
+    def timings(
+        self,
+        name: str,
+        value: Union[int, float],
+        count: int,
+        tags: Optional[Tags] = None,
+    ) -> None:
+        sample_rate = self.__sample_rates.get(name, 1.0)
+        if count <= 0 or (sample_rate != 1 and random() > sample_rate):
+            return
+        client = self.__client
+        # DogStatsd sends one line per value. The line is written here
+        # instead, with a sample rate divided by count, so the agent counts
+        # the value count times out of a single line.
+        line_tags = [*(self.__normalize_tags(tags) or []), *client.constant_tags]
+        rate = sample_rate / count
+        prefix = f"{client.namespace}." if client.namespace else ""
+        line = f"{prefix}{name}:{value}|ms"
+        if rate != 1:
+            line += f"|@{rate}"
+        if line_tags:
+            line += f"|#{','.join(line_tags)}"
+        client._send(line)
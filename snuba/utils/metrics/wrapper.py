@@ -46,3 +46,14 @@ class MetricsWrapper(MetricsBackend):
         self, name: str, value: Union[int, float], tags: Optional[Tags] = None
     ) -> None:
         self.__backend.timing(self.__merge_name(name), value, self.__merge_tags(tags))
+
+    def timings(
+        self,
+        name: str,
+        value: Union[int, float],
+        count: int,
+        tags: Optional[Tags] = None,
+    ) -> None:
+        self.__backend.timings(
+            self.__merge_name(name), value, count, self.__merge_tags(tags)
+        )
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Iterator, Mapping, MutableMapping, Optional, Union
+
+from snuba import environment, settings
+from snuba.clickhouse.query import Query
+from snuba.clickhouse.query_inspector import TablesCollector
+from snuba.clickhouse.statistics import TableStatisticsCache, table_statistics
+from snuba.query.composite import CompositeQuery
+from snuba.query.data_source.simple import Table
+from snuba.state.rate_limit import RateLimitExceeded
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+metrics = MetricsWrapper(environment.metrics, "admission")
+
+# FINAL merges rows at read time and conditions that mix AND and OR
+# cannot be moved to PREWHERE, so both make a query read and process
+# more than the compressed size of the columns it references.
+FINAL_COST_FACTOR = 3.0
+MULTI_LEVEL_CONDITION_COST_FACTOR = 2.0
+
+
+class QueryCostExceeded(RateLimitExceeded):
+    """
+    Raised when the estimated cost of a query is over the budget of its
+    referrer and the query can be neither downsampled nor queued.
+    """
+
+
+class AdmissionAction(Enum):
+    ADMIT = "admit"
+    QUEUE = "queue"
+    SAMPLE = "sample"
+    REJECT = "reject"
+
+
+@dataclass(frozen=True)
+class QueryCost:
+    # All the tables the query reads from, the throughput is tracked
+    # per set of tables.
+    tables: str
+    # Compressed bytes the query is expected to read on each shard.
+    scan_bytes: int
+    # None until a query on the same tables has completed.
+    duration_ms: Optional[float]
+
+
+@dataclass(frozen=True)
+class AdmissionDecision:
+    action: AdmissionAction
+    cost: QueryCost
+    sampling_rate: Optional[float] = None
+
+    def to_dict(self) -> Mapping[str, Any]:
+        return {
+            "admission": self.action.value,
+            "estimated_scan_bytes": self.cost.scan_bytes,
+            "estimated_duration_ms": self.cost.duration_ms,
+        }
+
+
+class QueryCostEstimator:
+    """
+    Predicts the cost of a query before running it from the information
+    the querylog profile is built from: the compressed size of the columns
+    the query references, scaled by the fraction of the retention its time
+    range covers (the whole retention when there is none), by its sampling
+    rate and by a constant factor for FINAL and for conditions mixing AND
+    and OR.
+
+    The duration is predicted from the throughput (estimated bytes per
+    millisecond) of the queries on the same tables that completed in this
+    process, which is the ratio we would get from the querylog, smoothed
+    with an exponential moving average.
+    """
+
+    def __init__(
+        self,
+        statistics: TableStatisticsCache = table_statistics,
+        smoothing: float = 0.1,
+    ) -> None:
+        self.__statistics = statistics
+        self.__smoothing = smoothing
+        self.__lock = threading.Lock()
+        self.__throughput: MutableMapping[str, float] = {}
+
+    def estimate(
+        self, query: Union[Query, CompositeQuery[Table]]
+    ) -> Optional[QueryCost]:
+        """
+        Returns None when the statistics of some of the tables are not
+        available yet.
+        """
+        collector = TablesCollector()
+        collector.visit(query)
+
+        scan_bytes = 0.0
+        for table, columns in collector.get_all_raw_columns().items():
+            statistics = self.__statistics.get(table, [])
+            if statistics is None:
+                return None
+            scan_bytes += sum(
+                statistics[name].compressed_bytes
+                for name in {c.column_name for c in columns}
+                if name in statistics
+            )
+
+        # The statistics cover the whole retention of the tables, which is
+        # what a query without a time range we can find scans.
+        if collector.any_unbounded_time_range():
+            metrics.increment("unbounded_time_range")
+        else:
+            # Ranges shorter than a day are reported as None.
+            time_range = collector.get_max_time_range() or 1
+            scan_bytes *= min(1.0, time_range / settings.DEFAULT_RETENTION_DAYS)
+        sampling_rate = collector.get_sample_rate()
+        if sampling_rate is not None and sampling_rate < 1:
+            scan_bytes *= sampling_rate
+        if collector.any_final():
+            scan_bytes *= FINAL_COST_FACTOR
+        if collector.has_complex_condition():
+            scan_bytes *= MULTI_LEVEL_CONDITION_COST_FACTOR
+
+        tables = ",".join(sorted(collector.get_tables()))
+        with self.__lock:
+            throughput = self.__throughput.get(tables)
+
+        return QueryCost(
+            tables, int(scan_bytes), scan_bytes / throughput if throughput else None,
+        )
+
+    def record(self, cost: QueryCost, duration_ms: float) -> None:
+        """
+        Updates the throughput of the tables with the duration of a query
+        that has been run on ClickHouse.
+        """
+        if cost.scan_bytes <= 0:
+            return
+        throughput = cost.scan_bytes / max(duration_ms, 1.0)
+        with self.__lock:
+            previous = self.__throughput.get(cost.tables)
+            self.__throughput[cost.tables] = (
+                throughput
+                if previous is None
+                else previous + self.__smoothing * (throughput - previous)
+            )
+
+
+def _get_referrer_config(
+    configs: Mapping[str, Any],
+    name: str,
+    referrer: str,
+    default: Any,
+    fingerprint: Optional[str] = None,
+) -> Any:
+    if fingerprint is not None:
+        value = configs.get(f"{name}/fingerprint/{fingerprint}")
+        if value is not None:
+            return value
+    value = configs.get(f"{name}/{referrer}")
+    return value if value is not None else configs.get(name, default)
+
+
+def _has_sampling_key(table_name: str) -> bool:
+    """
+    Tells whether the table a query reads from can be sampled, which is
+    only the case when the table has a SAMPLE BY expression.
+    """
+    # Storages depend on the query processors, which depend on this module
+    # through the statistics, so the factory cannot be imported at module
+    # level.
+    from snuba.datasets.schemas.tables import TableSchema
+    from snuba.datasets.storages.factory import STORAGES
+
+    for storage in STORAGES.values():
+        schema = storage.get_schema()
+        if not isinstance(schema, TableSchema):
+            continue
+        if table_name in (schema.get_table_name(), schema.get_local_table_name()):
+            return schema.get_sampling_key() is not None
+    return False
+
+
+class AdmissionController:
+    """
+    Decides, before a query is sent to ClickHouse, what to do with it
+    based on its estimated cost and the budget of its referrer.
+
+    The budgets are runtime configs, which can be overridden per referrer
+    by appending `/<referrer>` to the key, or per query fingerprint (see
+    snuba.web.fingerprints) by appending `/fingerprint/<fingerprint>`,
+    which takes precedence over the referrer:
+    - admission_max_scan_bytes: compressed bytes read on each shard.
+    - admission_max_duration_ms: predicted duration.
+    - admission_action: what happens to a query over budget. `reject`
+      (default) fails it as rate limited, `sample` runs it with a SAMPLE
+      clause that brings it within the budget (tables without a sampling
+      key cannot be sampled, those queries are rejected) and `queue` lets
+      it run only when one of the ADMISSION_QUEUE_SLOTS slots of this
+      process is free.
+    Nothing is estimated unless `admission_control_enabled` is set.
+    """
+
+    def __init__(
+        self,
+        estimator: QueryCostEstimator,
+        queue_slots: int = settings.ADMISSION_QUEUE_SLOTS,
+    ) -> None:
+        self.__estimator = estimator
+        self.__queue = threading.BoundedSemaphore(queue_slots)
+
+    def decide(
+        self,
+        query: Union[Query, CompositeQuery[Table]],
+        referrer: str,
+        configs: Mapping[str, Any],
+        fingerprint: Optional[str] = None,
+    ) -> Optional[AdmissionDecision]:
+        if not configs.get("admission_control_enabled", 0):
+            return None
+
+        cost = self.__estimator.estimate(query)
+        if cost is None:
+            return None
+
+        max_scan_bytes = _get_referrer_config(
+            configs, "admission_max_scan_bytes", referrer, None, fingerprint
+        )
+        max_duration_ms = _get_referrer_config(
+            configs, "admission_max_duration_ms", referrer, None, fingerprint
+        )
+        # How many times the query is over the budget.
+        ratio = 0.0
+        if max_scan_bytes:
+            ratio = max(ratio, cost.scan_bytes / max_scan_bytes)
+        if max_duration_ms and cost.duration_ms is not None:
+            ratio = max(ratio, cost.duration_ms / max_duration_ms)
+
+        decision = AdmissionDecision(AdmissionAction.ADMIT, cost)
+        if ratio > 1:
+            action = AdmissionAction(
+                _get_referrer_config(
+                    configs, "admission_action", referrer, "reject", fingerprint
+                )
+            )
+            decision = self.__over_budget(query, cost, action, ratio)
+
+        metrics.increment(
+            "decision", tags={"action": decision.action.value, "referrer": referrer},
+        )
+        return decision
+
+    def __over_budget(
+        self,
+        query: Union[Query, CompositeQuery[Table]],
+        cost: QueryCost,
+        action: AdmissionAction,
+        ratio: float,
+    ) -> AdmissionDecision:
+        if action != AdmissionAction.SAMPLE:
+            return AdmissionDecision(action, cost)
+
+        # Only queries on a single table with a sampling key can be sampled,
+        # the others are rejected like the ones that would need a too low
+        # sampling rate.
+        if not isinstance(query, Query) or not _has_sampling_key(
+            query.get_from_clause().table_name
+        ):
+            return AdmissionDecision(AdmissionAction.REJECT, cost)
+        sampling_rate = round((query.get_from_clause().sampling_rate or 1.0) / ratio, 4)
+        if sampling_rate < settings.ADMISSION_MIN_SAMPLING_RATE:
+            return AdmissionDecision(AdmissionAction.REJECT, cost)
+        return AdmissionDecision(AdmissionAction.SAMPLE, cost, sampling_rate)
+
+    @contextmanager
+    def admit(
+        self,
+        decision: Optional[AdmissionDecision],
+        stats: Mapping[str, Any],
+        configs: Mapping[str, Any],
+    ) -> Iterator[None]:
+        """
+        Runs the query in the context, after waiting for a queue slot if
+        the query was queued (up to `admission_queue_timeout_ms`), and
+        records its duration unless the result came from the cache.
+        """
+        if decision is None:
+            yield
+            return
+
+        if decision.action == AdmissionAction.REJECT:
+            raise QueryCostExceeded(
+                f"estimated query cost {decision.cost.scan_bytes} bytes "
+                "is over the referrer budget"
+            )
+
+        queued = decision.action == AdmissionAction.QUEUE
+        if queued:
+            start = time.time()
+            timeout_ms = configs.get("admission_queue_timeout_ms", 5000)
+            if not self.__queue.acquire(timeout=timeout_ms / 1000):
+                raise QueryCostExceeded(
+                    "timed out waiting for a slot to run an expensive query"
+                )
+            metrics.timing("queue_wait", (time.time() - start) * 1000)
+
+        try:
+            start = time.time()
+            yield
+            if not stats.get("cache_hit") and not stats.get("is_duplicate"):
+                self.__estimator.record(decision.cost, (time.time() - start) * 1000)
+        finally:
+            if queued:
+                self.__queue.release()
+
+
+admission_controller = AdmissionController(QueryCostEstimator())
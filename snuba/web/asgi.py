@@ -0,0 +1,14 @@
+from snuba.environment import setup_logging, setup_sentry
+
+setup_logging()
+setup_sentry()
+
+from snuba import settings  # noqa
+from snuba.web.async_views import QueryApplication  # noqa
+from snuba.web.boot import prewarm_registries  # noqa
+
+if settings.PREWARM_REGISTRIES:
+    prewarm_registries()
+
+# Served by any ASGI server, e.g. `uvicorn snuba.web.asgi:application`.
+application = QueryApplication(settings.ASGI_QUERY_WORKERS)
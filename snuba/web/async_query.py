@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional
+
+import simplejson as json
+
+from snuba import environment, settings
+from snuba.redis import RedisClientType, redis_client
+from snuba.state.rate_limit import RateLimitExceeded
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+logger = logging.getLogger(__name__)
+
+metrics = MetricsWrapper(environment.metrics, "api.async_query")
+
+PENDING = "pending"
+
+
+class QueryResponse(NamedTuple):
+    status: int
+    body: str
+
+
+class TooManyAsyncQueries(RateLimitExceeded):
+    """
+    Raised when an async query is submitted to a process that is already
+    running or holding as many async queries as it is allowed to.
+    """
+
+
+def parse_async_flag(value: Optional[str]) -> bool:
+    """
+    A query is submitted in the background only when the `async` parameter
+    is `1` or `true`, any other value runs it synchronously.
+    """
+    return value is not None and value.lower() in ("1", "true")
+
+
+def parse_wait(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the `wait` parameter of a result request, in seconds, capped to
+    ASYNC_QUERY_MAX_WAIT_SEC. Returns None when it is not a non negative
+    number.
+    """
+    if value is None:
+        return 0.0
+    try:
+        wait = float(value)
+    except ValueError:
+        return None
+    if not math.isfinite(wait) or wait < 0:
+        return None
+    return min(wait, settings.ASYNC_QUERY_MAX_WAIT_SEC)
+
+
+class AsyncQueryExecutor:
+    """
+    Runs queries in the background of an API process, so that the HTTP
+    request that submits a query returns a handle right away instead of
+    holding a worker thread until the query completes.
+
+    The response of each query is stored in Redis under its handle for
+    `ttl` seconds, where any API process can read it, so clients can poll
+    (or long poll) a different process than the one running the query.
+    """
+
+    def __init__(
+        self,
+        client: RedisClientType,
+        max_workers: int,
+        max_pending: int,
+        ttl: int,
+        poll_interval: float = 0.1,
+    ) -> None:
+        self.__client = client
+        self.__ttl = ttl
+        self.__poll_interval = poll_interval
+        self.__pending = threading.BoundedSemaphore(max_pending)
+        self.__executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="async-query"
+        )
+
+    def get_poll_interval(self) -> float:
+        return self.__poll_interval
+
+    def __get_key(self, query_id: str) -> str:
+        return f"snuba-async-query:{query_id}"
+
+    def submit(self, query_id: str, run: Callable[[], QueryResponse]) -> None:
+        if not self.__pending.acquire(blocking=False):
+            metrics.increment("rejected")
+            raise TooManyAsyncQueries("too many async queries are pending")
+
+        try:
+            self.__client.set(self.__get_key(query_id), PENDING, ex=self.__ttl)
+            self.__executor.submit(self.__run, query_id, run)
+        except Exception:
+            self.__pending.release()
+            raise
+        metrics.increment("submitted")
+
+    def __run(self, query_id: str, run: Callable[[], QueryResponse]) -> None:
+        try:
+            try:
+                response = run()
+            except Exception as error:
+                logger.exception("Error running async query %s", query_id)
+                response = QueryResponse(
+                    500,
+                    json.dumps(
+                        {
+                            "error": {
+                                "type": "internal_server_error",
+                                "message": str(error),
+                            }
+                        }
+                    ),
+                )
+            self.__client.set(
+                self.__get_key(query_id),
+                f"{response.status}\n{response.body}",
+                ex=self.__ttl,
+            )
+        except Exception:
+            logger.exception("Failed to store the result of async query %s", query_id)
+        finally:
+            self.__pending.release()
+
+    def peek(self, query_id: str) -> Optional[QueryResponse]:
+        """
+        Returns the response of the query, which has status 202 if the
+        query is still pending, or None if the handle is unknown or its
+        response has expired.
+        """
+        value = self.__client.get(self.__get_key(query_id))
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        if value == PENDING:
+            return QueryResponse(
+                202, json.dumps({"query_id": query_id, "status": PENDING})
+            )
+        status, body = value.split("\n", 1)
+        return QueryResponse(int(status), body)
+
+    def get(self, query_id: str, timeout: float = 0) -> Optional[QueryResponse]:
+        """
+        Like peek, but waits up to the timeout for a pending query to
+        complete.
+        """
+        deadline = time.time() + timeout
+        while True:
+            response = self.peek(query_id)
+            if (
+                response is None
+                or response.status != 202
+                or time.time() + self.__poll_interval > deadline
+            ):
+                return response
+            time.sleep(self.__poll_interval)
+
+
+async_queries = AsyncQueryExecutor(
+    redis_client,
+    settings.ASYNC_QUERY_WORKERS,
+    settings.ASYNC_QUERY_MAX_PENDING,
+    settings.ASYNC_QUERY_RESULT_TTL,
+)
@@ -0,0 +1,234 @@
+"""
+ASGI version of the query API, see snuba.web.asgi for the entry point.
+
+It serves the query endpoints with the same parsing and execution code as
+the WSGI application, but an HTTP request only holds a coroutine while it
+waits: the Redis and ClickHouse clients we use are synchronous, so the
+parsing and the execution of queries run on a bounded thread pool, while
+reading request bodies, waiting for a thread and long polling the results
+of async queries happen on the event loop.
+
+Only async queries (submitted with `async=1` and long polled through
+`/queries/<query_id>`) let a process hold many more slow requests than it
+has threads: a synchronous query holds one of the ASGI_QUERY_WORKERS
+threads until it completes, like it holds a worker of the WSGI application.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Mapping, MutableMapping, Optional
+from urllib.parse import parse_qs
+
+import simplejson as json
+from flask import Response
+
+from snuba.datasets.factory import InvalidDatasetError, get_dataset
+from snuba.query.exceptions import InvalidQueryException
+from snuba.request import Language
+from snuba.request.exceptions import InvalidJsonRequestException, JsonDecodeException
+from snuba.utils.metrics.timer import Timer
+from snuba.web.async_query import (
+    QueryResponse,
+    TooManyAsyncQueries,
+    async_queries,
+    parse_async_flag,
+    parse_wait,
+)
+from snuba.web.cancellation import run_abandonable
+from snuba.web.views import (
+    build_dataset_request,
+    check_health,
+    handle_invalid_dataset,
+    handle_invalid_json,
+    handle_invalid_query,
+    run_query,
+)
+
+Scope = Mapping[str, Any]
+Message = Mapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+QUERY_PATH = re.compile(r"^/(?P<dataset>[^/]+)/(?P<endpoint>snql|query)$")
+ASYNC_RESULT_PATH = re.compile(r"^/queries/(?P<query_id>[^/]+)$")
+
+LANGUAGES = {"snql": Language.SNQL, "query": Language.LEGACY}
+
+
+def _error(status: int, error_type: str, message: str) -> QueryResponse:
+    return QueryResponse(
+        status, json.dumps({"error": {"type": error_type, "message": message}})
+    )
+
+
+def _from_flask(response: Response) -> QueryResponse:
+    return QueryResponse(response.status_code, response.get_data(as_text=True))
+
+
+def execute_query_request(
+    dataset_name: str, language: Language, referrer: str, body: bytes, is_async: bool,
+) -> QueryResponse:
+    """
+    Parses, validates and runs (or submits, if async) a query request,
+    rendering errors like the WSGI application does.
+    """
+    timer = Timer("query")
+    try:
+        try:
+            parsed = json.loads(body)
+            assert isinstance(parsed, MutableMapping)
+        except json.JSONDecodeError as error:
+            raise JsonDecodeException(str(error)) from error
+
+        dataset = get_dataset(dataset_name)
+        request = build_dataset_request(dataset, parsed, timer, language, referrer)
+    except InvalidJsonRequestException as error:
+        return _from_flask(handle_invalid_json(error))
+    except InvalidDatasetError as error:
+        return _from_flask(handle_invalid_dataset(error))
+    except InvalidQueryException as error:
+        return _from_flask(handle_invalid_query(error))
+
+    if not is_async:
+        return run_query(dataset, request, timer)
+
+    try:
+        async_queries.submit(request.id, partial(run_query, dataset, request, timer))
+    except TooManyAsyncQueries as error:
+        return _error(429, "rate-limited", str(error))
+    return QueryResponse(202, json.dumps({"query_id": request.id, "status": "pending"}))
+
+
+class QueryApplication:
+    """
+    ASGI application serving the query endpoints (`/<dataset>/snql`,
+    `/<dataset>/query`, `/queries/<query_id>`) and the health check.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.__executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="asgi-query"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.__lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        response = await self.__route(scope, receive)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": response.body.encode()})
+
+    async def __lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.__executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __run(
+        self, function: Callable[[], QueryResponse], abandoned: threading.Event
+    ) -> QueryResponse:
+        return await asyncio.get_event_loop().run_in_executor(
+            self.__executor, run_abandonable, abandoned, function
+        )
+
+    async def __route(self, scope: Scope, receive: Receive) -> QueryResponse:
+        path = scope["path"]
+        method = scope["method"]
+        args = {
+            key: values[0]
+            for key, values in parse_qs(
+                scope.get("query_string", b"").decode("latin-1")
+            ).items()
+        }
+
+        if path == "/health" and method == "GET":
+            return await asyncio.get_event_loop().run_in_executor(
+                self.__executor, check_health, bool(args.get("thorough"))
+            )
+
+        match = QUERY_PATH.match(path)
+        if match is not None and method == "POST":
+            body = await self.__read_body(receive)
+            headers = dict(scope.get("headers", []))
+            referrer = headers.get(b"referer", b"<unknown>").decode("latin-1")
+            # The query is cancelled if the client disconnects before we
+            # respond and nobody else waits for its result.
+            abandoned = threading.Event()
+            watcher = asyncio.ensure_future(self.__watch_disconnect(receive, abandoned))
+            try:
+                return await self.__run(
+                    partial(
+                        execute_query_request,
+                        match.group("dataset"),
+                        LANGUAGES[match.group("endpoint")],
+                        referrer,
+                        body,
+                        parse_async_flag(args.get("async")),
+                    ),
+                    abandoned,
+                )
+            finally:
+                watcher.cancel()
+
+        match = ASYNC_RESULT_PATH.match(path)
+        if match is not None and method == "GET":
+            wait = parse_wait(args.get("wait"))
+            if wait is None:
+                return _error(400, "request", "wait must be a number of seconds")
+            response = await self.__poll(match.group("query_id"), wait)
+            if response is not None:
+                return response
+            return _error(404, "not-found", "unknown or expired query")
+
+        return _error(404, "not-found", f"{method} {path} not found")
+
+    async def __read_body(self, receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def __watch_disconnect(
+        self, receive: Receive, abandoned: threading.Event
+    ) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                abandoned.set()
+                return
+
+    async def __poll(self, query_id: str, timeout: float) -> Optional[QueryResponse]:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        poll_interval = async_queries.get_poll_interval()
+        while True:
+            response = await loop.run_in_executor(
+                self.__executor, async_queries.peek, query_id
+            )
+            if (
+                response is None
+                or response.status != 202
+                or loop.time() + poll_interval > deadline
+            ):
+                return response
+            # Waiting for the query does not take a thread.
+            await asyncio.sleep(poll_interval)
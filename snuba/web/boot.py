@@ -0,0 +1,66 @@
+import gc
+import logging
+import threading
+import time
+from typing import Union
+
+from snuba import environment
+from snuba.datasets.factory import get_dataset, get_enabled_dataset_names
+from snuba.datasets.storages.factory import STORAGES
+from snuba.request import Language
+from snuba.request.request_settings import HTTPRequestSettings
+from snuba.request.schema import RequestSchema
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+logger = logging.getLogger(__name__)
+
+metrics = MetricsWrapper(environment.metrics, "api.boot")
+
+# Set in the process that built the registries. The workers forked from
+# it inherit the flag, while with lazy apps or an ASGI server each worker
+# imports the entry point, so builds the registries and sets it itself.
+_prewarmed = threading.Event()
+
+
+def get_registries_status() -> Union[str, bool]:
+    """
+    Reported by the health check: "prewarmed" once this process built the
+    registries, False otherwise (they are then built by the first queries).
+    """
+    return "prewarmed" if _prewarmed.is_set() else False
+
+
+def prewarm_registries() -> None:
+    """
+    Builds everything the first query on a dataset would otherwise build:
+    the enabled datasets with their entities (and the query processors,
+    translators and matchers those hold), all the storages, the request
+    schemas and the SnQL grammar.
+
+    This is meant to run in the master process before the workers are
+    forked, so they all share these objects instead of each building its
+    own. The objects are then moved to the permanent generation of the
+    garbage collector, so that collections in the workers do not touch
+    (and copy) the pages that hold them.
+    """
+    start = time.time()
+
+    # The SnQL grammar is built when its module is imported.
+    import snuba.query.snql.parser  # noqa
+
+    for name in get_enabled_dataset_names():
+        dataset = get_dataset(name)
+        for entity in dataset.get_all_entities():
+            entity.get_all_storages()
+            for language in Language:
+                RequestSchema.build(entity, HTTPRequestSettings, language)
+
+    for storage in STORAGES.values():
+        storage.get_schema()
+
+    gc.collect()
+    gc.freeze()
+
+    _prewarmed.set()
+    metrics.timing("prewarm", (time.time() - start) * 1000)
+    logger.info("Registries built in %0.2fs", time.time() - start)
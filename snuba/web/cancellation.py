@@ -0,0 +1,34 @@
+"""
+Lets the HTTP layer tell the code running a query, on another thread, that
+the client of the request went away, so that the query can be cancelled if
+nobody else is waiting for its result.
+"""
+import threading
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_abandoned: ContextVar[Optional[threading.Event]] = ContextVar(
+    "abandoned", default=None
+)
+
+
+def run_abandonable(abandoned: threading.Event, function: Callable[[], T]) -> T:
+    """
+    Runs the function with an event that is set once its result is no
+    longer wanted.
+    """
+    token = _abandoned.set(abandoned)
+    try:
+        return function()
+    finally:
+        _abandoned.reset(token)
+
+
+def get_abandoned() -> Optional[threading.Event]:
+    """
+    Returns the event that is set when the result of the request being run
+    is no longer wanted, if the HTTP layer can tell.
+    """
+    return _abandoned.get()
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import logging
+import time
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from functools import partial, reduce
 from hashlib import md5
 from typing import Any, Mapping, MutableMapping, Optional, Set, Union, cast
@@ -15,7 +17,8 @@ from sentry_sdk.api import configure_scope
 from snuba import environment, settings, state
 from snuba.clickhouse.errors import ClickhouseError
 from snuba.clickhouse.formatter.nodes import FormattedQuery
-from snuba.clickhouse.formatter.query import format_query_anonymized
+from snuba.clickhouse.formatter.query import format_query, format_query_anonymized
+from snuba.clickhouse.hedged_reader import HedgedReader
 from snuba.clickhouse.query import Query
 from snuba.clickhouse.query_profiler import generate_profile
 from snuba.query import ProcessableQuery
@@ -23,6 +26,7 @@ from snuba.query.composite import CompositeQuery
 from snuba.query.data_source.join import IndividualNode, JoinClause, JoinVisitor
 from snuba.query.data_source.simple import Table
 from snuba.query.data_source.visitor import DataSourceVisitor
+from snuba.querylog.query_log_collector import query_log_collector
 from snuba.querylog.query_metadata import (
     ClickhouseQueryMetadata,
     QueryStatus,
@@ -31,7 +35,11 @@ from snuba.querylog.query_metadata import (
 from snuba.reader import Reader, Result
 from snuba.redis import redis_client
 from snuba.request.request_settings import RequestSettings
-from snuba.state.cache.abstract import Cache, ExecutionTimeoutError
+from snuba.state.cache.abstract import (
+    Cache,
+    ExecutionAbandonedError,
+    ExecutionTimeoutError,
+)
 from snuba.state.cache.redis.backend import RESULT_VALUE, RESULT_WAIT, RedisCache
 from snuba.state.rate_limit import (
     GLOBAL_RATE_LIMIT_NAME,
@@ -44,6 +52,9 @@ from snuba.utils.codecs import Codec
 from snuba.utils.metrics.timer import Timer
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.web import QueryException, QueryResult
+from snuba.web.admission import AdmissionAction, AdmissionDecision, admission_controller
+from snuba.web.cancellation import get_abandoned
+from snuba.web.fingerprints import fingerprint_stats, get_fingerprint
 
 metrics = MetricsWrapper(environment.metrics, "db_query")
 
@@ -153,6 +164,7 @@ class ReferencedColumnsCounter(
 def update_query_metadata_and_stats(
     query: Query,
     sql: str,
+    sql_anonymized: str,
     timer: Timer,
     stats: MutableMapping[str, Any],
     query_metadata: SnubaQueryMetadata,
@@ -166,7 +178,6 @@ def update_query_metadata_and_stats(
     Also updates stats with any relevant information and returns the updated dict.
     """
     stats.update(query_settings)
-    sql_anonymized = format_query_anonymized(query).get_sql()
 
     query_metadata.query_list.append(
         ClickhouseQueryMetadata(
@@ -218,12 +229,26 @@ def execute_query(
         query_settings["load_balancing"] = "in_order"
         query_settings["max_threads"] = 1
 
-    result = reader.execute(
-        formatted_query,
-        query_settings,
-        with_totals=clickhouse_query.has_totals(),
-        robust=robust,
-    )
+    referrer = stats.get("referrer")
+    if (
+        isinstance(reader, HedgedReader)
+        and referrer is not None
+        and state.get_config(f"hedged_reads/{referrer}", 0)
+    ):
+        result = reader.execute_hedged(
+            formatted_query,
+            referrer,
+            query_settings,
+            with_totals=clickhouse_query.has_totals(),
+            robust=robust,
+        )
+    else:
+        result = reader.execute(
+            formatted_query,
+            query_settings,
+            with_totals=clickhouse_query.has_totals(),
+            robust=robust,
+        )
 
     timer.mark("execute")
     stats.update(
@@ -243,10 +268,16 @@ def execute_query_with_rate_limits(
     stats: MutableMapping[str, Any],
     query_settings: MutableMapping[str, Any],
     robust: bool,
+    admission: Optional[AdmissionDecision] = None,
 ) -> Result:
+    # Only the queries that run on ClickHouse go through admission, the
+    # ones served from the cache or by waiting on the same query do not,
+    # and a queued query does not hold a rate limit slot while it waits.
     # XXX: We should consider moving this that it applies to the logical query,
     # not the physical query.
-    with RateLimitAggregator(
+    with admission_controller.admit(
+        admission, stats, state.get_all_configs()
+    ), RateLimitAggregator(
         request_settings.get_rate_limit_params()
     ) as rate_limit_stats_container:
         stats.update(rate_limit_stats_container.to_dict())
@@ -302,6 +333,7 @@ def execute_query_with_caching(
     stats: MutableMapping[str, Any],
     query_settings: MutableMapping[str, Any],
     robust: bool,
+    admission: Optional[AdmissionDecision] = None,
 ) -> Result:
     # XXX: ``uncompressed_cache_max_cols`` is used to control both the result
     # cache, as well as the uncompressed cache. These should be independent.
@@ -325,6 +357,7 @@ def execute_query_with_caching(
         stats,
         query_settings,
         robust=robust,
+        admission=admission,
     )
 
     with sentry_sdk.start_span(description="execute", op="db") as span:
@@ -356,6 +389,7 @@ def execute_query_with_readthrough_caching(
     stats: MutableMapping[str, Any],
     query_settings: MutableMapping[str, Any],
     robust: bool,
+    admission: Optional[AdmissionDecision] = None,
 ) -> Result:
     query_id = get_query_cache_key(formatted_query)
     query_settings["query_id"] = query_id
@@ -377,6 +411,20 @@ def execute_query_with_readthrough_caching(
         if span:
             span.set_data("cache_status", span_tag)
 
+    def cancel() -> None:
+        try:
+            reader.cancel(query_id)
+        except Exception:
+            logger.warning("Failed to cancel query %s", query_id, exc_info=True)
+        else:
+            metrics.increment(
+                "cancelled_query", tags={"table": stats.get("clickhouse_table", "")}
+            )
+
+    # Queries that nobody waits for anymore are killed, when the client went
+    # away or when the execution deadline expired.
+    cancel_abandoned = state.get_config("cancel_abandoned_queries", 1)
+
     return cache.get_readthrough(
         query_id,
         partial(
@@ -389,10 +437,13 @@ def execute_query_with_readthrough_caching(
             stats,
             query_settings,
             robust,
+            admission,
         ),
         record_cache_hit_type=record_cache_hit_type,
         timeout=query_settings.get("max_execution_time", 30),
         timer=timer,
+        abandoned=get_abandoned() if cancel_abandoned else None,
+        cancel=cancel if cancel_abandoned else None,
     )
 
 
@@ -426,12 +477,39 @@ def raw_query(
 
     timer.mark("get_configs")
 
+    # Both are computed before admission, so a query keeps the same
+    # fingerprint and anonymized SQL whether or not it is sampled.
+    sql_anonymized = format_query_anonymized(clickhouse_query).get_sql()
+    fingerprint = get_fingerprint(sql_anonymized)
+    stats["fingerprint"] = fingerprint
+
+    # The decision is taken before the cache lookup, since a sampled query
+    # has its own SQL and cache key, but it is only applied (rejecting or
+    # queueing the query) when the query has to run on ClickHouse.
+    admission = admission_controller.decide(
+        clickhouse_query, query_metadata.request.referrer, all_confs, fingerprint
+    )
+    if admission is not None:
+        stats.update(admission.to_dict())
+        if admission.action == AdmissionAction.SAMPLE:
+            assert isinstance(clickhouse_query, Query)
+            clickhouse_query.set_from_clause(
+                replace(
+                    clickhouse_query.get_from_clause(),
+                    sampling_rate=admission.sampling_rate,
+                )
+            )
+            formatted_query = format_query(clickhouse_query)
+            stats["sample"] = admission.sampling_rate
+        timer.mark("admission")
+
     sql = formatted_query.get_sql()
 
     update_with_status = partial(
         update_query_metadata_and_stats,
         clickhouse_query,
         sql,
+        sql_anonymized,
         timer,
         stats,
         query_metadata,
@@ -445,6 +523,17 @@ def raw_query(
         else execute_query_with_caching
     )
 
+    def record_fingerprint_stats(error: bool) -> None:
+        fingerprint_stats.record(
+            fingerprint,
+            sql_anonymized,
+            (time.time() - start) * 1000,
+            error=error,
+            cache_hit=bool(stats.get("cache_hit")),
+            final=bool(stats.get("final")),
+        )
+
+    start = time.time()
     try:
         result = execute_query_strategy(
             clickhouse_query,
@@ -455,6 +544,7 @@ def raw_query(
             stats,
             query_settings,
             robust=robust,
+            admission=admission,
         )
     except Exception as cause:
         if isinstance(cause, RateLimitExceeded):
@@ -477,7 +567,12 @@ def raw_query(
                     if scope.span:
                         sentry_sdk.set_tag("timeout", "cache_timeout")
 
-                logger.exception("Error running query: %s\n%s", sql, cause)
+                if isinstance(cause, ExecutionAbandonedError):
+                    # The client went away, nobody is there to get the error.
+                    logger.info("Query abandoned by the client: %s", sql)
+                else:
+                    logger.exception("Error running query: %s\n%s", sql, cause)
+            record_fingerprint_stats(error=True)
             stats = update_with_status(QueryStatus.ERROR)
         raise QueryException(
             {
@@ -487,6 +582,17 @@ def raw_query(
             }
         ) from cause
     else:
+        record_fingerprint_stats(error=False)
+        # Queries served from the cache, or by waiting on the same query,
+        # did not run on ClickHouse.
+        query_id = query_settings.get("query_id")
+        if (
+            query_id is not None
+            and all_confs.get("query_log_profile_enabled", 0)
+            and not stats.get("cache_hit")
+            and not stats.get("is_duplicate")
+        ):
+            query_log_collector.track(query_metadata, reader, query_id, start)
         stats = update_with_status(QueryStatus.SUCCESS)
         return QueryResult(
             result,
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from hashlib import md5
+from typing import (
+    Deque,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Sequence,
+    TypedDict,
+)
+
+from snuba import settings
+
+# Lists of literals of any length (IN conditions, arrays) are the same
+# query shape.
+LITERAL_LISTS = re.compile(r"\((\$[A-Z]+)(, \1)*\)")
+
+
+def get_fingerprint(sql_anonymized: str) -> str:
+    """
+    Identifies the shape of a query from its anonymized SQL, where every
+    literal has been replaced by a token of its type.
+    """
+    normalized = LITERAL_LISTS.sub(r"(\1...)", sql_anonymized)
+    return md5(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _percentile(values: Sequence[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+class FingerprintSummary(TypedDict):
+    fingerprint: str
+    sql_anonymized: str
+    count: int
+    errors: int
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    total_ms: float
+    avg_rows_read: Optional[float]
+    cache_hit_rate: Optional[float]
+    final_rate: Optional[float]
+
+
+@dataclass
+class _Accumulator:
+    sql_anonymized: str
+    count: int = 0
+    total_ms: float = 0.0
+    errors: int = 0
+    cache_hits: int = 0
+    final: int = 0
+    rows_read: int = 0
+    rows_read_count: int = 0
+    # A uniform sample of the durations of the queries, at most
+    # `max_samples` of them.
+    durations: MutableSequence[float] = field(default_factory=list)
+
+    def merge(self, other: _Accumulator, max_samples: int) -> None:
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.errors += other.errors
+        self.cache_hits += other.cache_hits
+        self.final += other.final
+        self.rows_read += other.rows_read
+        self.rows_read_count += other.rows_read_count
+        self.durations.extend(other.durations)
+        if len(self.durations) > max_samples:
+            self.durations = random.sample(self.durations, max_samples)
+
+
+class FingerprintStats:
+    """
+    Keeps statistics about the queries run by this process grouped by
+    fingerprint, over the last `windows` intervals of `interval` seconds.
+
+    Queries are recorded in the current interval. When an interval ends,
+    it is kept as it is until it falls out of the rolling window. At most
+    `max_fingerprints` fingerprints are tracked in an interval, the
+    queries of other fingerprints are not recorded in it.
+    """
+
+    def __init__(
+        self,
+        interval: int = settings.FINGERPRINT_STATS_INTERVAL_SEC,
+        windows: int = settings.FINGERPRINT_STATS_WINDOWS,
+        max_fingerprints: int = settings.FINGERPRINT_STATS_MAX_FINGERPRINTS,
+        max_samples: int = 500,
+    ) -> None:
+        self.__interval = interval
+        self.__windows = windows
+        self.__max_fingerprints = max_fingerprints
+        self.__max_samples = max_samples
+        self.__lock = threading.Lock()
+        self.__current: MutableMapping[str, _Accumulator] = {}
+        self.__current_start = self.__get_interval_start(time.time())
+        self.__closed: Deque[Mapping[str, _Accumulator]] = deque(maxlen=windows - 1)
+
+    def __get_interval_start(self, now: float) -> int:
+        return int(now // self.__interval * self.__interval)
+
+    def __rotate(self, now: float) -> None:
+        start = self.__get_interval_start(now)
+        if start == self.__current_start:
+            return
+        self.__closed.append(self.__current)
+        # The intervals in between had no queries.
+        for _ in range(
+            min((start - self.__current_start) // self.__interval - 1, self.__windows)
+        ):
+            self.__closed.append({})
+        self.__current = {}
+        self.__current_start = start
+
+    def __get_accumulator(
+        self, fingerprint: str, sql_anonymized: str
+    ) -> Optional[_Accumulator]:
+        accumulator = self.__current.get(fingerprint)
+        if accumulator is None and len(self.__current) < self.__max_fingerprints:
+            accumulator = self.__current[fingerprint] = _Accumulator(sql_anonymized)
+        return accumulator
+
+    def record(
+        self,
+        fingerprint: str,
+        sql_anonymized: str,
+        duration_ms: float,
+        *,
+        error: bool = False,
+        cache_hit: bool = False,
+        final: bool = False,
+        rows_read: Optional[int] = None,
+    ) -> None:
+        with self.__lock:
+            self.__rotate(time.time())
+            accumulator = self.__get_accumulator(fingerprint, sql_anonymized)
+            if accumulator is None:
+                return
+            accumulator.count += 1
+            accumulator.total_ms += duration_ms
+            accumulator.errors += int(error)
+            accumulator.cache_hits += int(cache_hit)
+            accumulator.final += int(final)
+            if rows_read is not None:
+                accumulator.rows_read += rows_read
+                accumulator.rows_read_count += 1
+            if len(accumulator.durations) < self.__max_samples:
+                accumulator.durations.append(duration_ms)
+            else:
+                index = random.randrange(accumulator.count)
+                if index < self.__max_samples:
+                    accumulator.durations[index] = duration_ms
+
+    def record_rows_read(
+        self, fingerprint: str, sql_anonymized: str, rows_read: int
+    ) -> None:
+        """
+        Records the rows read by a query that has already been recorded,
+        for when they are only known after the query completes.
+        """
+        with self.__lock:
+            self.__rotate(time.time())
+            accumulator = self.__get_accumulator(fingerprint, sql_anonymized)
+            if accumulator is None:
+                return
+            accumulator.rows_read += rows_read
+            accumulator.rows_read_count += 1
+
+    def summarize(self) -> Sequence[FingerprintSummary]:
+        """
+        Returns the statistics of each fingerprint over the rolling window,
+        from the fingerprint that took the most time in total.
+        """
+        totals: MutableMapping[str, _Accumulator] = {}
+        with self.__lock:
+            self.__rotate(time.time())
+            for window in [*self.__closed, self.__current]:
+                for fingerprint, accumulator in window.items():
+                    total = totals.setdefault(
+                        fingerprint, _Accumulator(accumulator.sql_anonymized)
+                    )
+                    total.merge(accumulator, self.__max_samples)
+
+        summaries: MutableSequence[FingerprintSummary] = []
+        for fingerprint, total in totals.items():
+            durations = sorted(total.durations)
+            summaries.append(
+                {
+                    "fingerprint": fingerprint,
+                    "sql_anonymized": total.sql_anonymized,
+                    "count": total.count,
+                    "errors": total.errors,
+                    "p50_ms": _percentile(durations, 0.5),
+                    "p95_ms": _percentile(durations, 0.95),
+                    "total_ms": total.total_ms,
+                    "avg_rows_read": total.rows_read / total.rows_read_count
+                    if total.rows_read_count
+                    else None,
+                    "cache_hit_rate": total.cache_hits / total.count
+                    if total.count
+                    else None,
+                    "final_rate": total.final / total.count if total.count else None,
+                }
+            )
+        return sorted(summaries, key=lambda summary: summary["total_ms"], reverse=True)
+
+
+fingerprint_stats = FingerprintStats()
@@ -1,13 +1,15 @@
 import logging
+from contextlib import contextmanager
 from dataclasses import replace
 from functools import partial
 from math import floor
-from typing import MutableMapping, Optional, Union
+from typing import Iterator, MutableMapping, Optional, Union
 
 import sentry_sdk
 
 from snuba import environment
 from snuba import settings as snuba_settings
+from snuba import state
 from snuba.clickhouse.formatter.query import format_query
 from snuba.clickhouse.query import Query
 from snuba.clickhouse.query_inspector import TablesCollector
@@ -29,6 +31,7 @@ from snuba.utils.metrics.timer import Timer
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.web import QueryException, QueryResult, transform_column_names
 from snuba.web.db_query import raw_query
+from snuba.web.scheduler import QueueTimeout, query_scheduler
 
 logger = logging.getLogger("snuba.query")
 
@@ -78,14 +81,15 @@ def parse_and_run_query(
     )
 
     try:
-        result = _run_query_pipeline(
-            dataset=dataset,
-            request=request,
-            timer=timer,
-            query_metadata=query_metadata,
-            robust=robust,
-            concurrent_queries_gauge=concurrent_queries_gauge,
-        )
+        with _schedule(request, timer):
+            result = _run_query_pipeline(
+                dataset=dataset,
+                request=request,
+                timer=timer,
+                query_metadata=query_metadata,
+                robust=robust,
+                concurrent_queries_gauge=concurrent_queries_gauge,
+            )
         if not request.settings.get_dry_run():
             record_query(request, timer, query_metadata, result.extra)
     except QueryException as error:
@@ -95,6 +99,38 @@ def parse_and_run_query(
     return result
 
 
+@contextmanager
+def _schedule(request: Request, timer: Timer) -> Iterator[None]:
+    """
+    Waits for the query scheduler, if enabled, to give the query a slot.
+    Queries wait for at most their max execution time, after which they
+    fail as rate limited.
+    """
+    if query_scheduler is None or request.settings.get_dry_run():
+        yield
+        return
+
+    max_execution_time, max_in_flight = state.get_configs(
+        [
+            ("query_settings/max_execution_time", 30),
+            (f"scheduler_max_in_flight/{request.referrer}", None),
+        ]
+    )
+    assert max_execution_time is not None
+    try:
+        with query_scheduler.slot(
+            request.referrer,
+            timeout=float(max_execution_time),
+            max_in_flight=int(max_in_flight) if max_in_flight is not None else None,
+        ):
+            timer.mark("scheduler_wait")
+            yield
+    except QueueTimeout as error:
+        raise QueryException(
+            {"stats": {"referrer": request.referrer}, "sql": "", "experiments": {}}
+        ) from error
+
+
 def _run_query_pipeline(
     dataset: Dataset,
     request: Request,
@@ -258,6 +294,10 @@ def _format_storage_query_and_run(
         "final": visitor.any_final(),
         "referrer": referrer,
         "sample": visitor.get_sample_rate(),
+        "processors_ms": {
+            name: round(duration, 3)
+            for name, duration in request_settings.get_processor_durations().items()
+        },
     }
 
     with sentry_sdk.start_span(description=formatted_query.get_sql(), op="db") as span:
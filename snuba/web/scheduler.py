@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Mapping, MutableMapping, Optional
+
+from snuba import environment, settings
+from snuba.state.rate_limit import RateLimitExceeded
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+metrics = MetricsWrapper(environment.metrics, "api.scheduler")
+
+DEFAULT_CLASS = "default"
+
+
+class QueueTimeout(RateLimitExceeded):
+    """
+    Raised when a query waited in the queue of its referrer for longer
+    than its deadline without getting a slot.
+    """
+
+
+class _Waiter:
+    __slots__ = ["tag", "granted"]
+
+    def __init__(self, tag: float) -> None:
+        # Virtual finish time, waiters are granted a slot in tag order.
+        self.tag = tag
+        self.granted = threading.Event()
+
+
+class _Queue:
+    __slots__ = ["weight", "max_in_flight", "in_flight", "last_tag", "waiters"]
+
+    def __init__(self, weight: float, max_in_flight: Optional[int]) -> None:
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.last_tag = 0.0
+        self.waiters: Deque[_Waiter] = deque()
+
+    def is_eligible(self) -> bool:
+        return bool(self.waiters) and (
+            self.max_in_flight is None or self.in_flight < self.max_in_flight
+        )
+
+
+class QueryScheduler:
+    """
+    Limits the number of queries running at the same time in a process,
+    queueing the others instead of rejecting them.
+
+    Every referrer has its own queue and, when a slot frees up, the queues
+    are served by weighted fair queueing (self clocked): each query gets a
+    virtual finish time that grows by 1 / weight of its queue, and the
+    query with the lowest one runs next. A referrer sending a burst of
+    queries only delays its own queue while referrers of a class with a
+    higher weight (like alerts) get proportionally more slots than
+    those of a lower one (like exports). A queue can also be capped on the
+    number of its queries running at the same time.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        class_weights: Mapping[str, float],
+        referrer_classes: Mapping[str, str],
+    ) -> None:
+        self.__max_in_flight = max_in_flight
+        self.__class_weights = class_weights
+        self.__referrer_classes = referrer_classes
+
+        self.__lock = threading.Lock()
+        self.__in_flight = 0
+        self.__queued = 0
+        self.__virtual_time = 0.0
+        self.__queues: MutableMapping[str, _Queue] = {}
+
+    def get_class(self, referrer: str) -> str:
+        return self.__referrer_classes.get(referrer, DEFAULT_CLASS)
+
+    def get_queue_depth(self) -> int:
+        with self.__lock:
+            return self.__queued
+
+    @contextmanager
+    def slot(
+        self, referrer: str, timeout: float, max_in_flight: Optional[int] = None,
+    ) -> Iterator[None]:
+        """
+        Runs the context once a slot is available for the referrer, waiting
+        at most for the timeout provided.
+        """
+        priority_class = self.get_class(referrer)
+        start = time.time()
+        waiter = self.__enqueue(referrer, priority_class, max_in_flight)
+        if not waiter.granted.wait(timeout):
+            with self.__lock:
+                # The slot could have been granted right after the wait
+                # timed out, in that case we take it.
+                timed_out = not waiter.granted.is_set()
+                if timed_out:
+                    queue = self.__queues[referrer]
+                    queue.waiters.remove(waiter)
+                    self.__queued -= 1
+                    self.__discard_if_idle(referrer, queue)
+            if timed_out:
+                metrics.increment("timeout", tags={"class": priority_class})
+                raise QueueTimeout(
+                    f"query waited more than {timeout} seconds in the queue of "
+                    f"referrer {referrer}"
+                )
+
+        metrics.timing(
+            "queue_wait", (time.time() - start) * 1000, tags={"class": priority_class}
+        )
+        try:
+            yield
+        finally:
+            self.__release(referrer)
+
+    def __enqueue(
+        self, referrer: str, priority_class: str, max_in_flight: Optional[int]
+    ) -> _Waiter:
+        with self.__lock:
+            queue = self.__queues.get(referrer)
+            if queue is None:
+                queue = self.__queues[referrer] = _Queue(
+                    self.__class_weights.get(
+                        priority_class, self.__class_weights.get(DEFAULT_CLASS, 1)
+                    ),
+                    max_in_flight,
+                )
+            queue.max_in_flight = max_in_flight
+
+            waiter = _Waiter(
+                max(self.__virtual_time, queue.last_tag) + 1 / queue.weight
+            )
+            queue.last_tag = waiter.tag
+            queue.waiters.append(waiter)
+            self.__queued += 1
+            self.__dispatch()
+            metrics.gauge("queued", self.__queued)
+            return waiter
+
+    def __release(self, referrer: str) -> None:
+        with self.__lock:
+            queue = self.__queues[referrer]
+            queue.in_flight -= 1
+            self.__in_flight -= 1
+            self.__dispatch()
+            self.__discard_if_idle(referrer, queue)
+
+    def __dispatch(self) -> None:
+        while self.__in_flight < self.__max_in_flight:
+            eligible = [
+                (queue.waiters[0].tag, referrer)
+                for referrer, queue in self.__queues.items()
+                if queue.is_eligible()
+            ]
+            if not eligible:
+                break
+            tag, referrer = min(eligible)
+            queue = self.__queues[referrer]
+            waiter = queue.waiters.popleft()
+            queue.in_flight += 1
+            self.__in_flight += 1
+            self.__queued -= 1
+            self.__virtual_time = tag
+            waiter.granted.set()
+
+        metrics.gauge("in_flight", self.__in_flight)
+
+    def __discard_if_idle(self, referrer: str, queue: _Queue) -> None:
+        # Referrers are unbounded, the queues are kept only while in use.
+        if queue.in_flight == 0 and not queue.waiters:
+            del self.__queues[referrer]
+
+
+query_scheduler: Optional[QueryScheduler] = (
+    QueryScheduler(
+        settings.QUERY_SCHEDULER_MAX_IN_FLIGHT,
+        settings.QUERY_SCHEDULER_CLASS_WEIGHTS,
+        settings.QUERY_SCHEDULER_REFERRER_CLASSES,
+    )
+    if settings.QUERY_SCHEDULER_MAX_IN_FLIGHT is not None
+    else None
+)
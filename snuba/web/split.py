@@ -1,4 +1,3 @@
-import copy
 import logging
 import math
 from dataclasses import replace
@@ -129,7 +128,7 @@ class TimeSplitQueryStrategy(QuerySplitStrategy):
         while split_start < split_end and total_results < limit:
             # We need to make a copy to use during the query execution because we replace
             # the start-end conditions on the query at each iteration of this loop.
-            split_query = copy.deepcopy(query)
+            split_query = query.clone()
 
             _replace_ast_condition(
                 split_query, self.__timestamp_col, ">=", LiteralExpr(None, split_start)
@@ -246,7 +245,7 @@ class ColumnSplitQueryStrategy(QuerySplitStrategy):
             metrics.increment("column_splitter.main_query_min_threshold")
             return None
 
-        minimal_query = copy.deepcopy(query)
+        minimal_query = query.clone()
 
         # TODO: provide the table alias name to this splitter if we ever use it
         # in joins.
@@ -301,7 +300,7 @@ class ColumnSplitQueryStrategy(QuerySplitStrategy):
 
         # Making a copy just in case runner returned None (which would drive the execution
         # strategy to ignore the result of this splitter and try the next one).
-        query = copy.deepcopy(query)
+        query = query.clone()
 
         event_ids = list(
             set([event[self.__id_column] for event in result.result["data"]])
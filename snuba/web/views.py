@@ -49,6 +49,7 @@ from snuba.query.exceptions import InvalidQueryException
 from snuba.query.logical import Query
 from snuba.redis import redis_client
 from snuba.request import Language
+from snuba.request import Request as SnubaRequest
 from snuba.request.exceptions import InvalidJsonRequestException, JsonDecodeException
 from snuba.request.request_settings import HTTPRequestSettings, RequestSettings
 from snuba.request.schema import RequestParts, RequestSchema
@@ -61,7 +62,16 @@ from snuba.util import with_span
 from snuba.utils.metrics.timer import Timer
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.web import QueryException
+from snuba.web.async_query import (
+    QueryResponse,
+    TooManyAsyncQueries,
+    async_queries,
+    parse_async_flag,
+    parse_wait,
+)
+from snuba.web.boot import get_registries_status
 from snuba.web.converters import DatasetConverter
+from snuba.web.fingerprints import fingerprint_stats
 from snuba.web.query import parse_and_run_query
 from snuba.writer import BatchWriterEncoderWrapper, WriterTableRow
 
@@ -75,9 +85,15 @@ RespTuple = Tuple[Text, int, Dict[Any, Any]]
 try:
     import uwsgi
 except ImportError:
+    # Without uWSGI (the development server or an ASGI server) the down
+    # file is compared with the time this module was loaded.
+    started_on = time.time()
 
     def check_down_file_exists() -> bool:
-        return False
+        try:
+            return os.stat("/tmp/snuba.down").st_mtime > started_on
+        except OSError:
+            return False
 
 
 else:
@@ -257,6 +273,20 @@ def dashboard(fmt: str = "html") -> Union[Response, RespTuple]:
         return application.send_static_file("dashboard.html")
 
 
+@application.route("/dashboard/fingerprints.json")
+def fingerprints() -> RespTuple:
+    """
+    The statistics of the queries run by this process grouped by query
+    fingerprint, from the fingerprint that took the most time in total.
+    """
+    limit = int(http_request.args.get("limit", 50))
+    return (
+        json.dumps(fingerprint_stats.summarize()[:limit]),
+        200,
+        {"Content-Type": "application/json"},
+    )
+
+
 @application.route("/config")
 @application.route("/config.<fmt>", methods=["GET", "POST"])
 def config(fmt: str = "html") -> Union[Response, RespTuple]:
@@ -292,25 +322,38 @@ def config_changes() -> RespTuple:
     )
 
 
-@application.route("/health")
-def health() -> Response:
+def check_health(thorough: bool) -> QueryResponse:
+    """
+    Runs the health checks shared by the WSGI and the ASGI applications.
+    The thorough check queries ClickHouse. Whether the registries were
+    built in advance is only reported, it does not fail the check.
+    """
     down_file_exists = check_down_file_exists()
-    thorough = http_request.args.get("thorough", False)
     clickhouse_health = check_clickhouse() if thorough else True
+    registries = get_registries_status()
 
-    body: Mapping[str, Union[str, bool]]
+    body: MutableMapping[str, Union[str, bool]]
     if not down_file_exists and clickhouse_health:
-        body = {"status": "ok"}
+        body = {"status": "ok", "registries": registries}
         status = 200
     else:
         body = {
             "down_file_exists": down_file_exists,
+            "registries": registries,
         }
         if thorough:
             body["clickhouse_ok"] = clickhouse_health
         status = 502
 
-    return Response(json.dumps(body), status, {"Content-Type": "application/json"})
+    return QueryResponse(status, json.dumps(body))
+
+
+@application.route("/health")
+def health() -> Response:
+    response = check_health(bool(http_request.args.get("thorough", False)))
+    return Response(
+        response.body, response.status, {"Content-Type": "application/json"}
+    )
 
 
 def parse_request_body(http_request: Request) -> MutableMapping[str, Any]:
@@ -353,10 +396,8 @@ def unqualified_query_view(*, timer: Timer) -> WerkzeugResponse:
 @util.time_request("query")
 def dataset_query_view(*, dataset: Dataset, timer: Timer) -> Union[Response, str]:
     if http_request.method == "GET":
-        schema = RequestSchema.build_with_extensions(
-            dataset.get_default_entity().get_extensions(),
-            HTTPRequestSettings,
-            Language.LEGACY,
+        schema = RequestSchema.build(
+            dataset.get_default_entity(), HTTPRequestSettings, Language.LEGACY,
         )
         return render_template(
             "query.html",
@@ -374,9 +415,7 @@ def dataset_query_view(*, dataset: Dataset, timer: Timer) -> Union[Response, str
 @util.time_request("query")
 def snql_dataset_query_view(*, dataset: Dataset, timer: Timer) -> Union[Response, str]:
     if http_request.method == "GET":
-        schema = RequestSchema.build_with_extensions(
-            {}, HTTPRequestSettings, Language.SNQL,
-        )
+        schema = RequestSchema.build(None, HTTPRequestSettings, Language.SNQL,)
         return render_template(
             "query.html",
             query_template=json.dumps(schema.generate_template(), indent=4,),
@@ -389,13 +428,16 @@ def snql_dataset_query_view(*, dataset: Dataset, timer: Timer) -> Union[Response
         assert False, "unexpected fallthrough"
 
 
-@with_span()
-def dataset_query(
-    dataset: Dataset, body: MutableMapping[str, Any], timer: Timer, language: Language
-) -> Response:
-    assert http_request.method == "POST"
-    referrer = http_request.referrer or "<unknown>"  # mypy
-
+def build_dataset_request(
+    dataset: Dataset,
+    body: MutableMapping[str, Any],
+    timer: Timer,
+    language: Language,
+    referrer: str,
+) -> SnubaRequest:
+    """
+    Parses and validates the body of a query request.
+    """
     metrics.increment(
         "snql.query.incoming", tags={"referrer": referrer, "language": str(language)}
     )
@@ -408,14 +450,52 @@ def dataset_query(
         parser = parse_legacy_query
 
     with sentry_sdk.start_span(description="build_schema", op="validate"):
-        schema = RequestSchema.build_with_extensions(
-            dataset.get_default_entity().get_extensions(), HTTPRequestSettings, language
+        schema = RequestSchema.build(
+            dataset.get_default_entity(), HTTPRequestSettings, language
         )
 
-    request = build_request(
+    return build_request(
         body, parser, HTTPRequestSettings, schema, dataset, timer, referrer
     )
 
+
+@with_span()
+def dataset_query(
+    dataset: Dataset, body: MutableMapping[str, Any], timer: Timer, language: Language
+) -> Response:
+    assert http_request.method == "POST"
+    referrer = http_request.referrer or "<unknown>"  # mypy
+
+    request = build_dataset_request(dataset, body, timer, language, referrer)
+
+    if parse_async_flag(http_request.args.get("async")):
+        try:
+            async_queries.submit(
+                request.id, partial(run_query, dataset, request, timer)
+            )
+        except TooManyAsyncQueries as error:
+            return Response(
+                json.dumps({"error": {"type": "rate-limited", "message": str(error)}}),
+                429,
+                {"Content-Type": "application/json"},
+            )
+        return Response(
+            json.dumps({"query_id": request.id, "status": "pending"}),
+            202,
+            {"Content-Type": "application/json"},
+        )
+
+    response = run_query(dataset, request, timer)
+    return Response(
+        response.body, response.status, {"Content-Type": "application/json"}
+    )
+
+
+def run_query(dataset: Dataset, request: SnubaRequest, timer: Timer) -> QueryResponse:
+    """
+    Runs a validated request and serializes the response. This does not
+    depend on the HTTP request so it can run outside of it.
+    """
     try:
         result = parse_and_run_query(dataset, request, timer)
     except QueryException as exception:
@@ -446,12 +526,11 @@ def dataset_query(
         else:
             raise  # exception should have been chained
 
-        return Response(
+        return QueryResponse(
+            status,
             json.dumps(
                 {"error": details, "timing": timer.for_json(), **exception.extra}
             ),
-            status,
-            {"Content-Type": "application/json"},
         )
 
     payload: MutableMapping[str, Any] = {**result.result, "timing": timer.for_json()}
@@ -459,7 +538,42 @@ def dataset_query(
     if settings.STATS_IN_RESPONSE or request.settings.get_debug():
         payload.update(result.extra)
 
-    return Response(json.dumps(payload), 200, {"Content-Type": "application/json"})
+    return QueryResponse(200, json.dumps(payload))
+
+
+@application.route("/queries/<query_id>", methods=["GET"])
+def async_query_result(*, query_id: str) -> Response:
+    """
+    Returns the response of a query submitted with `async`. If the query
+    is still running this waits up to the `wait` parameter (in seconds)
+    for it to complete before returning a 202.
+    """
+    wait = parse_wait(http_request.args.get("wait"))
+    if wait is None:
+        return Response(
+            json.dumps(
+                {
+                    "error": {
+                        "type": "request",
+                        "message": "wait must be a number of seconds",
+                    }
+                }
+            ),
+            400,
+            {"Content-Type": "application/json"},
+        )
+    response = async_queries.get(query_id, wait)
+    if response is None:
+        return Response(
+            json.dumps(
+                {"error": {"type": "not-found", "message": "unknown or expired query"}}
+            ),
+            404,
+            {"Content-Type": "application/json"},
+        )
+    return Response(
+        response.body, response.status, {"Content-Type": "application/json"}
+    )
 
 
 @application.errorhandler(InvalidSubscriptionError)
@@ -1,6 +1,34 @@
+import threading
+
 from snuba.environment import setup_logging, setup_sentry
 
 setup_logging()
 setup_sentry()
 
+from snuba import settings  # noqa
+from snuba.clusters.cluster import warmup_query_connections  # noqa
+from snuba.web.boot import prewarm_registries  # noqa
 from snuba.web.views import application  # noqa
+
+if settings.PREWARM_REGISTRIES:
+    # This runs in the master process, so the workers share the registries.
+    prewarm_registries()
+
+
+def warmup() -> None:
+    if settings.CLICKHOUSE_POOL_WARMUP_CONNECTIONS:
+        threading.Thread(
+            target=warmup_query_connections,
+            args=(settings.CLICKHOUSE_POOL_WARMUP_CONNECTIONS,),
+            name="clickhouse-warmup",
+            daemon=True,
+        ).start()
+
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    warmup()
+else:
+    # Connections must not be shared by the processes forked by uWSGI.
+    postfork(warmup)
@@ -0,0 +1,127 @@
+import time
+from typing import Iterator, Mapping, MutableSequence, Optional
+from unittest import mock
+
+import pytest
+
+from snuba.clickhouse import hedged_reader
+from snuba.clickhouse.formatter.nodes import FormattedQuery, StringNode
+from snuba.clickhouse.hedged_reader import HedgedReader, HedgingPolicy
+from snuba.reader import Reader, Result
+
+QUERY = FormattedQuery([StringNode("SELECT 1")])
+
+
+class SlowReader(Reader):
+    def __init__(self, name: str, delay: float, error: bool = False) -> None:
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.query_ids: MutableSequence[str] = []
+        self.cancelled: MutableSequence[str] = []
+
+    def execute(
+        self,
+        query: FormattedQuery,
+        settings: Optional[Mapping[str, str]] = None,
+        with_totals: bool = False,
+        robust: bool = False,
+    ) -> Result:
+        assert settings is not None
+        self.query_ids.append(settings["query_id"])
+        time.sleep(self.delay)
+        if self.error:
+            raise ValueError(self.name)
+        return {"meta": [], "data": [{"reader": self.name}]}
+
+    def cancel(self, query_id: str) -> None:
+        self.cancelled.append(query_id)
+
+
+def build_policy(latency: float, budget: float) -> HedgingPolicy:
+    policy = HedgingPolicy(samples=10, min_samples=10)
+    for _ in range(10):
+        policy.record("alerts", latency, budget)
+    return policy
+
+
+@pytest.fixture(autouse=True)
+def configs() -> Iterator[None]:
+    with mock.patch.object(
+        hedged_reader.state, "get_configs", return_value=[0.5, 0.95, 10]
+    ):
+        yield
+
+
+def test_hedging_policy() -> None:
+    policy = HedgingPolicy(samples=10, min_samples=5, max_tokens=2)
+    assert policy.get_delay("alerts", 0.9, 0.01) is None
+    assert not policy.try_hedge("alerts")
+
+    for latency in range(1, 11):
+        policy.record("alerts", latency / 100, 0.5)
+    assert policy.get_delay("alerts", 0.9, 0.01) == 0.1
+    assert policy.get_delay("alerts", 0.5, 0.01) == 0.06
+    assert policy.get_delay("alerts", 0.5, 0.2) == 0.2
+
+    # The budget is capped at two hedges.
+    assert policy.try_hedge("alerts")
+    assert policy.try_hedge("alerts")
+    assert not policy.try_hedge("alerts")
+    assert policy.get_delay("other", 0.9, 0.01) is None
+
+
+def test_hedge_wins() -> None:
+    primary = SlowReader("primary", 1.0)
+    hedge = SlowReader("hedge", 0.0)
+    reader = HedgedReader(primary, hedge, build_policy(0.05, 1.0))
+
+    start = time.time()
+    result = reader.execute_hedged(QUERY, "alerts", {"query_id": "abc"})
+    assert result["data"] == [{"reader": "hedge"}]
+    assert time.time() - start < 0.5
+    assert primary.query_ids == ["abc"]
+    assert hedge.query_ids == ["abc-hedge"]
+    assert primary.cancelled == ["abc"]
+    assert hedge.cancelled == []
+
+
+def test_primary_wins() -> None:
+    primary = SlowReader("primary", 0.2)
+    hedge = SlowReader("hedge", 1.0)
+    reader = HedgedReader(primary, hedge, build_policy(0.05, 1.0))
+
+    result = reader.execute_hedged(QUERY, "alerts", {"query_id": "abc"})
+    assert result["data"] == [{"reader": "primary"}]
+    assert hedge.cancelled == ["abc-hedge"]
+    assert primary.cancelled == []
+
+
+def test_not_hedged() -> None:
+    primary = SlowReader("primary", 0.2)
+    hedge = SlowReader("hedge", 0.0)
+
+    # Out of budget.
+    reader = HedgedReader(primary, hedge, build_policy(0.05, 0.05))
+    result = reader.execute_hedged(QUERY, "alerts", {"query_id": "abc"})
+    assert result["data"] == [{"reader": "primary"}]
+
+    # Not enough samples for the referrer.
+    result = reader.execute_hedged(QUERY, "other", {"query_id": "abc"})
+    assert result["data"] == [{"reader": "primary"}]
+
+    # Plain queries never are.
+    assert reader.execute(QUERY, {"query_id": "abc"})["data"] == [{"reader": "primary"}]
+    assert hedge.query_ids == []
+
+
+def test_failures() -> None:
+    primary = SlowReader("primary", 0.1, error=True)
+    hedge = SlowReader("hedge", 0.3)
+    reader = HedgedReader(primary, hedge, build_policy(0.05, 1.0))
+    result = reader.execute_hedged(QUERY, "alerts", {"query_id": "abc"})
+    assert result["data"] == [{"reader": "hedge"}]
+
+    hedge.error = True
+    with pytest.raises(ValueError, match="primary"):
+        reader.execute_hedged(QUERY, "alerts", {"query_id": "abc"})
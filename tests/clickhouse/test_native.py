@@ -1,6 +1,18 @@
-from datetime import datetime, timedelta
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional
+from unittest import mock
+
 from dateutil.tz import tz
-from snuba.clickhouse.native import transform_datetime
+from snuba.clickhouse.formatter.nodes import FormattedQuery
+from snuba.clickhouse.native import (
+    ClickhousePool,
+    NativeDriverReader,
+    transform_datetime,
+)
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from tests.backends.metrics import Increment, TestingMetricsBackend
 
 
 def test_transform_datetime() -> None:
@@ -14,3 +26,167 @@ def test_transform_datetime() -> None:
         transform_datetime(now.replace(tzinfo=tz.tzoffset("PST", offset)) + offset)
         == fmt
     )
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.connection = mock.Mock(connected=True)
+        self.connection.ping.return_value = True
+        self.disconnected = False
+
+    def execute(self, *args: Any, **kwargs: Any) -> List[Any]:
+        return []
+
+    def disconnect(self) -> None:
+        self.disconnected = True
+
+
+class FakePool(ClickhousePool):
+    def __init__(self, max_connection_age: Optional[float] = None) -> None:
+        super().__init__(
+            "host",
+            9000,
+            "user",
+            "",
+            "db",
+            max_pool_size=2,
+            max_connection_age=max_connection_age,
+        )
+        self.backend = TestingMetricsBackend()
+        self.metrics = MetricsWrapper(self.backend, "clickhouse.pool")
+        self.clients: List[FakeClient] = []
+
+    def _create_conn(self) -> Any:
+        client = FakeClient()
+        self.clients.append(client)
+        return client
+
+    def get_increments(self) -> List[str]:
+        return [c.name for c in self.backend.calls if isinstance(c, Increment)]
+
+
+def test_reuse_and_recycle() -> None:
+    pool = FakePool(max_connection_age=60)
+    pool.execute("SELECT 1")
+    pool.execute("SELECT 1")
+    assert len(pool.clients) == 1
+    assert pool.get_increments() == ["clickhouse.pool.connect"]
+
+    with mock.patch("time.time", return_value=time.time() + 120):
+        pool.execute("SELECT 1")
+    assert len(pool.clients) == 2
+    assert pool.clients[0].disconnected
+    assert pool.get_increments()[-2:] == [
+        "clickhouse.pool.recycled",
+        "clickhouse.pool.connect",
+    ]
+
+
+def test_warmup() -> None:
+    pool = FakePool()
+    pool.warmup(5)
+    assert len(pool.clients) == 2
+    for client in pool.clients:
+        client.connection.force_connect.assert_called_once()
+
+    pool.execute("SELECT 1")
+    pool.execute("SELECT 1")
+    assert len(pool.clients) == 2
+
+
+def test_keepalive() -> None:
+    pool = FakePool()
+    pool.warmup(2)
+    healthy, broken = pool.clients
+    broken.connection.ping.return_value = False
+
+    # Nothing is idle yet.
+    pool.keepalive(60)
+    healthy.connection.ping.assert_not_called()
+
+    with mock.patch("time.time", return_value=time.time() + 120):
+        pool.keepalive(60)
+    healthy.connection.ping.assert_called_once()
+    assert not healthy.disconnected
+    assert broken.disconnected
+    assert pool.get_increments() == ["clickhouse.pool.keepalive_failed"]
+
+    # The broken connection is replaced when it is needed again.
+    pool.warmup(2)
+    assert len(pool.clients) == 3
+
+
+def test_keepalive_keeps_order() -> None:
+    pool = FakePool()
+    pool.warmup(2)
+    top, bottom = pool.clients
+    connections = list(pool.pool.queue)
+    assert [c.client for c in connections if c is not None] == [bottom, top]
+
+    # Only the connection at the bottom of the stack is idle.
+    assert connections[0] is not None
+    connections[0].last_used -= 120
+    pool.keepalive(60)
+    bottom.connection.ping.assert_called_once()
+    top.connection.ping.assert_not_called()
+    assert list(pool.pool.queue) == connections
+    assert pool.get_increments() == []
+
+
+def test_reader_transforms_columns() -> None:
+    event_id = uuid.uuid4()
+    timestamp = datetime(2020, 1, 2, 3, 4, 5)
+    pool = mock.Mock()
+    pool.execute.return_value = (
+        [
+            (event_id, event_id, event_id),
+            (timestamp, timestamp, timestamp),
+            (date(2020, 1, 2), None, None),
+            (1, 2, 3),
+            (4, 5, 6),
+        ],
+        [
+            ("event_id", "UUID"),
+            ("timestamp", "DateTime"),
+            ("day", "Nullable(Date)"),
+            ("count", "UInt64"),
+            ("count", "UInt64"),
+        ],
+    )
+    query = FormattedQuery([])
+
+    iso = "2020-01-02T03:04:05+00:00"
+    result = NativeDriverReader(pool).execute(query, with_totals=True)
+    assert pool.execute.call_args[1]["columnar"]
+    assert result == {
+        "meta": [
+            {"name": "event_id", "type": "UUID"},
+            {"name": "timestamp", "type": "DateTime"},
+            {"name": "day", "type": "Nullable(Date)"},
+            {"name": "count", "type": "UInt64"},
+        ],
+        "data": [
+            {
+                "event_id": str(event_id),
+                "timestamp": iso,
+                "day": "2020-01-02T00:00:00+00:00",
+                "count": 4,
+            },
+            {"event_id": str(event_id), "timestamp": iso, "day": None, "count": 5},
+        ],
+        "totals": {
+            "event_id": str(event_id),
+            "timestamp": iso,
+            "day": None,
+            "count": 6,
+        },
+    }
+
+
+def test_reader_empty_result() -> None:
+    pool = mock.Mock()
+    pool.execute.return_value = ([], [("timestamp", "DateTime")])
+    assert NativeDriverReader(pool).execute(FormattedQuery([])) == {
+        "meta": [{"name": "timestamp", "type": "DateTime"}],
+        "data": [],
+    }
@@ -250,6 +250,7 @@ def test_serialization() -> None:
         where_profile=FilterProfile(columns={"timestamp"}, mapping_cols=set(),),
         groupby_cols={"col"},
         array_join_cols={"arrayjoin"},
+        prewhere_cols={"col"},
     )
 
     assert profile.to_dict() == {
@@ -260,4 +261,5 @@ def test_serialization() -> None:
         "where_profile": {"columns": ["timestamp"], "mapping_cols": []},
         "groupby_cols": ["col"],
         "array_join_cols": ["arrayjoin"],
+        "prewhere_cols": ["col"],
     }
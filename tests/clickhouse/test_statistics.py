@@ -0,0 +1,53 @@
+from typing import Any, MutableSequence, Sequence
+from unittest import mock
+
+from snuba.clickhouse import statistics
+from snuba.clickhouse.statistics import ColumnStatistics, fetch_table_statistics
+
+
+def fetch(sampling_key: str) -> Sequence[str]:
+    queries: MutableSequence[str] = []
+
+    def execute(query: str) -> Sequence[Any]:
+        queries.append(query)
+        if "system.columns" in query:
+            return [("project_id", 100), ("environment", 200)]
+        if "system.tables" in query:
+            return [(sampling_key, "project_id, toStartOfDay(timestamp)")]
+        if "project_id" in query:
+            return [(10, 2, 0, 5, 1)]
+        return [(10, 5, 1)]
+
+    connection = mock.Mock()
+    connection.execute.side_effect = execute
+    with mock.patch.object(
+        statistics,
+        "_get_table_connection",
+        return_value=(connection, "default", "errors_local"),
+    ):
+        result = fetch_table_statistics("errors_dist", ["project_id", "environment"])
+
+    if sampling_key:
+        assert result == {
+            "project_id": ColumnStatistics(100, 2, 0.0),
+            "environment": ColumnStatistics(200, 5, 0.1),
+        }
+    else:
+        assert result == {
+            "project_id": ColumnStatistics(100),
+            "environment": ColumnStatistics(200, 5, 0.1),
+        }
+    return queries
+
+
+def test_fetch_with_sampling_key() -> None:
+    queries = fetch("cityHash64(event_id)")
+    assert "SAMPLE 100000 LIMIT 100000" in queries[-1]
+
+
+def test_fetch_without_sampling_key() -> None:
+    # The first rows in sorting key order say nothing about the columns of
+    # the sorting key.
+    queries = fetch("")
+    assert "SAMPLE" not in queries[-1]
+    assert "project_id" not in queries[-1]
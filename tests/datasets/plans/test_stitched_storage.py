@@ -0,0 +1,215 @@
+from datetime import datetime
+from typing import Any, List, Mapping, Sequence, Tuple, Union
+
+import pytest
+
+from snuba.clickhouse.query import Query as ClickhouseQuery
+from snuba.clickhouse.query_dsl.accessors import get_time_range
+from snuba.datasets.factory import get_dataset
+from snuba.datasets.plans.single_storage import SimpleQueryPlanExecutionStrategy
+from snuba.datasets.plans.stitched_storage import _align
+from snuba.query.composite import CompositeQuery
+from snuba.query.data_source.simple import Table
+from snuba.query.logical import Query
+from snuba.query.snql.parser import parse_snql_query
+from snuba.reader import Reader
+from snuba.request.request_settings import HTTPRequestSettings, RequestSettings
+from snuba.web import QueryResult
+
+
+def test_align() -> None:
+    value = datetime(2021, 1, 2, 10, 37, 12)
+    assert _align(value, 3600, up=True) == datetime(2021, 1, 2, 11)
+    assert _align(value, 3600, up=False) == datetime(2021, 1, 2, 10)
+    assert _align(value, 86400, up=True) == datetime(2021, 1, 3)
+    assert _align(datetime(2021, 1, 2, 10), 3600, up=True) == datetime(2021, 1, 2, 10)
+
+
+def build_query(select: str, where: str, extra: str = "") -> Query:
+    query = parse_snql_query(
+        f"""
+        MATCH (sessions)
+        SELECT {select}
+        WHERE org_id = 1 AND project_id = 1 AND {where}
+        {extra}
+        """,
+        [],
+        get_dataset("sessions"),
+    )
+    assert isinstance(query, Query)
+    return query
+
+
+def run(
+    query: Query, results: Mapping[str, Sequence[Sequence[Mapping[str, Any]]]]
+) -> Tuple[QueryResult, List[Tuple[str, datetime, datetime]]]:
+    """
+    Runs the query returning the results provided for each table in
+    order, and returns the result and the queries that were run.
+    """
+    settings = HTTPRequestSettings()
+    plan = (
+        get_dataset("sessions")
+        .get_default_entity()
+        .get_query_pipeline_builder()
+        .build_planner(query, settings)
+        .build_best_plan()
+    )
+    queries: List[Tuple[str, datetime, datetime]] = []
+
+    def runner(
+        query: Union[ClickhouseQuery, CompositeQuery[Table]],
+        request_settings: RequestSettings,
+        reader: Reader,
+    ) -> QueryResult:
+        assert isinstance(query, ClickhouseQuery)
+        table = query.get_from_clause().table_name
+        start, end = get_time_range(query, "started")
+        assert start is not None and end is not None
+        data = results[table][len([q for q in queries if q[0] == table])]
+        queries.append((table, start, end))
+        return QueryResult(
+            {"data": [{**row} for row in data], "meta": []},
+            {"stats": {}, "sql": "", "experiments": {}},
+        )
+
+    return plan.execution_strategy.execute(plan.query, settings, runner), queries
+
+
+def test_stitched_time_series() -> None:
+    query = build_query(
+        "sessions, users, bucketed_started BY bucketed_started",
+        "started >= toDateTime('2021-01-01T10:37:00') "
+        "AND started < toDateTime('2021-01-02T10:37:00')",
+        "ORDER BY bucketed_started ASC GRANULARITY 3600",
+    )
+    result, queries = run(
+        query,
+        {
+            "sessions_hourly_local": [
+                [
+                    {"bucketed_started": "2021-01-01T11:00:00", "sessions": 3},
+                    {"bucketed_started": "2021-01-02T09:00:00", "sessions": 2},
+                ]
+            ],
+            "sessions_raw_local": [
+                [{"bucketed_started": "2021-01-01T10:00:00", "sessions": 1}],
+                [{"bucketed_started": "2021-01-02T10:00:00", "sessions": 4}],
+            ],
+        },
+    )
+
+    assert queries == [
+        ("sessions_hourly_local", datetime(2021, 1, 1, 11), datetime(2021, 1, 2, 10)),
+        ("sessions_raw_local", datetime(2021, 1, 1, 10, 37), datetime(2021, 1, 1, 11)),
+        ("sessions_raw_local", datetime(2021, 1, 2, 10), datetime(2021, 1, 2, 10, 37)),
+    ]
+    assert [row["sessions"] for row in result.result["data"]] == [1, 3, 2, 4]
+
+
+def test_stitched_totals() -> None:
+    query = build_query(
+        "sessions, sessions_crashed, release BY release",
+        "started >= toDateTime('2021-01-01T10:37:00') "
+        "AND started < toDateTime('2021-01-02T10:00:00')",
+        "ORDER BY sessions DESC LIMIT 3",
+    )
+    result, queries = run(
+        query,
+        {
+            "sessions_hourly_local": [
+                [
+                    {"release": "a", "sessions": 5, "sessions_crashed": 1},
+                    {"release": "b", "sessions": 4, "sessions_crashed": 0},
+                ]
+            ],
+            "sessions_raw_local": [
+                [
+                    {"release": "b", "sessions": 2, "sessions_crashed": 1},
+                    {"release": "c", "sessions": 1, "sessions_crashed": 0},
+                ]
+            ],
+        },
+    )
+
+    assert [q[0] for q in queries] == ["sessions_hourly_local", "sessions_raw_local"]
+    assert result.result["data"] == [
+        {"release": "b", "sessions": 6, "sessions_crashed": 1},
+        {"release": "a", "sessions": 5, "sessions_crashed": 1},
+        {"release": "c", "sessions": 1, "sessions_crashed": 0},
+    ]
+
+
+def test_stitched_totals_incomplete() -> None:
+    query = build_query(
+        "sessions, release BY release",
+        "started >= toDateTime('2021-01-01T10:37:00') "
+        "AND started < toDateTime('2021-01-02T10:00:00')",
+        "LIMIT 1",
+    )
+    result, queries = run(
+        query,
+        {
+            "sessions_hourly_local": [
+                [{"release": "a", "sessions": 5}],
+                [{"release": "a", "sessions": 6}],
+            ],
+        },
+    )
+
+    # The hourly part hit the limit, so the query is run on the hourly
+    # storage alone.
+    assert queries == [
+        ("sessions_hourly_local", datetime(2021, 1, 1, 11), datetime(2021, 1, 2, 10)),
+        (
+            "sessions_hourly_local",
+            datetime(2021, 1, 1, 10, 37),
+            datetime(2021, 1, 2, 10),
+        ),
+    ]
+    assert result.result["data"] == [{"release": "a", "sessions": 6}]
+
+
+@pytest.mark.parametrize(
+    "select, where, extra",
+    [
+        pytest.param(
+            "sessions",
+            "started >= toDateTime('2021-01-01T10:00:00') "
+            "AND started < toDateTime('2021-01-02T10:00:00')",
+            "",
+            id="aligned",
+        ),
+        pytest.param(
+            "users, release BY release",
+            "started >= toDateTime('2021-01-01T10:37:00') "
+            "AND started < toDateTime('2021-01-02T10:00:00')",
+            "",
+            id="not additive",
+        ),
+        pytest.param(
+            "sessions, bucketed_started BY bucketed_started",
+            "started >= toDateTime('2021-01-01T10:37:00') "
+            "AND started < toDateTime('2021-01-01T12:37:00')",
+            "GRANULARITY 60",
+            id="minute resolution",
+        ),
+        pytest.param(
+            "sessions, bucketed_started BY bucketed_started",
+            "started >= toDateTime('2021-01-01T10:37:00') "
+            "AND started < toDateTime('2021-01-03T10:00:00')",
+            "GRANULARITY 86400",
+            id="edges too large for the raw storage",
+        ),
+    ],
+)
+def test_not_stitched(select: str, where: str, extra: str) -> None:
+    settings = HTTPRequestSettings()
+    plan = (
+        get_dataset("sessions")
+        .get_default_entity()
+        .get_query_pipeline_builder()
+        .build_planner(build_query(select, where, extra), settings)
+        .build_best_plan()
+    )
+    assert isinstance(plan.execution_strategy, SimpleQueryPlanExecutionStrategy)
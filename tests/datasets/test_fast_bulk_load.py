@@ -1,7 +1,23 @@
+from typing import Any, Mapping, Sequence
+
 import pytest
 
 from snuba.clickhouse import DATETIME_FORMAT
-from snuba.datasets.cdc.groupedmessage_processor import GroupedMessageRow
+from snuba.datasets.cdc.cdcprocessors import postgres_dates_to_clickhouse
+from snuba.datasets.cdc.groupassignee_processor import (
+    GroupAssigneeBlockProcessor,
+    GroupAssigneeRow,
+)
+from snuba.datasets.cdc.groupedmessage_processor import (
+    GroupedMessageBlockProcessor,
+    GroupedMessageRow,
+)
+from snuba.snapshots.loaders.single_table import (
+    CSV_NULL,
+    BlockProcessor,
+    encode_csv_block,
+)
+from snuba.writer import WriterTableRow
 
 
 class TestFastGroupedMessageLoad:
@@ -59,3 +75,90 @@ class TestFastGroupedMessageLoad:
                     "first_release_id": "0",
                 }
             )
+
+
+def to_block(rows: Sequence[Mapping[str, str]]) -> Mapping[str, Sequence[str]]:
+    return {column: [row[column] for row in rows] for column in rows[0]}
+
+
+def to_csv_values(
+    processor: BlockProcessor, rows: Sequence[WriterTableRow]
+) -> Sequence[Sequence[Any]]:
+    return [
+        [CSV_NULL if row[column] is None else str(row[column]) for row in rows]
+        for column in processor.get_columns()
+    ]
+
+
+class TestBlockProcessors:
+    def test_groupedmessage(self) -> None:
+        rows = [
+            {
+                "project_id": "2",
+                "id": "1",
+                "status": "0",
+                "last_seen": "2019-07-01 18:03:07.984123+00",
+                "first_seen": "2019-07-01 18:03:07+00",
+                "active_at": "",
+                "first_release_id": "",
+            },
+            {
+                "project_id": "3",
+                "id": "2",
+                "status": "1",
+                "last_seen": "2019-07-02 18:03:07+00",
+                "first_seen": "2019-07-01 18:03:07.1+00",
+                "active_at": "2019-06-25 22:15:57.6+00",
+                "first_release_id": "26",
+            },
+        ]
+        processor = GroupedMessageBlockProcessor()
+
+        columns = processor.process_block(to_block(rows))
+        assert [list(column) for column in columns] == to_csv_values(
+            processor,
+            [GroupedMessageRow.from_bulk(row).to_clickhouse() for row in rows],
+        )
+        assert encode_csv_block(columns) == (
+            b"0,2,1,0,0,2019-07-01 18:03:07,2019-07-01 18:03:07,\\N,\\N\n"
+            b"0,3,2,0,1,2019-07-02 18:03:07,2019-07-01 18:03:07,2019-06-25 22:15:57,26\n"
+        )
+
+    def test_groupassignee(self) -> None:
+        rows = [
+            {
+                "project_id": "2",
+                "group_id": "1",
+                "date_added": "2019-07-01 18:03:07.984123+00",
+                "user_id": "",
+                "team_id": "10",
+            },
+            {
+                "project_id": "2",
+                "group_id": "2",
+                "date_added": "2019-07-01 18:03:07+00",
+                "user_id": "1",
+                "team_id": "",
+            },
+        ]
+        processor = GroupAssigneeBlockProcessor()
+
+        columns = processor.process_block(to_block(rows))
+        assert [list(column) for column in columns] == to_csv_values(
+            processor,
+            [GroupAssigneeRow.from_bulk(row).to_clickhouse() for row in rows],
+        )
+
+    def test_dates_failure(self) -> None:
+        assert postgres_dates_to_clickhouse([]) == []
+        assert postgres_dates_to_clickhouse(["", "2019-07-01 18:03:07+00"], "N") == [
+            "N",
+            "2019-07-01 18:03:07",
+        ]
+
+        with pytest.raises(AssertionError, match="Only support UTC timezone"):
+            postgres_dates_to_clickhouse(
+                ["2019-07-01 18:03:07+00", "2019-07-01 18:03:07.984+05"]
+            )
+        with pytest.raises(AssertionError, match="Invalid date"):
+            postgres_dates_to_clickhouse(["2019-07-01 18:03:07+00", ""])
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from snuba.pipeline import processors_timing
+from snuba.pipeline.processors_timing import time_processor
+from snuba.query.processors.basic_functions import BasicFunctionsProcessor
+from snuba.request.request_settings import HTTPRequestSettings
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from tests.backends.metrics import TestingMetricsBackend, Timing
+
+
+def test_time_processor() -> None:
+    backend = TestingMetricsBackend()
+    request_settings = HTTPRequestSettings()
+    processor = BasicFunctionsProcessor()
+
+    with patch.object(processors_timing, "metrics", MetricsWrapper(backend, "api")):
+        for _ in range(2):
+            with time_processor(processor, request_settings, {"entity": "test_entity"}):
+                pass
+
+    # Queries executed by other threads while the metrics are patched
+    # would show up here too.
+    calls = [
+        call
+        for call in backend.calls
+        if isinstance(call, Timing) and call.tags.get("entity") == "test_entity"
+    ]
+    assert len(calls) == 2
+    for call in calls:
+        assert call.name == "api.query_processor"
+        assert call.tags == {
+            "entity": "test_entity",
+            "processor": "BasicFunctionsProcessor",
+        }
+
+    durations = request_settings.get_processor_durations()
+    assert list(durations.keys()) == ["BasicFunctionsProcessor"]
+    assert durations["BasicFunctionsProcessor"] == sum(call.value for call in calls)
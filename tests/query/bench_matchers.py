@@ -0,0 +1,180 @@
+"""
+Benchmarks the AST matchers on an expression tree shaped like the ones
+the discover entity produces: a large AND of conditions on tags,
+contexts and regular columns, with several aggregations in the select
+clause.
+
+This is not collected by pytest. Run it with:
+
+    python -m tests.query.bench_matchers
+"""
+import timeit
+from typing import Iterable, List, Mapping, Sequence
+
+from snuba.query.conditions import (
+    BooleanFunctions,
+    ConditionFunctions,
+    binary_condition,
+    condition_pattern,
+    in_condition,
+    is_in_condition_pattern,
+)
+from snuba.query.dsl import literals_tuple
+from snuba.query.expressions import Column as ColumnExpr
+from snuba.query.expressions import Expression
+from snuba.query.expressions import FunctionCall as FunctionCallExpr
+from snuba.query.expressions import Literal as LiteralExpr
+from snuba.query.expressions import SubscriptableReference as SubscriptableReferenceExpr
+from snuba.query.matchers import (
+    Any,
+    AnyExpression,
+    Column,
+    FunctionCall,
+    Literal,
+    Or,
+    Param,
+    Pattern,
+    String,
+    SubscriptableReference,
+)
+
+
+def build_discover_ast(conditions: int) -> Sequence[Expression]:
+    """
+    Returns the selected expressions and the condition of a discover
+    query, the condition has the number of top level clauses provided.
+    """
+    clauses: List[Expression] = [
+        in_condition(
+            ColumnExpr(None, None, "project_id"),
+            [LiteralExpr(None, 1), LiteralExpr(None, 2)],
+        ),
+        binary_condition(
+            ConditionFunctions.GTE,
+            ColumnExpr(None, None, "timestamp"),
+            LiteralExpr(None, "2021-01-01T00:00:00"),
+        ),
+    ]
+    for index in range(conditions):
+        tag = SubscriptableReferenceExpr(
+            f"_snuba_tags[key_{index}]",
+            ColumnExpr(None, None, "tags"),
+            LiteralExpr(None, f"key_{index}"),
+        )
+        if index % 3 == 0:
+            clauses.append(
+                binary_condition(
+                    ConditionFunctions.EQ,
+                    FunctionCallExpr(None, "ifNull", (tag, LiteralExpr(None, ""))),
+                    LiteralExpr(None, f"value_{index}"),
+                )
+            )
+        elif index % 3 == 1:
+            clauses.append(
+                binary_condition(
+                    ConditionFunctions.LIKE,
+                    ColumnExpr(None, None, "transaction"),
+                    LiteralExpr(None, f"%/api/{index}/%"),
+                )
+            )
+        else:
+            clauses.append(
+                FunctionCallExpr(
+                    None,
+                    ConditionFunctions.NOT_IN,
+                    (
+                        tag,
+                        literals_tuple(
+                            None, [LiteralExpr(None, "a"), LiteralExpr(None, "b")]
+                        ),
+                    ),
+                )
+            )
+
+    condition = clauses[0]
+    for clause in clauses[1:]:
+        condition = binary_condition(BooleanFunctions.AND, condition, clause)
+
+    selected = [
+        FunctionCallExpr("count", "count", ()),
+        FunctionCallExpr(
+            "p95", "quantile(0.95)", (ColumnExpr(None, None, "duration"),),
+        ),
+        FunctionCallExpr(
+            "failure_rate",
+            "divide",
+            (
+                FunctionCallExpr(
+                    None,
+                    "countIf",
+                    (
+                        binary_condition(
+                            ConditionFunctions.NEQ,
+                            ColumnExpr(None, None, "transaction_status"),
+                            LiteralExpr(None, 0),
+                        ),
+                    ),
+                ),
+                FunctionCallExpr(None, "count", ()),
+            ),
+        ),
+        ColumnExpr("transaction", None, "transaction"),
+    ]
+    return [*selected, condition]
+
+
+PATTERNS: Mapping[str, Pattern[Expression]] = {
+    "tag_equality": condition_pattern(
+        {ConditionFunctions.EQ, ConditionFunctions.NEQ},
+        FunctionCall(
+            String("ifNull"),
+            (
+                Param("tag", SubscriptableReference(String("tags"))),
+                Literal(String("")),
+            ),
+        ),
+        Param("value", Literal(Any(str))),
+        commutative=True,
+    ),
+    "project_in": is_in_condition_pattern(Column(None, String("project_id"))),
+    "any_binary_condition": Or(
+        [
+            FunctionCall(String(op), (AnyExpression(), AnyExpression()))
+            for op in (
+                ConditionFunctions.EQ,
+                ConditionFunctions.NEQ,
+                ConditionFunctions.LT,
+                ConditionFunctions.LTE,
+                ConditionFunctions.GT,
+                ConditionFunctions.GTE,
+                ConditionFunctions.LIKE,
+                ConditionFunctions.NOT_LIKE,
+            )
+        ]
+    ),
+    "aggregate_on_column": FunctionCall(
+        Param("function", Any(str)), (Param("column", Column()),)
+    ),
+}
+
+
+def all_nodes(expressions: Iterable[Expression]) -> Sequence[Expression]:
+    return [node for expression in expressions for node in expression]
+
+
+def main() -> None:
+    nodes = all_nodes(build_discover_ast(conditions=30))
+    print(f"{len(nodes)} nodes")
+    for name, pattern in PATTERNS.items():
+
+        def run(pattern: Pattern[Expression] = pattern) -> None:
+            for node in nodes:
+                pattern.match(node)
+
+        runs = 200
+        best = min(timeit.repeat(run, number=runs, repeat=5)) / runs
+        print(f"{name:<24} {best * 1e6 / len(nodes):8.3f} us per node")
+
+
+if __name__ == "__main__":
+    main()
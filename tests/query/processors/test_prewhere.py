@@ -1,7 +1,9 @@
+from copy import deepcopy
 from typing import Any, MutableMapping, Optional, Sequence
 
 import pytest
 from snuba import settings
+from snuba.clickhouse.statistics import ColumnStatistics, TableStatisticsCache
 from snuba.datasets.factory import get_dataset
 from snuba.datasets.plans.translator.query import identity_translate
 from snuba.datasets.storages.errors_common import all_columns
@@ -195,3 +197,44 @@ def test_prewhere(
 
     assert query.get_condition() == new_ast_condition
     assert query.get_prewhere_ast() == new_prewhere_ast_condition
+
+
+def test_prewhere_with_statistics() -> None:
+    settings.MAX_PREWHERE_CONDITIONS = 1
+    events = get_dataset("events")
+    query = identity_translate(
+        parse_query(
+            {
+                "selected_columns": ["message"],
+                "conditions": [["environment", "=", "prod"], ["group_id", "=", 1]],
+            },
+            events,
+        )
+    )
+    query.set_from_clause(Table("my_table", all_columns))
+
+    statistics = TableStatisticsCache(
+        lambda table, columns: {
+            "environment": ColumnStatistics(1000, distinct_values=2),
+            "group_id": ColumnStatistics(8000, distinct_values=10000),
+            "message": ColumnStatistics(10000000),
+        }
+    )
+    processor = PrewhereProcessor(["environment", "group_id"], statistics=statistics)
+
+    # No statistics yet, the static order wins.
+    static_query = deepcopy(query)
+    processor.process_query(static_query, HTTPRequestSettings())
+    assert static_query.get_prewhere_ast() == FunctionCall(
+        None,
+        OPERATOR_TO_FUNCTION["="],
+        (Column("_snuba_environment", None, "environment"), Literal(None, "prod")),
+    )
+
+    statistics.refresh("my_table")
+    processor.process_query(query, HTTPRequestSettings())
+    assert query.get_prewhere_ast() == FunctionCall(
+        None,
+        OPERATOR_TO_FUNCTION["="],
+        (Column("_snuba_group_id", None, "group_id"), Literal(None, 1)),
+    )
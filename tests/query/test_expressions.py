@@ -177,6 +177,37 @@ def test_subscriptable() -> None:
     assert list(replaced) == [c1, l2, SubscriptableReference("alias", c1, l2)]
 
 
+def test_transform_preserves_unchanged_nodes() -> None:
+    c1 = Column(None, "t1", "c1")
+    c2 = Column(None, "t1", "c2")
+    f1 = FunctionCall(None, "f1", (c1, Literal(None, 1)))
+    f2 = FunctionCall(None, "f2", (c2,))
+    lambda_exp = Lambda(None, ("x",), FunctionCall(None, "f3", (Argument(None, "x"),)))
+    tree = CurriedFunctionCall(
+        None,
+        FunctionCall(None, "topK", (Literal(None, 5),)),
+        (f1, f2, SubscriptableReference("s", c1, Literal(None, "key")), lambda_exp),
+    )
+
+    assert tree.transform(lambda e: e) is tree
+
+    def replace_c2(e: Expression) -> Expression:
+        if isinstance(e, Column) and e.column_name == "c2":
+            return Column(None, "t1", "c3")
+        return e
+
+    transformed = tree.transform(replace_c2)
+    assert isinstance(transformed, CurriedFunctionCall)
+    assert transformed is not tree
+    assert transformed.internal_function is tree.internal_function
+    assert transformed.parameters[0] is f1
+    assert transformed.parameters[1] == FunctionCall(
+        None, "f2", (Column(None, "t1", "c3"),)
+    )
+    assert transformed.parameters[2] is tree.parameters[2]
+    assert transformed.parameters[3] is lambda_exp
+
+
 def test_hash() -> None:
     """
     Ensures expressions are hashable
@@ -0,0 +1,81 @@
+import pickle
+
+from snuba.clickhouse.columns import ColumnSet
+from snuba.clickhouse.query import Query
+from snuba.query import SelectedExpression
+from snuba.query.composite import CompositeQuery
+from snuba.query.data_source.simple import Table
+from snuba.query.expressions import Column, FunctionCall, Literal
+from snuba.query.interning import ExpressionInterner
+
+
+def test_cached_hash() -> None:
+    expression = FunctionCall(None, "f", (Column(None, None, "a"), Literal(None, 1)))
+    assert hash(expression) == hash(
+        (None, "f", (Column(None, None, "a"), Literal(None, 1)))
+    )
+    assert hash(expression) == hash(expression)
+
+    # The cached hash is not carried over to another process.
+    unpickled = pickle.loads(pickle.dumps(expression))
+    assert unpickled == expression
+    assert "_cached_hash" not in unpickled.__dict__
+    assert hash(unpickled) == hash(expression)
+
+
+def test_intern_expressions() -> None:
+    interner = ExpressionInterner()
+
+    def build() -> FunctionCall:
+        return FunctionCall(
+            None,
+            "and",
+            (
+                FunctionCall(
+                    None, "equals", (Column(None, None, "a"), Literal(None, True))
+                ),
+                FunctionCall(
+                    None, "equals", (Column(None, None, "a"), Literal(None, 1))
+                ),
+            ),
+        )
+
+    first = interner.intern(build())
+    second = interner.intern(build())
+
+    assert first == build()
+    assert second is first
+
+    assert isinstance(first, FunctionCall)
+    left, right = first.parameters
+    assert isinstance(left, FunctionCall) and isinstance(right, FunctionCall)
+    assert left.parameters[0] is right.parameters[0]
+    # True and 1 are equal but they cannot be replaced with each other.
+    assert left is not right
+    assert left.parameters[1] is not right.parameters[1]
+    assert left.parameters[1] == Literal(None, True)
+
+
+def test_intern_query() -> None:
+    interner = ExpressionInterner()
+    inner = Query(
+        Table("my_table", ColumnSet([])),
+        selected_columns=[SelectedExpression("a", Column("a", None, "a"))],
+        condition=FunctionCall(
+            None, "equals", (Column("a", None, "a"), Literal(None, 1))
+        ),
+    )
+    query = CompositeQuery(
+        from_clause=inner,
+        selected_columns=[SelectedExpression("a", Column("a", None, "a"))],
+    )
+
+    interner.intern_query(query)
+
+    condition = inner.get_condition()
+    assert isinstance(condition, FunctionCall)
+    assert condition.parameters[0] is inner.get_selected_columns()[0].expression
+    assert (
+        query.get_selected_columns()[0].expression
+        is inner.get_selected_columns()[0].expression
+    )
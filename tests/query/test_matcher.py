@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+from typing import Any as AnyType
 from typing import Optional
 
 import pytest
@@ -13,6 +15,7 @@ from snuba.query.matchers import (
     AnyOptionalString,
     Column,
     FunctionCall,
+    Integer,
     Literal,
     MatchResult,
     OptionalString,
@@ -374,3 +377,76 @@ def test_accessors() -> None:
         None, "second_name", tuple()
     )
     assert result.scalar("second_function_name") == "second_name"
+
+
+def test_compiled_pattern_is_memoized() -> None:
+    pattern = FunctionCall(String("f"), (Param("col", Column()),))
+    assert pattern.compile() is pattern.compile()
+    # The cache is not part of the value of the pattern.
+    assert pattern == FunctionCall(String("f"), (Param("col", Column()),))
+    assert hash(pattern) == hash(FunctionCall(String("f"), (Param("col", Column()),)))
+
+
+def test_or_preserves_order_of_alternatives() -> None:
+    pattern = Or(
+        [
+            Param("first", FunctionCall(String("f"), (Literal(Integer(1)),))),
+            Param("any_function", FunctionCall(None, (Literal(Integer(2)),))),
+            Param("second", FunctionCall(Or([String("f"), String("g")]), None)),
+            Param("column", Column(None, String("c"))),
+        ]
+    )
+
+    def first_param(expression: Expression) -> Optional[str]:
+        result = pattern.match(expression)
+        return next(iter(result.results)) if result is not None else None
+
+    assert first_param(FunctionCallExpr(None, "f", (LiteralExpr(None, 1),))) == "first"
+    assert (
+        first_param(FunctionCallExpr(None, "f", (LiteralExpr(None, 2),)))
+        == "any_function"
+    )
+    assert (
+        first_param(FunctionCallExpr(None, "h", (LiteralExpr(None, 2),)))
+        == "any_function"
+    )
+    assert first_param(FunctionCallExpr(None, "g", (LiteralExpr(None, 3),))) == "second"
+    assert first_param(FunctionCallExpr(None, "h", (LiteralExpr(None, 3),))) is None
+    assert first_param(ColumnExpr(None, None, "c")) == "column"
+    assert first_param(LiteralExpr(None, 1)) is None
+
+
+def test_or_discards_parameters_of_failed_alternatives() -> None:
+    pattern = Or(
+        [
+            FunctionCall(String("f"), (Param("column", Column()), Literal(Integer(1)))),
+            FunctionCall(String("f"), (AnyExpression(), Param("literal", Literal()))),
+        ]
+    )
+
+    result = pattern.match(
+        FunctionCallExpr(None, "f", (ColumnExpr(None, None, "c"), LiteralExpr(None, 2)))
+    )
+    assert result == MatchResult({"literal": LiteralExpr(None, 2)})
+
+
+@dataclass(frozen=True)
+class Even(Pattern[int]):
+    """
+    A pattern that only implements match, like the ones defined outside
+    of the matchers module.
+    """
+
+    def match(self, node: AnyType) -> Optional[MatchResult]:
+        return MatchResult() if isinstance(node, int) and node % 2 == 0 else None
+
+
+def test_custom_patterns_in_compiled_patterns() -> None:
+    pattern = FunctionCall(
+        Or([String("f"), String("g")]), (Literal(Param("value", Even())),),
+    )
+
+    assert pattern.match(FunctionCallExpr(None, "g", (LiteralExpr(None, 2),))) == (
+        MatchResult({"value": 2})
+    )
+    assert pattern.match(FunctionCallExpr(None, "g", (LiteralExpr(None, 3),))) is None
@@ -1,8 +1,9 @@
 from snuba.clickhouse.columns import Any, ColumnSet
 from snuba.clickhouse.query import Query
 from snuba.query import LimitBy, SelectedExpression
+from snuba.query.composite import CompositeQuery
 from snuba.query.data_source.simple import Table
-from snuba.query.expressions import Column, FunctionCall
+from snuba.query.expressions import Column, Expression, FunctionCall, Literal
 
 
 def test_query_parameters() -> None:
@@ -77,3 +78,78 @@ def test_query_experiments() -> None:
 
     query.set_experiments({"optimization3": 0.5})
     assert query.get_experiments() == {"optimization3": 0.5}
+
+
+def test_query_clone() -> None:
+    condition = FunctionCall(
+        None, "equals", (Column(None, None, "col1"), Literal(None, "a"))
+    )
+    query = Query(
+        Table("my_table", ColumnSet([])),
+        selected_columns=[SelectedExpression("col1", Column("col1", None, "col1"))],
+        condition=condition,
+        groupby=[Column("col1", None, "col1")],
+        prewhere=condition,
+    )
+    query.add_experiment("optimization", True)
+
+    clone = query.clone()
+    assert clone == query
+    assert clone is not query
+    # Expressions are shared, not copied
+    assert clone.get_condition() is condition
+    assert clone.get_prewhere_ast() is condition
+    assert clone.get_selected_columns()[0] is query.get_selected_columns()[0]
+
+    clone.set_ast_condition(None)
+    clone.add_experiment("optimization", False)
+    clone.set_limit(10)
+    clone.transform_expressions(
+        lambda e: Column("col2", None, "col2")
+        if isinstance(e, Column) and e.column_name == "col1"
+        else e
+    )
+
+    assert query.get_condition() is condition
+    assert query.get_experiment_value("optimization") is True
+    assert query.get_limit() is None
+    assert query.get_selected_columns() == [
+        SelectedExpression("col1", Column("col1", None, "col1")),
+    ]
+    assert query.get_groupby() == [Column("col1", None, "col1")]
+    assert clone.get_groupby() == [Column("col2", None, "col2")]
+
+
+def test_composite_query_clone() -> None:
+    inner = Query(
+        Table("my_table", ColumnSet([])),
+        selected_columns=[SelectedExpression("col1", Column("col1", None, "col1"))],
+    )
+    query = CompositeQuery(
+        from_clause=inner,
+        selected_columns=[SelectedExpression("col1", Column("col1", None, "col1"))],
+    )
+
+    clone = query.clone()
+    assert clone == query
+    cloned_inner = clone.get_from_clause()
+    assert isinstance(cloned_inner, Query)
+    assert cloned_inner is not inner
+
+    cloned_inner.set_limit(10)
+    assert inner.get_limit() is None
+
+
+def test_transform_preserves_unchanged_nodes() -> None:
+    selected = SelectedExpression("col1", Column("col1", None, "col1"))
+    limitby = LimitBy(10, Column(None, None, "col2"))
+    query = Query(
+        Table("my_table", ColumnSet([])), selected_columns=[selected], limitby=limitby,
+    )
+
+    def identity(e: Expression) -> Expression:
+        return e
+
+    query.transform_expressions(identity)
+    assert query.get_selected_columns()[0] is selected
+    assert query.get_limitby() is limitby
@@ -0,0 +1,114 @@
+from typing import Mapping, MutableSequence, Optional
+from unittest import mock
+
+from snuba.clickhouse.formatter.nodes import FormattedQuery
+from snuba.querylog.query_log_collector import QueryLogCollector
+from snuba.querylog.query_metadata import (
+    ClickhouseQueryMetadata,
+    QueryStatus,
+    SnubaQueryMetadata,
+)
+from snuba.reader import Reader, Result, Row
+from snuba.utils.metrics.timer import Timer
+
+
+class FakeReader(Reader):
+    def __init__(self, rows: MutableSequence[Row]) -> None:
+        self.rows = rows
+        self.queries: MutableSequence[str] = []
+
+    def execute(
+        self,
+        query: FormattedQuery,
+        settings: Optional[Mapping[str, str]] = None,
+        with_totals: bool = False,
+        robust: bool = False,
+    ) -> Result:
+        self.queries.append(query.get_sql())
+        return {"meta": [], "data": self.rows}
+
+
+def build_metadata(*query_ids: str) -> SnubaQueryMetadata:
+    return SnubaQueryMetadata(
+        request=mock.Mock(),
+        dataset="events",
+        timer=Timer("test"),
+        query_list=[
+            ClickhouseQueryMetadata(
+                sql="SELECT 1",
+                sql_anonymized="SELECT $N",
+                stats={"query_id": query_id, "clickhouse_table": "errors_local"},
+                status=QueryStatus.SUCCESS,
+                profile=mock.Mock(),
+            )
+            for query_id in query_ids
+        ],
+    )
+
+
+def build_row(query_id: str, start: int, read_rows: int) -> Row:
+    return {
+        "query_id": query_id,
+        "start": start,
+        "read_rows": read_rows,
+        "read_bytes": read_rows * 8,
+        "memory_usage": 1024,
+        "event_names": ["SelectedMarks", "ContextLock"],
+        "event_values": [3, 20],
+    }
+
+
+def test_collect_query_log() -> None:
+    collector = QueryLogCollector(
+        delay=10, interval=3600, max_attempts=2, max_pending=10, batch_size=10
+    )
+    # The same query ran earlier, it must not be picked.
+    reader = FakeReader([build_row("a", 900, 1), build_row("a", 1000, 100)])
+    metadata = build_metadata("a", "b")
+    collector.track(metadata, reader, "a", 1000.5)
+    collector.track(metadata, reader, "b", 1000.5)
+
+    recorded = []
+    assert collector.defer(metadata, lambda: recorded.append(metadata.to_dict()))
+    assert not collector.defer(build_metadata("c"), lambda: None)
+
+    # Not due yet.
+    collector.collect(1005)
+    assert reader.queries == []
+
+    collector.collect(1011)
+    assert len(reader.queries) == 1
+    assert "query_id IN ('a', 'b')" in reader.queries[0]
+    assert recorded == []
+
+    # "b" is never found, the query is recorded once it is given up.
+    collector.collect(1016)
+    assert len(reader.queries) == 2
+    assert len(recorded) == 1
+    assert recorded[0]["query_list"][0]["stats"] == {
+        "query_id": "a",
+        "clickhouse_table": "errors_local",
+        "read_rows": 100,
+        "read_bytes": 800,
+        "memory_usage": 1024,
+        "profile_events": {"SelectedMarks": 3},
+    }
+    assert "read_rows" not in recorded[0]["query_list"][1]["stats"]
+
+    collector.collect(1030)
+    assert len(reader.queries) == 2
+    assert len(recorded) == 1
+
+
+def test_max_pending() -> None:
+    collector = QueryLogCollector(
+        delay=10, interval=3600, max_attempts=1, max_pending=1, batch_size=10
+    )
+    reader = FakeReader([])
+    metadata = build_metadata("a")
+    collector.track(metadata, reader, "a", 1000)
+    other = build_metadata("b")
+    collector.track(other, reader, "b", 1000)
+
+    assert collector.defer(metadata, lambda: None)
+    assert not collector.defer(other, lambda: None)
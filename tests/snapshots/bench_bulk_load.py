@@ -0,0 +1,119 @@
+"""
+Benchmarks the two ways of transforming a snapshot of the groupedmessage
+table into data ready to be written into ClickHouse: one row at a time,
+through GroupedMessageRow and JSON rows, and in blocks of columns, through
+GroupedMessageBlockProcessor and CSV.
+
+This is not collected by pytest. Run it with:
+
+    python -m tests.snapshots.bench_bulk_load [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from snuba import settings
+from snuba.clickhouse.http import JSONRowEncoder
+from snuba.datasets.cdc.groupedmessage_processor import (
+    GroupedMessageBlockProcessor,
+    GroupedMessageRow,
+)
+from snuba.snapshots.loaders.single_table import encode_csv_block
+from snuba.snapshots.postgres_snapshot import PostgresSnapshot
+
+TABLE = "sentry_groupedmessage"
+
+META_FILE = """
+{
+    "snapshot_id": "50a86ad6-b4b7-11e9-a46f-acde48001122",
+    "product": "snuba",
+    "transactions": {"xmin": 3372750, "xmax": 3372754, "xip_list": []},
+    "content": [
+        {
+            "table": "sentry_groupedmessage",
+            "zip": false,
+            "columns": [
+                {"name": "project_id"},
+                {"name": "id"},
+                {"name": "status"},
+                {"name": "last_seen"},
+                {"name": "first_seen"},
+                {"name": "active_at"},
+                {"name": "first_release_id"}
+            ]
+        }
+    ],
+    "start_timestamp": 1564703503.682226
+}
+"""
+
+
+def write_snapshot(path: str, rows: int) -> None:
+    os.makedirs(os.path.join(path, "tables"))
+    with open(os.path.join(path, "metadata.json"), "w") as metadata:
+        metadata.write(META_FILE)
+    with open(os.path.join(path, "tables", f"{TABLE}.csv"), "w") as table:
+        table.write(
+            "project_id,id,status,last_seen,first_seen,active_at,first_release_id\n"
+        )
+        for i in range(rows):
+            table.write(
+                f"{i % 100},{i},{i % 3},"
+                f"2019-07-01 18:03:{i % 60:02d}.{i % 1000000:06d}+00,"
+                f"2019-06-01 11:{i % 60:02d}:07+00,"
+                f"{'2019-06-25 22:15:57.6+00' if i % 2 else ''},"
+                f"{i % 7 or ''}\n"
+            )
+
+
+def row_path(snapshot: PostgresSnapshot) -> int:
+    encoder = JSONRowEncoder()
+    size = 0
+    with snapshot.get_parsed_table_file(TABLE) as table:
+        for row in table:
+            size += len(
+                encoder.encode(GroupedMessageRow.from_bulk(row).to_clickhouse())
+            )
+    return size
+
+
+def block_path(snapshot: PostgresSnapshot) -> int:
+    processor = GroupedMessageBlockProcessor()
+    size = 0
+    with snapshot.get_table_file_blocks(TABLE, settings.BULK_LOAD_BLOCK_SIZE) as blocks:
+        for block in blocks:
+            size += len(encode_csv_block(processor.process_block(block)))
+    return size
+
+
+def measure(
+    name: str,
+    path: Callable[[PostgresSnapshot], int],
+    snapshot: PostgresSnapshot,
+    rows: int,
+) -> None:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        size = path(snapshot)
+        best = min(best, time.perf_counter() - start)
+    print(
+        f"{name:<8} {best:8.3f} s {rows / best:12,.0f} rows/s {size / rows:6.1f} bytes/row"
+    )
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as path:
+        snapshot_path = os.path.join(path, "snapshot")
+        write_snapshot(snapshot_path, rows)
+        snapshot = PostgresSnapshot.load("snuba", snapshot_path)
+        print(f"{rows} rows")
+        measure("rows", row_path, snapshot, rows)
+        measure("blocks", block_path, snapshot, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import csv
+import json
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+from snuba.clickhouse.http import JSONRow, JSONRowEncoder
+from snuba.clickhouse.native import Params
+from snuba.snapshots import ColumnBlock
+from snuba.snapshots.loaders.checkpoint import BulkLoadCheckpoint
+from snuba.snapshots.loaders.single_table import BlockProcessor, SingleTableBulkLoader
+from snuba.snapshots.postgres_snapshot import PostgresSnapshot
+from snuba.writer import BatchWriter, BufferedWriterWrapper, WriterTableRow
+from tests.clusters.fake_cluster import FakeClickhousePool
+
+META_FILE = """
+{
+    "snapshot_id": "50a86ad6-b4b7-11e9-a46f-acde48001122",
+    "product": "snuba",
+    "transactions": {"xmin": 3372750, "xmax": 3372754, "xip_list": []},
+    "content": [
+        {
+            "table": "sentry_groupedmessage",
+            "zip": false,
+            "columns": [{"name": "id"}, {"name": "status"}]
+        }
+    ],
+    "start_timestamp": 1564703503.682226
+}
+"""
+
+
+class DestinationPool(FakeClickhousePool):
+    def execute(
+        self,
+        query: str,
+        params: Params = None,
+        with_column_types: bool = False,
+        query_id: Optional[str] = None,
+        settings: Optional[Mapping[str, Any]] = None,
+        types_check: bool = False,
+        columnar: bool = False,
+    ) -> Sequence[Any]:
+        if query == "show tables":
+            return [("groupedmessage_local",)]
+        return [(0,)]
+
+
+class StatusBlockProcessor(BlockProcessor):
+    def get_columns(self) -> Sequence[str]:
+        return ["id", "status"]
+
+    def process_block(self, block: ColumnBlock) -> Sequence[Sequence[str]]:
+        return [block["id"], block["status"]]
+
+
+class FileWriter(BatchWriter[JSONRow]):
+    """
+    Appends rows to a file, since the rows are written by other processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+
+    def write(self, values: Iterable[JSONRow]) -> None:
+        with open(self.__path, "ab") as output:
+            output.write(b"".join(value + b"\n" for value in values))
+
+
+class CSVFileWriter(BatchWriter[bytes]):
+    def __init__(self, path: str) -> None:
+        self.__path = path
+
+    def write(self, values: Iterable[bytes]) -> None:
+        with open(self.__path, "ab") as output:
+            output.write(b"".join(values))
+
+
+def build_snapshot(tmp_path) -> PostgresSnapshot:
+    snapshot_base = tmp_path / "cdc-snapshot"
+    (snapshot_base / "tables").mkdir(parents=True)
+    (snapshot_base / "metadata.json").write_text(META_FILE)
+    (snapshot_base / "tables" / "sentry_groupedmessage.csv").write_text(
+        "id,status\n" + "".join(f"{i},{i % 3}\n" for i in range(100))
+    )
+    return PostgresSnapshot.load("snuba", str(snapshot_base))
+
+
+def test_parallel_load_with_checkpoint(tmp_path) -> None:
+    snapshot = build_snapshot(tmp_path)
+    output = tmp_path / "output"
+
+    def writer_factory() -> BufferedWriterWrapper[JSONRow, WriterTableRow]:
+        return BufferedWriterWrapper(FileWriter(str(output)), 10, JSONRowEncoder())
+
+    loader = SingleTableBulkLoader(
+        source=snapshot,
+        dest_table="groupedmessage_local",
+        source_table="sentry_groupedmessage",
+        row_processor=lambda row: {"id": int(row["id"]), "status": row["status"]},
+        clickhouse=DestinationPool("host"),
+    )
+
+    # Simulates a load interrupted after loading the first range.
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    checkpoint = BulkLoadCheckpoint.open(
+        checkpoint_path,
+        snapshot.get_descriptor().id,
+        "sentry_groupedmessage",
+        lambda: snapshot.get_table_file_ranges("sentry_groupedmessage", 4),
+    )
+    first_range = checkpoint.get_pending_ranges()[0]
+    with snapshot.get_parsed_table_file("sentry_groupedmessage", first_range) as table:
+        already_loaded = {int(row["id"]) for row in table}
+    # The first range starts after the header, with the first rows.
+    assert first_range.start == len("id,status\n")
+    assert 0 < len(already_loaded) < 100
+    assert already_loaded == set(range(len(already_loaded)))
+    checkpoint.complete(first_range)
+
+    progress = []
+    loader.load_parallel(
+        writer_factory,
+        ignore_existing_data=False,
+        progress_callback=progress.append,
+        workers=2,
+        checkpoint_path=checkpoint_path,
+    )
+
+    loaded = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(row["id"] for row in loaded) == sorted(
+        set(range(100)) - already_loaded
+    )
+    assert progress[-1] == snapshot.get_table_file_size("sentry_groupedmessage") - len(
+        "id,status\n"
+    )
+
+    with open(checkpoint_path) as checkpoint_file:
+        content = json.load(checkpoint_file)
+    assert len(content["ranges"]) == 4
+    assert sorted(content["completed"]) == sorted(content["ranges"])
+
+    # Everything is loaded, running again does not load anything.
+    output.unlink()
+    loader.load_parallel(
+        writer_factory,
+        ignore_existing_data=False,
+        progress_callback=None,
+        workers=2,
+        checkpoint_path=checkpoint_path,
+    )
+    assert not output.exists()
+    assert (
+        BulkLoadCheckpoint.open(
+            checkpoint_path,
+            snapshot.get_descriptor().id,
+            "sentry_groupedmessage",
+            list,
+        ).get_pending_ranges()
+        == []
+    )
+
+
+def test_load_blocks(tmp_path) -> None:
+    snapshot = build_snapshot(tmp_path)
+    output = tmp_path / "output"
+
+    loader = SingleTableBulkLoader(
+        source=snapshot,
+        dest_table="groupedmessage_local",
+        source_table="sentry_groupedmessage",
+        row_processor=lambda row: {},
+        clickhouse=DestinationPool("host"),
+        block_processor=StatusBlockProcessor(),
+    )
+    loader.load_blocks(
+        lambda: CSVFileWriter(str(output)),
+        ignore_existing_data=False,
+        progress_callback=None,
+        workers=3,
+        checkpoint_path=None,
+    )
+
+    # Each range is a separate insert, starting with the column names.
+    lines = list(csv.reader(output.read_text().splitlines()))
+    assert lines.count(["id", "status"]) == 3
+    assert sorted((int(id), status) for id, status in lines if id != "id") == [
+        (i, str(i % 3)) for i in range(100)
+    ]
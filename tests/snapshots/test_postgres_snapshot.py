@@ -3,8 +3,12 @@ from snuba.snapshots import (
     DateFormatPrecision,
     DateTimeFormatterConfig,
 )  # NOQA
+from unittest.mock import patch
+
 import pytest
 
+from snuba import settings
+from snuba.snapshots import FileRange
 from snuba.snapshots.postgres_snapshot import PostgresSnapshot
 
 META_FILE = """
@@ -120,3 +124,79 @@ class TestPostgresSnapshot:
             snapshot = PostgresSnapshot.load("snuba", snapshot_base)
             with snapshot.get_parsed_table_file("sentry_groupedmessage") as table:
                 next(table)
+
+    def test_split_table_file(self, tmp_path):
+        rows = [
+            ("0", "1"),
+            ("1", 'a value with\nnew lines and "quotes"\n'),
+            ("2", "2"),
+            ("3", '"quoted"'),
+            ("4", "\n\n"),
+            ("5", "5"),
+        ]
+
+        def escape(value):
+            if '"' in value or "\n" in value:
+                return '"%s"' % value.replace('"', '""')
+            return value
+
+        snapshot_base = self.__prepare_directory(
+            tmp_path,
+            "id,status\n"
+            + "".join(f"{escape(id)},{escape(status)}\n" for id, status in rows),
+        )
+        snapshot = PostgresSnapshot.load("snuba", snapshot_base)
+        size = snapshot.get_table_file_size("sentry_groupedmessage")
+
+        # Forces the boundaries to be searched across several chunks.
+        with patch.object(settings, "BULK_BINARY_LOAD_CHUNK", 7):
+            for count in range(1, 10):
+                ranges = snapshot.get_table_file_ranges("sentry_groupedmessage", count)
+                assert len(ranges) <= count
+                assert ranges[0].start == len("id,status\n")
+                assert ranges[-1].end == size
+                for previous, following in zip(ranges, ranges[1:]):
+                    assert previous.end == following.start
+
+                loaded = []
+                for file_range in ranges:
+                    with snapshot.get_parsed_table_file(
+                        "sentry_groupedmessage", file_range
+                    ) as table:
+                        loaded.extend((row["id"], row["status"]) for row in table)
+                assert loaded == rows
+
+        with snapshot.get_parsed_table_file(
+            "sentry_groupedmessage", FileRange(size, size)
+        ) as table:
+            assert list(table) == []
+
+    def test_table_file_blocks(self, tmp_path):
+        snapshot_base = self.__prepare_directory(
+            tmp_path, "id,status\n" + "".join(f'{i},"status\n{i}"\n' for i in range(7)),
+        )
+        snapshot = PostgresSnapshot.load("snuba", snapshot_base)
+
+        with snapshot.get_table_file_blocks("sentry_groupedmessage", 3) as blocks:
+            assert [dict(block) for block in blocks] == [
+                {
+                    "id": ("0", "1", "2"),
+                    "status": ("status\n0", "status\n1", "status\n2"),
+                },
+                {
+                    "id": ("3", "4", "5"),
+                    "status": ("status\n3", "status\n4", "status\n5"),
+                },
+                {"id": ("6",), "status": ("status\n6",)},
+            ]
+
+        ranges = snapshot.get_table_file_ranges("sentry_groupedmessage", 2)
+        with snapshot.get_table_file_blocks(
+            "sentry_groupedmessage", 100, ranges[1]
+        ) as blocks:
+            with snapshot.get_parsed_table_file(
+                "sentry_groupedmessage", ranges[1]
+            ) as table:
+                assert [value for block in blocks for value in block["id"]] == [
+                    row["id"] for row in table
+                ]
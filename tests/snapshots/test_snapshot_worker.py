@@ -1,11 +1,13 @@
+import pickle
 from datetime import datetime
 from typing import Optional
+from unittest.mock import patch
 from uuid import uuid1
 
 import pytest
 import pytz
 
-from snuba.consumers.snapshot_worker import SnapshotProcessor
+from snuba.consumers.snapshot_worker import SnapshotProcessor, XipList
 from snuba.consumers.types import KafkaMessageMetadata
 from snuba.datasets.cdc.types import InsertEvent
 from snuba.datasets.storages import StorageKey
@@ -14,6 +16,8 @@ from snuba.processor import InsertBatch, ProcessedMessage
 from snuba.snapshots import SnapshotId
 from snuba.snapshots.postgres_snapshot import Xid
 from snuba.stateful_consumer.control_protocol import TransactionData
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from tests.backends.metrics import Gauge, Increment, TestingMetricsBackend
 
 
 def get_insert_event(xid: int) -> InsertEvent:
@@ -139,3 +143,57 @@ def test_send_message(xid: int, expected: Optional[ProcessedMessage]) -> None:
     )
 
     assert ret == expected
+
+
+def test_xip_list() -> None:
+    xip_list = XipList([Xid(130), Xid(120), Xid(125), Xid(120)])
+    assert len(xip_list) == 3
+    assert [xid for xid in range(110, 140) if xid in xip_list] == [120, 125, 130]
+    assert 120 not in XipList([])
+
+
+def test_catch_up_progress() -> None:
+    processor = (
+        get_writable_storage(StorageKey.GROUPEDMESSAGES)
+        .get_table_writer()
+        .get_stream_loader()
+        .get_processor()
+    )
+    worker = SnapshotProcessor(
+        processor=processor,
+        snapshot_id=SnapshotId(str(uuid1())),
+        transaction_data=TransactionData(
+            xmin=Xid(100), xmax=Xid(200), xip_list=[Xid(120), Xid(130)]
+        ),
+    )
+    backend = TestingMetricsBackend()
+    with patch(
+        "snuba.consumers.snapshot_worker.metrics",
+        MetricsWrapper(backend, "snapshot_consumer"),
+    ):
+        # A parallel catch up pickles the processor with every batch, and
+        # a transaction can span two batches.
+        for batch in [[110, 110, 120], [120, 150, 210], [210, 110]]:
+            batch_worker = pickle.loads(pickle.dumps(worker))
+            for xid in batch:
+                batch_worker.process_message(
+                    get_insert_event(xid),
+                    KafkaMessageMetadata(
+                        offset=1, partition=0, timestamp=datetime.now()
+                    ),
+                )
+
+    assert backend.calls == [
+        Gauge("snapshot_consumer.catch_up_progress", 0.1, None),
+        Increment("snapshot_consumer.catch_up_skipped_messages", 1, None),
+        Gauge("snapshot_consumer.catch_up_progress", 0.1, None),
+        Increment("snapshot_consumer.catch_up_skipped_messages", 1, None),
+        Gauge("snapshot_consumer.catch_up_progress", 0.2, None),
+        Increment("snapshot_consumer.catch_up_applied_messages", 1, None),
+        Gauge("snapshot_consumer.catch_up_progress", 0.2, None),
+        Increment("snapshot_consumer.catch_up_applied_messages", 1, None),
+        Gauge("snapshot_consumer.catch_up_progress", 0.5, None),
+        Increment("snapshot_consumer.catch_up_skipped_messages", 1, None),
+        Gauge("snapshot_consumer.catch_up_progress", 0.1, None),
+        Increment("snapshot_consumer.catch_up_skipped_messages", 1, None),
+    ]
@@ -4,16 +4,22 @@ import random
 import time
 from concurrent.futures import Future, ThreadPoolExecutor
 from functools import partial
-from threading import Thread
-from typing import Any, Callable, Iterator
+from threading import Event, Thread
+from typing import Any, Callable, Iterator, MutableMapping
 from unittest import mock
 
 import pytest
+import simplejson as json
 
 from snuba.redis import redis_client
-from snuba.state.cache.abstract import Cache, ExecutionError, ExecutionTimeoutError
-from snuba.state.cache.redis.backend import RedisCache
-from snuba.utils.codecs import PassthroughCodec
+from snuba.state.cache.abstract import (
+    Cache,
+    ExecutionAbandonedError,
+    ExecutionError,
+    ExecutionTimeoutError,
+)
+from snuba.state.cache.redis.backend import RESULT_EXECUTE, RESULT_WAIT, RedisCache
+from snuba.utils.codecs import Codec, PassthroughCodec
 from tests.assertions import assert_changes, assert_does_not_change
 
 
@@ -73,10 +79,12 @@ def test_get_readthrough_missed_deadline(backend: Cache[bytes]) -> None:
         time.sleep(1.5)
         return value
 
+    cancel = mock.Mock()
     with pytest.raises(TimeoutError):
-        backend.get_readthrough(key, function, noop, 1)
+        backend.get_readthrough(key, function, noop, 1, cancel=cancel)
 
     assert backend.get(key) is None
+    assert cancel.call_count == 1
 
 
 def test_get_readthrough_exception(backend: Cache[bytes]) -> None:
@@ -159,3 +167,97 @@ def test_get_readthrough_set_wait_timeout(backend: Cache[bytes]) -> None:
 
     with pytest.raises(ExecutionTimeoutError):
         waiter_slow.result()
+
+
+def test_get_readthrough_abandoned(backend: Cache[bytes]) -> None:
+    key = "key"
+    value = b"value"
+    abandoned = Event()
+    cancel = mock.Mock()
+
+    def function() -> bytes:
+        time.sleep(2)
+        return value
+
+    def setter() -> bytes:
+        return backend.get_readthrough(
+            key, function, noop, 10, abandoned=abandoned, cancel=cancel
+        )
+
+    def waiter() -> bytes:
+        return backend.get_readthrough(key, function, noop, 10)
+
+    # Another client waits for the value, so it is still computed.
+    setter_result = execute(setter)
+    time.sleep(0.1)
+    waiter_result = execute(waiter)
+    time.sleep(0.1)
+    abandoned.set()
+
+    assert setter_result.result() == value
+    assert waiter_result.result() == value
+    assert cancel.call_count == 0
+
+    # Nobody waits for the value.
+    redis_client.flushdb()
+    start = time.time()
+    with pytest.raises(ExecutionAbandonedError):
+        setter()
+
+    assert time.time() - start < 1
+    assert backend.get(key) is None
+    assert cancel.call_count == 1
+
+
+def test_get_readthrough_coalesced(backend: Cache[bytes]) -> None:
+    key = "key"
+    value = b"value"
+    function = mock.MagicMock(side_effect=lambda: time.sleep(0.5) or value)
+    hit_types = mock.Mock()
+
+    def worker() -> bytes:
+        return backend.get_readthrough(key, function, hit_types, 10)
+
+    with mock.patch.object(
+        redis_client, "blpop", side_effect=AssertionError("waited on Redis")
+    ):
+        results = [execute(worker) for _ in range(5)]
+        assert [result.result() for result in results] == [value] * 5
+
+    assert function.call_count == 1
+    assert sorted(call.args[0] for call in hit_types.call_args_list) == [
+        RESULT_EXECUTE,
+        RESULT_WAIT,
+        RESULT_WAIT,
+        RESULT_WAIT,
+        RESULT_WAIT,
+    ]
+
+
+class JSONCodec(Codec[bytes, MutableMapping[str, Any]]):
+    def encode(self, value: MutableMapping[str, Any]) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    def decode(self, value: bytes) -> MutableMapping[str, Any]:
+        decoded: MutableMapping[str, Any] = json.loads(value)
+        return decoded
+
+
+def test_get_readthrough_coalesced_copies() -> None:
+    backend: Cache[MutableMapping[str, Any]] = RedisCache(
+        redis_client, "test", JSONCodec(), ThreadPoolExecutor()
+    )
+    function = mock.MagicMock(side_effect=lambda: time.sleep(0.5) or {"data": [1]})
+
+    def worker() -> MutableMapping[str, Any]:
+        result = backend.get_readthrough("key", function, noop, 10)
+        # Callers mutate the results they get, like the API does.
+        result["data"].append(2)
+        return result
+
+    try:
+        results = [execute(worker) for _ in range(3)]
+        assert [result.result() for result in results] == [{"data": [1, 2]}] * 3
+        assert function.call_count == 1
+    finally:
+        redis_client.flushdb()
@@ -1,7 +1,10 @@
 import signal
 import subprocess
+import sys
 import time
 
+import click
+
 
 class TestCli(object):
     def test_consumer_cli(self) -> None:
@@ -15,3 +18,27 @@ class TestCli(object):
 
         proc.send_signal(signal.SIGINT)
         proc.wait()
+
+    def test_commands_are_loaded_lazily(self) -> None:
+        from snuba.cli import main
+
+        assert "bulk-load" in main.list_commands(click.Context(main))
+        assert main.get_command(click.Context(main), "unknown") is None
+
+        # Only the invoked command is imported.
+        code = (
+            "import sys; from snuba.cli import main; "
+            "main.get_command(None, 'config'); "
+            "print(sorted(m for m in sys.modules if m.startswith('snuba.cli.')))"
+        )
+        output = subprocess.check_output([sys.executable, "-c", code])
+        assert output.decode("utf-8").strip() == "['snuba.cli.config']"
+
+    def test_parse_import_times(self) -> None:
+        from snuba.cli.debug import ImportTime, parse_import_times
+
+        assert parse_import_times(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       225 |        225 |   _io\n"
+            "import time:      1500 |       1725 | snuba.cli\n"
+        ) == [ImportTime("_io", 225, 225), ImportTime("snuba.cli", 1500, 1725)]
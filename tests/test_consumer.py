@@ -4,7 +4,7 @@ import json
 import pickle
 from datetime import datetime
 from pickle import PickleBuffer
-from typing import MutableSequence, Optional
+from typing import Any, Mapping, MutableSequence, Optional
 from unittest.mock import Mock, call
 
 import pytest
@@ -21,13 +21,14 @@ from snuba.consumers.consumer import (
     ReplacementBatchWriter,
     process_message,
 )
+from snuba.datasets.metrics_processor import CounterMetricsAggregator
 from snuba.datasets.schemas.tables import TableSchema
 from snuba.datasets.storage import Storage
 from snuba.processor import InsertBatch, ReplacementBatch
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from tests.assertions import assert_changes
 from tests.backends.confluent_kafka import FakeConfluentKafkaProducer
-from tests.backends.metrics import TestingMetricsBackend, Timing
+from tests.backends.metrics import Increment, TestingMetricsBackend, Timing
 
 
 def test_streaming_consumer_strategy() -> None:
@@ -123,6 +124,55 @@ def test_json_row_batch_pickle_out_of_band() -> None:
     assert pickle.loads(data, buffers=[b.raw() for b in buffers]) == batch
 
 
+def test_insert_batch_writer_aggregates_rows() -> None:
+    def build_row(offset: int, second: int, value: float) -> Mapping[str, Any]:
+        return {
+            "org_id": 1,
+            "project_id": 2,
+            "metric_id": 3,
+            "timestamp": datetime(2021, 1, 1, 11, 0, second),
+            "tags.key": [10],
+            "tags.value": [11],
+            "value": value,
+            "materialization_version": 0,
+            "retention_days": 30,
+            "partition": 1,
+            "offset": offset,
+        }
+
+    partition = Partition(Topic("metrics"), 0)
+    writer = Mock()
+    metrics = TestingMetricsBackend()
+    step = InsertBatchWriter(
+        writer, MetricsWrapper(metrics, "insertions"), CounterMetricsAggregator()
+    )
+    step.submit(
+        Message(
+            partition,
+            0,
+            InsertBatch([build_row(0, 1, 1.0), build_row(1, 2, 2.0)], None),
+            datetime.now(),
+        )
+    )
+    step.submit(
+        Message(partition, 1, InsertBatch([build_row(2, 3, 4.0)], None), datetime.now())
+    )
+    step.submit(
+        Message(partition, 2, JSONRowInsertBatch([b"{}"], None), datetime.now())
+    )
+    step.close()
+
+    (rows,), _ = writer.write.call_args
+    assert [json.loads(row) for row in rows] == [
+        {},
+        {**build_row(2, 0, 7.0), "timestamp": "2021-01-01 11:00:00"},
+    ]
+    assert [call for call in metrics.calls if isinstance(call, Increment)] == [
+        Increment("insertions.rows_aggregated", 3, None),
+        Increment("insertions.rows_after_aggregation", 1, None),
+    ]
+
+
 def get_row_count(storage: Storage) -> int:
     schema = storage.get_schema()
     assert isinstance(schema, TableSchema)
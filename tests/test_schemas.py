@@ -0,0 +1,97 @@
+from typing import Any, MutableMapping
+
+import jsonschema
+import pytest
+
+from snuba.datasets.entities import EntityKey
+from snuba.datasets.entities.factory import get_entity
+from snuba.request import Language
+from snuba.request.request_settings import HTTPRequestSettings
+from snuba.request.schema import RequestSchema
+from snuba.schemas import JsonSchemaValidator
+
+SCHEMA: MutableMapping[str, Any] = {
+    "type": "object",
+    "properties": {
+        "limit": {"type": "integer", "default": 1000},
+        "groupby": {"type": "array", "default": []},
+        "settings": {
+            "type": "object",
+            "properties": {"turbo": {"type": "boolean", "default": False}},
+        },
+        "conditions": {"type": "array", "items": {"type": "array"}},
+    },
+    "additionalProperties": False,
+}
+
+
+def test_validator_sets_defaults_without_mutating_the_value() -> None:
+    validator = JsonSchemaValidator(SCHEMA)
+    conditions = [["a", "=", 1]]
+    value = {"settings": {}, "conditions": conditions}
+
+    validated = validator.validate(value)
+
+    assert validated == {
+        "limit": 1000,
+        "groupby": [],
+        "settings": {"turbo": False},
+        "conditions": [["a", "=", 1]],
+    }
+    assert value == {"settings": {}, "conditions": [["a", "=", 1]]}
+    # Values that do not get defaults are not copied.
+    assert validated["conditions"] is conditions
+
+    validated["groupby"].append("a")
+    assert validator.validate({})["groupby"] == []
+
+    with pytest.raises(jsonschema.ValidationError):
+        validator.validate({"limit": "1"})
+
+
+def test_validator_copies_values_with_nested_defaults() -> None:
+    validator = JsonSchemaValidator(
+        {
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"a": {"type": "integer", "default": 1}},
+                    },
+                }
+            },
+        }
+    )
+    value = {"items": [{}, {"a": 2}]}
+
+    assert validator.validate(value) == {"items": [{"a": 1}, {"a": 2}]}
+    assert value == {"items": [{}, {"a": 2}]}
+
+
+def test_request_schema_is_built_once() -> None:
+    events = get_entity(EntityKey.EVENTS)
+    # The extensions are built again on every call.
+    assert events.get_extensions()["project"] is not events.get_extensions()["project"]
+    legacy_schema = RequestSchema.build(events, HTTPRequestSettings, Language.LEGACY)
+    assert (
+        RequestSchema.build(events, HTTPRequestSettings, Language.LEGACY)
+        is legacy_schema
+    )
+    assert (
+        RequestSchema.build(
+            get_entity(EntityKey.TRANSACTIONS), HTTPRequestSettings, Language.LEGACY
+        )
+        is not legacy_schema
+    )
+
+    # SnQL requests have no extensions.
+    schema = RequestSchema.build(events, HTTPRequestSettings, Language.SNQL)
+    assert RequestSchema.build(None, HTTPRequestSettings, Language.SNQL) is schema
+
+    body = {"query": "MATCH (events) SELECT count()"}
+    parts = schema.validate(body)
+    assert parts.query == {"query": "MATCH (events) SELECT count()"}
+    assert parts.settings["turbo"] is False
+    assert body == {"query": "MATCH (events) SELECT count()"}
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from snuba.utils.metrics.aggregating import AggregatingMetricsBackend, Histogram
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from tests.backends.metrics import Gauge, Increment, TestingMetricsBackend, Timing
+
+
+def test_histogram() -> None:
+    histogram = Histogram(precision=0.01)
+    values = [0, 0.5, 1, 1, 10, 10.01, 250, 1000, 1000.5, 60000]
+    for value in values:
+        histogram.record(value)
+
+    other = Histogram(precision=0.01)
+    other.record(10, count=3)
+    histogram.merge(other)
+
+    assert len(histogram) == len(values) + 3
+    buckets = dict(histogram)
+    assert buckets[0.0] == 1
+    for value in values[1:]:
+        assert any(
+            abs(bucket - value) <= value * 0.01 for bucket in buckets
+        ), f"{value} is not represented by any bucket"
+    assert buckets[min(buckets, key=lambda bucket: abs(bucket - 10))] == 5
+
+    with pytest.raises(AssertionError):
+        histogram.merge(Histogram(precision=0.1))
+
+
+def test_aggregating_backend() -> None:
+    backend = TestingMetricsBackend()
+    metrics = AggregatingMetricsBackend(backend, 3600)
+
+    tags = {"topic": "events"}
+    for i in range(100):
+        metrics.increment("messages", tags=tags)
+        metrics.gauge("lag", i)
+        metrics.timing("latency_ms", 20, tags)
+    metrics.timing("latency_ms", 500, tags)
+    metrics.increment("messages", 5, {"topic": "transactions"})
+
+    assert backend.calls == []
+
+    metrics.increment("messages", tags=tags)
+    metrics.flush()
+
+    assert [call for call in backend.calls if isinstance(call, (Increment, Gauge))] == [
+        Increment("messages", 101, tags),
+        Increment("messages", 5, {"topic": "transactions"}),
+        Gauge("lag", 99, None),
+    ]
+    timings = [call for call in backend.calls if isinstance(call, Timing)]
+    assert len(timings) == 101
+    assert sorted({call.value for call in timings}) == [
+        pytest.approx(20, rel=0.01),
+        pytest.approx(500, rel=0.01),
+    ]
+    assert all(call.tags == tags for call in timings)
+
+    backend.calls.clear()
+    metrics.close()
+    assert backend.calls == []
+
+
+def test_aggregating_backend_flushes_when_idle() -> None:
+    backend = TestingMetricsBackend()
+    metrics = AggregatingMetricsBackend(backend, 0.01)
+    metrics.increment("messages")
+
+    # Nothing else is recorded, the flush thread sends the counter.
+    deadline = time.time() + 5
+    while not backend.calls and time.time() < deadline:
+        time.sleep(0.01)
+    metrics.close()
+
+    assert backend.calls == [Increment("messages", 1, None)]
+
+
+def test_aggregating_backend_through_wrapper() -> None:
+    backend = TestingMetricsBackend()
+    metrics = AggregatingMetricsBackend(backend, 3600)
+    wrapper = MetricsWrapper(metrics, "consumer", {"group": "snuba"})
+
+    wrapper.timing("latency_ms", 20)
+    wrapper.timing("latency_ms", 20)
+    metrics.close()
+
+    assert backend.calls == [
+        Timing("consumer.latency_ms", pytest.approx(20, rel=0.01), {"group": "snuba"}),
+        Timing("consumer.latency_ms", pytest.approx(20, rel=0.01), {"group": "snuba"}),
+    ]
@@ -0,0 +1,165 @@
+"""
+Benchmarks how many slow queries the WSGI and the ASGI applications can
+hold at the same time. Each client submits an async query and long polls
+its result, the query takes a fixed time to run. The WSGI application
+holds one of its threads for the whole time a client waits, while the
+ASGI one only holds a coroutine.
+
+Parsing and execution are replaced by a sleep and Redis by a dictionary,
+so this measures the HTTP layer only and needs no services.
+
+This is not collected by pytest. Run it with:
+
+    python -m tests.web.bench_asgi [clients] [wsgi threads] [query seconds]
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Mapping, MutableMapping, Optional
+from unittest import mock
+from uuid import uuid4
+
+import simplejson as json
+
+from snuba.web import async_views, views
+from snuba.web.async_query import AsyncQueryExecutor, QueryResponse
+
+
+class MemoryStore:
+    def __init__(self) -> None:
+        self.__values: MutableMapping[str, str] = {}
+
+    def set(self, key: str, value: str, ex: Optional[int] = None) -> None:
+        self.__values[key] = value
+
+    def get(self, key: str) -> Optional[str]:
+        return self.__values.get(key)
+
+
+class ThreadCounter:
+    def __init__(self) -> None:
+        self.max_threads = 0
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        while self.__running:
+            # The threads running the queries stand for ClickHouse.
+            http_threads = [
+                t for t in threading.enumerate() if not t.name.startswith("async-query")
+            ]
+            self.max_threads = max(self.max_threads, len(http_threads))
+            time.sleep(0.01)
+
+    def stop(self) -> int:
+        self.__running = False
+        self.__thread.join()
+        return self.max_threads
+
+
+def report(name: str, latencies: List[float], elapsed: float, threads: int) -> None:
+    latencies.sort()
+    print(
+        f"{name}: {len(latencies)} clients in {elapsed:.2f}s, "
+        f"p50 {latencies[len(latencies) // 2]:.2f}s, "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:.2f}s, "
+        f"max threads {threads}"
+    )
+
+
+def bench_wsgi(clients: int, threads: int) -> None:
+    client = views.application.test_client()
+
+    # All the clients arrive at the same time, the latency includes the
+    # time spent waiting for a thread.
+    start = time.time()
+
+    def run_client() -> float:
+        response = client.post("/events/snql?async=1", data="{}")
+        query_id = json.loads(response.data)["query_id"]
+        while client.get(f"/queries/{query_id}?wait=30").status_code == 202:
+            pass
+        return time.time() - start
+
+    counter = ThreadCounter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencies = list(executor.map(lambda _: run_client(), range(clients)))
+    report(f"WSGI ({threads} threads)", latencies, time.time() - start, counter.stop())
+
+
+def bench_asgi(clients: int) -> None:
+    application = async_views.QueryApplication(8)
+
+    async def call(method: str, path: str, query_string: bytes) -> Any:
+        sent: List[Mapping[str, Any]] = []
+
+        async def receive() -> Mapping[str, Any]:
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        async def send(message: Mapping[str, Any]) -> None:
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query_string,
+            "headers": [],
+        }
+        await application(scope, receive, send)
+        return sent[0]["status"], json.loads(sent[1]["body"])
+
+    start = time.time()
+
+    async def run_client() -> float:
+        _, body = await call("POST", "/events/snql", b"async=1")
+        status = 202
+        while status == 202:
+            status, _ = await call("GET", f"/queries/{body['query_id']}", b"wait=30")
+        return time.time() - start
+
+    async def run_clients() -> List[float]:
+        return list(await asyncio.gather(*[run_client() for _ in range(clients)]))
+
+    counter = ThreadCounter()
+    latencies = asyncio.get_event_loop().run_until_complete(run_clients())
+    report("ASGI", latencies, time.time() - start, counter.stop())
+
+
+def main(clients: int, threads: int, query_seconds: float) -> None:
+    def build_request(*args: Any) -> Any:
+        return mock.Mock(id=uuid4().hex)
+
+    def run_query(*args: Any) -> QueryResponse:
+        time.sleep(query_seconds)
+        return QueryResponse(200, json.dumps({"data": []}))
+
+    # Queries themselves run on ClickHouse, their concurrency is not what
+    # we measure here.
+    executor = AsyncQueryExecutor(MemoryStore(), clients, clients, 60, 0.05)
+    patches: List[Callable[[], Any]] = []
+    for module in (views, async_views):
+        for name, value in (
+            ("build_dataset_request", build_request),
+            ("run_query", run_query),
+            ("async_queries", executor),
+        ):
+            patch = mock.patch.object(module, name, value)
+            patch.start()
+            patches.append(patch.stop)
+    with mock.patch.object(async_views, "get_dataset"):
+        bench_wsgi(clients, threads)
+        bench_asgi(clients)
+    for stop in patches:
+        stop()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 0.5,
+    )
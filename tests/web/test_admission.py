@@ -0,0 +1,208 @@
+from datetime import datetime
+from typing import Any, MutableMapping, Optional, Sequence
+from unittest import mock
+
+import pytest
+
+from snuba.clickhouse.columns import ColumnSet
+from snuba.clickhouse.formatter.query import format_query
+from snuba.clickhouse.query import Query
+from snuba.clickhouse.statistics import (
+    ColumnStatistics,
+    TableStatistics,
+    TableStatisticsCache,
+)
+from snuba.query import SelectedExpression
+from snuba.query.conditions import (
+    ConditionFunctions,
+    binary_condition,
+    combine_and_conditions,
+)
+from snuba.query.data_source.simple import Table
+from snuba.query.expressions import Column, Literal
+from snuba.request.request_settings import HTTPRequestSettings
+from snuba.utils.metrics.timer import Timer
+from snuba.web import db_query
+from snuba.web.admission import (
+    AdmissionAction,
+    AdmissionController,
+    QueryCostEstimator,
+    QueryCostExceeded,
+)
+
+
+def fetch_statistics(table: str, columns: Sequence[str]) -> TableStatistics:
+    return {
+        "event_id": ColumnStatistics(9_000_000),
+        "message": ColumnStatistics(90_000_000),
+    }
+
+
+def build_estimator() -> QueryCostEstimator:
+    statistics = TableStatisticsCache(fetcher=fetch_statistics)
+    for table in ("errors_local", "sessions_hourly_local"):
+        statistics.get(table, [])
+        statistics.refresh(table)
+    return QueryCostEstimator(statistics)
+
+
+def build_query(
+    days: Optional[int], final: bool = False, table: str = "errors_local"
+) -> Query:
+    return Query(
+        Table(table, ColumnSet([]), final=final),
+        selected_columns=[
+            SelectedExpression("message", Column("_snuba_message", None, "message"))
+        ],
+        condition=combine_and_conditions(
+            [
+                binary_condition(
+                    ConditionFunctions.GTE,
+                    Column(None, None, "timestamp"),
+                    Literal(None, datetime(2021, 1, 1)),
+                ),
+                binary_condition(
+                    ConditionFunctions.LT,
+                    Column(None, None, "timestamp"),
+                    Literal(None, datetime(2021, 1, 1 + days)),
+                ),
+            ]
+        )
+        if days is not None
+        else None,
+    )
+
+
+def test_estimate() -> None:
+    estimator = build_estimator()
+
+    cost = estimator.estimate(build_query(9))
+    assert cost is not None
+    assert cost.tables == "errors_local"
+    # A tenth of the retention of the only column we read.
+    assert cost.scan_bytes == 9_000_000
+    assert cost.duration_ms is None
+
+    final_cost = estimator.estimate(build_query(9, final=True))
+    assert final_cost is not None
+    assert final_cost.scan_bytes == 3 * cost.scan_bytes
+
+    # Without a time range the query scans the whole retention.
+    unbounded_cost = estimator.estimate(build_query(None))
+    assert unbounded_cost is not None
+    assert unbounded_cost.scan_bytes == 90_000_000
+
+    estimator.record(cost, 100)
+    estimator.record(cost, 300)
+    predicted = estimator.estimate(build_query(18))
+    assert predicted is not None
+    # 90000 bytes per ms, then moved by a tenth towards 30000.
+    assert predicted.duration_ms == pytest.approx(18_000_000 / 84_000)
+
+
+def test_statistics_not_available() -> None:
+    estimator = QueryCostEstimator(TableStatisticsCache(fetcher=fetch_statistics))
+    assert estimator.estimate(build_query(9)) is None
+
+
+def test_admission_decisions() -> None:
+    controller = AdmissionController(build_estimator(), queue_slots=1)
+    query = build_query(9)
+    configs = {
+        "admission_control_enabled": 1,
+        "admission_max_scan_bytes": 1_000_000_000,
+        "admission_max_scan_bytes/api.discover": 3_000_000,
+        "admission_action/api.discover": "sample",
+    }
+
+    assert controller.decide(query, "api.issues", {}) is None
+
+    decision = controller.decide(query, "api.issues", configs)
+    assert decision is not None
+    assert decision.action == AdmissionAction.ADMIT
+
+    decision = controller.decide(query, "api.discover", configs)
+    assert decision is not None
+    assert decision.action == AdmissionAction.SAMPLE
+    assert decision.sampling_rate == pytest.approx(0.3333)
+
+    # Tables without a sampling key cannot be sampled.
+    decision = controller.decide(
+        build_query(9, table="sessions_hourly_local"), "api.discover", configs
+    )
+    assert decision is not None
+    assert decision.action == AdmissionAction.REJECT
+
+    configs["admission_max_scan_bytes/api.discover"] = 10_000
+    decision = controller.decide(query, "api.discover", configs)
+    assert decision is not None
+    assert decision.action == AdmissionAction.REJECT
+    with pytest.raises(QueryCostExceeded):
+        with controller.admit(decision, {}, {"admission_queue_timeout_ms": 0}):
+            pass
+
+    # Budgets for a query fingerprint take precedence over the referrer.
+    configs["admission_max_scan_bytes/fingerprint/abc"] = 1_000_000_000
+    decision = controller.decide(query, "api.discover", configs, "abc")
+    assert decision is not None
+    assert decision.action == AdmissionAction.ADMIT
+
+
+def test_queue() -> None:
+    controller = AdmissionController(build_estimator(), queue_slots=1)
+    configs = {
+        "admission_control_enabled": 1,
+        "admission_max_scan_bytes": 1_000_000,
+        "admission_action": "queue",
+    }
+    decision = controller.decide(build_query(9), "api.issues", configs)
+    assert decision is not None
+    assert decision.action == AdmissionAction.QUEUE
+
+    with controller.admit(decision, {}, {"admission_queue_timeout_ms": 0}):
+        # The only slot is taken.
+        with pytest.raises(QueryCostExceeded):
+            with controller.admit(decision, {}, {"admission_queue_timeout_ms": 0}):
+                pass
+
+    with controller.admit(decision, {}, {"admission_queue_timeout_ms": 0}):
+        pass
+
+
+def test_admission_applies_on_cache_miss() -> None:
+    controller = AdmissionController(build_estimator(), queue_slots=1)
+    query = build_query(9)
+    decision = controller.decide(
+        query,
+        "api.issues",
+        {"admission_control_enabled": 1, "admission_max_scan_bytes": 10_000},
+    )
+    assert decision is not None
+    assert decision.action == AdmissionAction.REJECT
+
+    reader = mock.Mock()
+    cached = {"meta": [], "data": []}
+
+    def execute(stats: MutableMapping[str, Any]) -> Any:
+        return db_query.execute_query_with_caching(
+            query,
+            HTTPRequestSettings(),
+            format_query(query),
+            reader,
+            Timer("test"),
+            stats,
+            {},
+            robust=False,
+            admission=decision,
+        )
+
+    with mock.patch.object(db_query, "admission_controller", controller):
+        # A query served from the cache is not rejected.
+        with mock.patch.object(db_query.cache, "get", return_value=cached):
+            assert execute({}) == cached
+
+        with mock.patch.object(db_query.cache, "get", return_value=None):
+            with pytest.raises(QueryCostExceeded):
+                execute({})
+
+    reader.execute.assert_not_called()
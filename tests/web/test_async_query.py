@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from snuba.redis import redis_client
+from snuba.web.async_query import AsyncQueryExecutor, QueryResponse, TooManyAsyncQueries
+
+
+def test_async_query() -> None:
+    executor = AsyncQueryExecutor(redis_client, 1, 1, 60, poll_interval=0.01)
+    completed = threading.Event()
+
+    def run() -> QueryResponse:
+        completed.wait()
+        return QueryResponse(200, '{"data": []}')
+
+    executor.submit("test-async-query", run)
+    with pytest.raises(TooManyAsyncQueries):
+        executor.submit("test-async-query-2", run)
+
+    pending = executor.get("test-async-query")
+    assert pending is not None and pending.status == 202
+
+    completed.set()
+    assert executor.get("test-async-query", timeout=5) == QueryResponse(
+        200, '{"data": []}'
+    )
+    assert executor.get("test-async-query-2") is None
+
+
+def test_async_query_error() -> None:
+    executor = AsyncQueryExecutor(redis_client, 1, 1, 60, poll_interval=0.01)
+
+    def run() -> QueryResponse:
+        raise ValueError("something went wrong")
+
+    executor.submit("test-async-query-error", run)
+    response = executor.get("test-async-query-error", timeout=5)
+    assert response is not None and response.status == 500
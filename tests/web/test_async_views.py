@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, List, Mapping, MutableMapping, Sequence, Tuple
+from unittest import mock
+
+import simplejson as json
+
+from snuba.web import async_views, views
+from snuba.web.async_query import QueryResponse
+from snuba.web.async_views import QueryApplication
+from snuba.web.cancellation import get_abandoned
+
+
+def request(
+    method: str,
+    path: str,
+    body: bytes = b"",
+    query_string: bytes = b"",
+    disconnect: bool = False,
+) -> Tuple[int, Any]:
+    application = QueryApplication(1)
+    sent: List[Mapping[str, Any]] = []
+    chunks: Sequence[bytes] = [body[: len(body) // 2], body[len(body) // 2 :]]
+    pending: MutableMapping[str, int] = {"index": 0}
+
+    async def receive() -> Mapping[str, Any]:
+        index = pending["index"]
+        pending["index"] += 1
+        if index >= len(chunks):
+            # The client waits for the response unless it disconnects.
+            if disconnect:
+                return {"type": "http.disconnect"}
+            await asyncio.Event().wait()
+        return {
+            "type": "http.request",
+            "body": chunks[index],
+            "more_body": index < len(chunks) - 1,
+        }
+
+    async def send(message: Mapping[str, Any]) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(b"referer", b"test")],
+    }
+    asyncio.get_event_loop().run_until_complete(application(scope, receive, send))
+
+    start, body_message = sent
+    assert start["type"] == "http.response.start"
+    assert start["headers"] == [(b"content-type", b"application/json")]
+    return start["status"], json.loads(body_message["body"])
+
+
+def test_health() -> None:
+    assert request("GET", "/health") == (200, {"status": "ok", "registries": False})
+
+    with mock.patch.object(views, "check_down_file_exists", return_value=True):
+        status, body = request("GET", "/health")
+    assert status == 502
+    assert body["down_file_exists"] is True
+
+    with mock.patch.object(views, "check_clickhouse", return_value=False):
+        assert request("GET", "/health") == (
+            200,
+            {"status": "ok", "registries": False},
+        )
+        status, body = request("GET", "/health", query_string=b"thorough=true")
+    assert status == 502
+    assert body["clickhouse_ok"] is False
+
+
+def test_errors() -> None:
+    status, body = request("GET", "/events/unknown")
+    assert status == 404
+
+    status, body = request("POST", "/events/snql", b"{not json")
+    assert status == 400
+    assert body["error"]["type"] == "json"
+
+
+def test_disconnect() -> None:
+    def execute_query_request(*args: Any) -> QueryResponse:
+        abandoned = get_abandoned()
+        assert abandoned is not None
+        return QueryResponse(200, json.dumps({"abandoned": abandoned.wait(5)}))
+
+    with mock.patch.object(async_views, "execute_query_request", execute_query_request):
+        assert request("POST", "/events/snql", b"{}", disconnect=True) == (
+            200,
+            {"abandoned": True},
+        )
+        assert get_abandoned() is None
+
+
+def test_async_parameters() -> None:
+    def execute_query_request(*args: Any) -> QueryResponse:
+        return QueryResponse(200, json.dumps({"async": args[-1]}))
+
+    with mock.patch.object(async_views, "execute_query_request", execute_query_request):
+        for query_string, is_async in [
+            (b"", False),
+            (b"async=0", False),
+            (b"async=false", False),
+            (b"async=1", True),
+            (b"async=true", True),
+        ]:
+            assert request(
+                "POST", "/events/snql", b"{}", query_string=query_string
+            ) == (200, {"async": is_async})
+
+    for wait in [b"soon", b"-1", b"nan"]:
+        status, body = request("GET", "/queries/abc", query_string=b"wait=" + wait)
+        assert status == 400
+        assert body["error"]["type"] == "request"
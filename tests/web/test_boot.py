@@ -0,0 +1,26 @@
+import gc
+import threading
+from unittest import mock
+
+from snuba.datasets import factory
+from snuba.web import boot
+from tests.web.test_async_views import request
+
+
+def test_prewarm_registries() -> None:
+    with mock.patch.object(boot, "_prewarmed", threading.Event()):
+        assert request("GET", "/health") == (
+            200,
+            {"status": "ok", "registries": False},
+        )
+
+        try:
+            boot.prewarm_registries()
+        finally:
+            gc.unfreeze()
+
+        assert request("GET", "/health") == (
+            200,
+            {"status": "ok", "registries": "prewarmed"},
+        )
+    assert set(factory.get_enabled_dataset_names()) <= set(factory.DATASETS_IMPL)
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from snuba.web import fingerprints
+from snuba.web.fingerprints import FingerprintStats, get_fingerprint
+
+
+def test_get_fingerprint() -> None:
+    sql = "SELECT a FROM t WHERE in(b, tuple({})) AND equals(c, $S)"
+    assert get_fingerprint(sql.format("$N")) == get_fingerprint(
+        sql.format("$N, $N, $N")
+    )
+    assert get_fingerprint(sql.format("$N")) != get_fingerprint(sql.format("$S"))
+
+
+def test_fingerprint_stats() -> None:
+    with mock.patch.object(fingerprints.time, "time", return_value=1000.0) as now:
+        stats = FingerprintStats(interval=60, windows=2, max_fingerprints=2)
+        for duration in range(1, 11):
+            stats.record("a", "SELECT $N", float(duration), cache_hit=duration > 8)
+        stats.record("b", "SELECT $S", 100.0, final=True, rows_read=10)
+        stats.record_rows_read("b", "SELECT $S", 30)
+        # Over the fingerprints limit of the interval.
+        stats.record("c", "SELECT $D", 1.0)
+
+        assert stats.summarize() == [
+            {
+                "fingerprint": "b",
+                "sql_anonymized": "SELECT $S",
+                "count": 1,
+                "errors": 0,
+                "p50_ms": 100.0,
+                "p95_ms": 100.0,
+                "total_ms": 100.0,
+                "avg_rows_read": 20.0,
+                "cache_hit_rate": 0.0,
+                "final_rate": 1.0,
+            },
+            {
+                "fingerprint": "a",
+                "sql_anonymized": "SELECT $N",
+                "count": 10,
+                "errors": 0,
+                "p50_ms": 6.0,
+                "p95_ms": 10.0,
+                "total_ms": 55.0,
+                "avg_rows_read": None,
+                "cache_hit_rate": 0.2,
+                "final_rate": 0.0,
+            },
+        ]
+
+        # The previous interval is still in the window.
+        now.return_value = 1030.0
+        stats.record("c", "SELECT $D", 1.0, error=True)
+        assert [(s["fingerprint"], s["count"]) for s in stats.summarize()] == [
+            ("b", 1),
+            ("a", 10),
+            ("c", 1),
+        ]
+
+        now.return_value = 1090.0
+        assert [s["fingerprint"] for s in stats.summarize()] == ["c"]
+
+        now.return_value = 2000.0
+        assert stats.summarize() == []
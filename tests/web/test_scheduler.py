@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import List
+
+import pytest
+
+from snuba.web.scheduler import QueryScheduler, QueueTimeout
+
+
+def wait_for_queue_depth(scheduler: QueryScheduler, depth: int) -> None:
+    deadline = time.time() + 5
+    while scheduler.get_queue_depth() != depth:
+        assert time.time() < deadline, "the query was never queued"
+        time.sleep(0.001)
+
+
+def test_weighted_fair_queueing() -> None:
+    scheduler = QueryScheduler(
+        1, {"alerts": 4, "default": 1}, {"subscriptions_executor": "alerts"}
+    )
+    order: List[str] = []
+
+    def run_query(referrer: str) -> None:
+        with scheduler.slot(referrer, timeout=5):
+            order.append(referrer)
+
+    threads = []
+    with scheduler.slot("api.discover", timeout=0):
+        # A burst of export queries is followed by a few alerts.
+        for referrer in ["api.export"] * 4 + ["subscriptions_executor"] * 4:
+            thread = threading.Thread(target=run_query, args=(referrer,))
+            thread.start()
+            threads.append(thread)
+            wait_for_queue_depth(scheduler, len(threads))
+
+    for thread in threads:
+        thread.join()
+
+    # The alerts run four times as often as the exports, even if they
+    # were queued after the whole burst.
+    assert order == [
+        "subscriptions_executor",
+        "subscriptions_executor",
+        "subscriptions_executor",
+        "api.export",
+        "subscriptions_executor",
+        "api.export",
+        "api.export",
+        "api.export",
+    ]
+    assert scheduler.get_queue_depth() == 0
+
+
+def test_max_in_flight_per_referrer() -> None:
+    scheduler = QueryScheduler(2, {"default": 1}, {})
+
+    with scheduler.slot("api.export", timeout=0, max_in_flight=1):
+        # There is a free slot, but not for this referrer.
+        with pytest.raises(QueueTimeout):
+            with scheduler.slot("api.export", timeout=0.01, max_in_flight=1):
+                pass
+        assert scheduler.get_queue_depth() == 0
+
+        with scheduler.slot("api.discover", timeout=0):
+            pass
+
+    with scheduler.slot("api.export", timeout=0, max_in_flight=1):
+        pass